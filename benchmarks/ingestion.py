@@ -0,0 +1,228 @@
+""" Benchmark of the ingestion pipeline on synthetic repositories, with results written as JSON. """
+
+# pylint: disable=no-value-for-parameter,import-outside-toplevel
+
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+import click
+from synthetic import SHAPES, commit, generate
+
+from placeholder.config import MAX_DIRECTORY_DEPTH, MAX_FILE_SIZE, MAX_FILES, MAX_TOTAL_SIZE_BYTES
+from placeholder.main import build_digest
+
+TARGETS = ("main", "query")
+SRC_DIR = Path(__file__).resolve().parents[1] / "src"
+
+
+@click.command()
+@click.option(
+    "--shape", "shapes", multiple=True, type=click.Choice(list(SHAPES)), help="Shapes to run, by default all."
+)
+@click.option("--target", "targets", multiple=True, type=click.Choice(TARGETS), help="Targets to run, by default all.")
+@click.option("--scale", default=0.1, show_default=True, help="Size of the repositories relative to the limits.")
+@click.option("--iterations", default=5, show_default=True, help="Measured runs of each case.")
+@click.option("--warmup", default=1, show_default=True, help="Unmeasured runs of each case, before the measured ones.")
+@click.option("--output", type=click.Path(dir_okay=False), help="File receiving the JSON results, by default stdout.")
+@click.option("--baseline", type=click.Path(exists=True, dir_okay=False), help="JSON results to compare with.")
+@click.option("--tolerance", default=0.2, show_default=True, help="Slowdown or growth flagged as a regression.")
+def benchmark(
+    shapes: tuple[str, ...],
+    targets: tuple[str, ...],
+    scale: float,
+    iterations: int,
+    warmup: int,
+    output: str | None,
+    baseline: str | None,
+    tolerance: float,
+) -> None:
+    """
+    Time `main()` and the server's query pipeline on synthetic repositories of every shape.
+
+    The `main` target runs `placeholder.main.main` on the generated directory. The `query` target runs what a
+    query does after resolving the repository, bypassing the result cache: a checkout through the clone cache, the
+    digest build in the process pool, and the rendering of the result page. Its first run clones the repository
+    and fills the fragment store, so it is best left to the warm-up.
+
+    Each case runs in a fresh process, whose peak RSS is reported along with the largest peak RSS of its child
+    processes, such as the process pool. Throughput is the size of the digest of the repository divided by the
+    median latency.
+
+    Run from the repository root with `PYTHONPATH=src python benchmarks/ingestion.py --output results.json`, and
+    compare a later run with `--baseline results.json`, which exits with status 1 on regressions.
+    """
+    results = []
+    with tempfile.TemporaryDirectory(prefix="benchmark-") as workspace:
+        for shape in shapes or SHAPES:
+            source = generate(Path(workspace) / shape, shape, scale)
+            digest = build_digest(str(source))
+            size = {"files": len(digest.files), "bytes": digest.size}
+            revision = commit(source) if "query" in (targets or TARGETS) else None
+            for target in targets or TARGETS:
+                click.echo(f"{shape} / {target}: {size['files']} files, {size['bytes'] / 2**20:.1f} MB", err=True)
+                with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+                    case = executor.submit(_run_case, target, str(source), revision, iterations, warmup, workspace)
+                    measures = case.result()
+                median = measures["latency"]["p50"]
+                results.append(
+                    {
+                        "shape": shape,
+                        "target": target,
+                        **size,
+                        **measures,
+                        "files_per_second": round(size["files"] / median, 1) if median else None,
+                        "mb_per_second": round(size["bytes"] / 2**20 / median, 2) if median else None,
+                    }
+                )
+
+    report = {"meta": _meta(scale, iterations, warmup), "results": results}
+    text = json.dumps(report, indent=2)
+    if output:
+        Path(output).write_text(text + "\n")
+    else:
+        click.echo(text)
+
+    if baseline and _regressions(json.loads(Path(baseline).read_text()), report, tolerance):
+        sys.exit(1)
+
+
+def _run_case(target: str, source: str, revision: str | None, iterations: int, warmup: int, workspace: str) -> dict:
+    """Run one target on one repository, in a process of its own, and measure it."""
+    # The server reads its configuration when it is imported, so its stores are isolated before that
+    case_dir = tempfile.mkdtemp(dir=workspace)
+    for variable in ("CLONE_CACHE_DIR", "DIGEST_STORE_DIR", "FRAGMENT_STORE_DIR", "SHARED_STATE_DIR", "PROFILE_DIR"):
+        os.environ[variable] = os.path.join(case_dir, variable.lower())
+    # Templates are looked up relative to `src`, as when the server runs
+    os.chdir(SRC_DIR)
+
+    run = _run_main if target == "main" else _run_query
+    latencies = asyncio.run(run(source, revision, iterations, warmup))
+    return {
+        "iterations": iterations,
+        "latency": _latency(latencies),
+        "peak_rss_mb": _peak_rss(resource.RUSAGE_SELF),
+        "peak_child_rss_mb": _peak_rss(resource.RUSAGE_CHILDREN),
+    }
+
+
+async def _run_main(source: str, _: str | None, iterations: int, warmup: int) -> list[float]:
+    """Time `main()` on a directory."""
+    from console import console
+    from placeholder.main import main
+
+    console.quiet = True  # Keep stdout for the results
+    latencies = []
+    for i in range(warmup + iterations):
+        start = time.perf_counter()
+        await main(source)
+        if i >= warmup:
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def _run_query(source: str, revision: str | None, iterations: int, warmup: int) -> list[float]:
+    """Time the checkout, digest build and page rendering of a query for a local repository."""
+    from starlette.requests import Request
+
+    from placeholder.patterns import PatternMatcher
+    from server.clone_cache import clone_cache
+    from server.process_pool import process_pool
+    from server.query_processor import _ingest, render_query
+
+    url = f"file://{source}"
+    request = Request({"type": "http", "method": "POST", "path": "/", "headers": [], "query_string": b""})
+    process_pool.start()
+    await clone_cache.start()
+    latencies = []
+    try:
+        for i in range(warmup + iterations):
+            start = time.perf_counter()
+            text = await _ingest(url, revision, PatternMatcher(), lambda _: None, None)
+            render_query(request, url, result=text, digest_id=revision)
+            if i >= warmup:
+                latencies.append(time.perf_counter() - start)
+    finally:
+        await clone_cache.stop()
+        # Stopping the pool waits for its processes, so that their peak RSS is accounted for
+        await process_pool.stop()
+    return latencies
+
+
+def _latency(latencies: list[float]) -> dict[str, float]:
+    """Summarize latencies in seconds: their extremes, mean and percentiles."""
+    if len(latencies) > 1:
+        cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+        p50, p90, p99 = cuts[49], cuts[89], cuts[98]
+    else:
+        p50 = p90 = p99 = latencies[0]
+    summary = {"min": min(latencies), "mean": statistics.fmean(latencies), "max": max(latencies)}
+    return {key: round(value, 4) for key, value in {**summary, "p50": p50, "p90": p90, "p99": p99}.items()}
+
+
+def _peak_rss(who: int) -> float:
+    """Peak resident set size of this process, or of its largest child process, in MB."""
+    peak = resource.getrusage(who).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+
+def _meta(scale: float, iterations: int, warmup: int) -> dict:
+    """Describe the run, so results from different releases and machines can be told apart."""
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=SRC_DIR, check=True, capture_output=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {
+        "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "revision": revision,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "scale": scale,
+        "iterations": iterations,
+        "warmup": warmup,
+        "limits": {
+            "max_file_size": MAX_FILE_SIZE,
+            "max_files": MAX_FILES,
+            "max_total_size_bytes": MAX_TOTAL_SIZE_BYTES,
+            "max_directory_depth": MAX_DIRECTORY_DEPTH,
+        },
+    }
+
+
+def _regressions(baseline: dict, report: dict, tolerance: float) -> list[str]:
+    """Compare the median latency and peak RSS of every case with a baseline, and print the regressions."""
+    previous = {(result["shape"], result["target"]): result for result in baseline["results"]}
+    regressions = []
+    for result in report["results"]:
+        before = previous.get((result["shape"], result["target"]))
+        if before is None:
+            continue
+        for name, now, then in (
+            ("p50 latency", result["latency"]["p50"], before["latency"]["p50"]),
+            ("peak RSS", result["peak_rss_mb"], before["peak_rss_mb"]),
+        ):
+            if then and now > then * (1 + tolerance):
+                regressions.append(f"{result['shape']} / {result['target']}: {name} {then} -> {now}")
+
+    for regression in regressions:
+        click.echo(f"Regression: {regression}", err=True)
+    return regressions
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,124 @@
+""" Generators of synthetic repositories of various shapes, sized relative to the ingestion limits. """
+
+import random
+import subprocess
+from collections.abc import Callable
+from pathlib import Path
+
+from placeholder.config import MAX_DIRECTORY_DEPTH, MAX_FILE_SIZE, MAX_FILES
+
+_WORDS = (
+    "def class return import self value items result config path file tree node digest token buffer stream "
+    "async await yield lambda none true false error raise try except finally with open read write"
+).split()
+
+
+def many_small_files(root: Path, scale: float, rng: random.Random) -> None:
+    """Most of `MAX_FILES` source files of a few kB, a hundred per directory."""
+    for i in range(max(1, int(MAX_FILES * 0.9 * scale))):
+        _write_text(root / f"pkg{i // 100:03d}" / f"module{i:05d}.py", rng.randint(512, 4096), rng)
+
+
+def huge_files(root: Path, scale: float, rng: random.Random) -> None:
+    """A few text files just under `MAX_FILE_SIZE`, and one larger file, which is over the limit from scale 0.91."""
+    for i in range(4):
+        _write_text(root / "data" / f"dump{i}.sql", max(1024, int(MAX_FILE_SIZE * 0.9 * scale)), rng)
+    _write_text(root / "data" / "too_large.sql", int(MAX_FILE_SIZE * 1.1 * scale) + 1, rng)
+    _write_text(root / "README.md", 2048, rng)
+
+
+def deep_nesting(root: Path, scale: float, rng: random.Random) -> None:
+    """Chains of directories one level short of `MAX_DIRECTORY_DEPTH`, with a file at every level."""
+    depth = MAX_DIRECTORY_DEPTH - 1
+    for chain in range(max(1, int(MAX_FILES * 0.5 * scale) // depth)):
+        directory = root / f"chain{chain:03d}"
+        for level in range(depth):
+            directory = directory / f"level{level:02d}"
+            _write_text(directory / "node.py", rng.randint(256, 2048), rng)
+
+
+def binary_heavy(root: Path, scale: float, rng: random.Random) -> None:
+    """As many binary files as source files, which are sniffed and left out of the digest."""
+    for i in range(max(1, int(MAX_FILES * 0.4 * scale))):
+        _write_text(root / "src" / f"file{i:05d}.py", rng.randint(512, 4096), rng)
+        (root / "assets" / f"image{i:05d}.png").parent.mkdir(parents=True, exist_ok=True)
+        (root / "assets" / f"image{i:05d}.png").write_bytes(
+            b"\x89PNG\r\n\x1a\n\0" + rng.randbytes(rng.randint(4096, 32768))
+        )
+
+
+def ignored_directories(root: Path, scale: float, rng: random.Random) -> None:
+    """Ignored dependency and build directories holding twice `MAX_FILES` files, next to a small source tree."""
+    (root / ".gitignore").write_text("node_modules/\nbuild/\n*.log\n")
+    for i in range(max(1, int(MAX_FILES * 0.1 * scale))):
+        _write_text(root / "src" / f"module{i:05d}.ts", rng.randint(512, 4096), rng)
+    for i in range(max(1, int(MAX_FILES * 2 * scale))):
+        directory = "node_modules" if i % 2 else "build"
+        _write_text(root / directory / f"dep{i // 50:04d}" / f"index{i:05d}.js", rng.randint(256, 2048), rng)
+        if i % 10 == 0:
+            _write_text(root / "logs" / f"run{i:05d}.log", 1024, rng)
+
+
+SHAPES: dict[str, Callable[[Path, float, random.Random], None]] = {
+    "many_small_files": many_small_files,
+    "huge_files": huge_files,
+    "deep_nesting": deep_nesting,
+    "binary_heavy": binary_heavy,
+    "ignored_directories": ignored_directories,
+}
+
+
+def generate(root: Path, shape: str, scale: float = 1.0, seed: int = 0) -> Path:
+    """
+    Generate a repository of a given shape, identical for a given shape, scale and seed.
+
+    Parameters
+    ----------
+    root : Path
+        The directory to create the repository in, which must not exist yet.
+    shape : str
+        One of `SHAPES`.
+    scale : float
+        The size of the repository relative to the ingestion limits, in number of files or in file size, by
+        default 1.0 for just under the limits.
+    seed : int
+        The seed of the generated content, by default 0.
+
+    Returns
+    -------
+    Path
+        The root of the repository.
+    """
+    root.mkdir(parents=True)
+    SHAPES[shape](root, scale, random.Random(seed))
+    return root
+
+
+def commit(root: Path) -> str:
+    """Make a git repository of a generated tree, with all of it in one commit, and return the commit."""
+
+    def git(*args: str) -> str:
+        return subprocess.run(
+            ["git", "-c", "user.name=benchmark", "-c", "user.email=benchmark@example.com", *args],
+            cwd=root,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+
+    git("init", "--quiet", "--initial-branch=main")
+    git("add", ".")
+    git("commit", "--quiet", "-m", "Synthetic repository")
+    return git("rev-parse", "HEAD")
+
+
+def _write_text(path: Path, size: int, rng: random.Random) -> None:
+    """Write about `size` bytes of code-like text, in lines of a few words."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    lines = []
+    written = 0
+    while written < size:
+        line = " ".join(rng.choices(_WORDS, k=rng.randint(3, 12)))
+        lines.append(line)
+        written += len(line) + 1
+    path.write_text("\n".join(lines) + "\n")
@@ -0,0 +1,66 @@
+""" Benchmark of exact token counting against the size-based estimate, on the files of a directory. """
+
+# pylint: disable=no-value-for-parameter
+
+import time
+
+import click
+
+from placeholder.config import EXACT_TOKEN_COUNT_MAX_BYTES
+from placeholder.formatter import read_file_content
+from placeholder.ingestion import walk_directory
+from placeholder.tokens import TokenCounter, estimate_tokens
+
+
+@click.command()
+@click.argument("source", type=click.Path(exists=True, file_okay=False), default=".")
+@click.option("--batch-size", default=64, show_default=True, help="Files counted per tokenizer call.")
+def benchmark(source: str, batch_size: int) -> None:
+    """
+    Count the tokens of every file of SOURCE one file at a time, in batches, and from file sizes, and compare.
+
+    Run from the repository root with `PYTHONPATH=src python benchmarks/token_counting.py <directory>`.
+    """
+    texts = [read_file_content(entry) for entry in walk_directory(source)]
+    size = sum(len(text.encode("utf-8", errors="surrogatepass")) for text in texts)
+    click.echo(f"{len(texts)} files, {size / 1024 / 1024:.1f} MB")
+
+    start = time.perf_counter()
+    estimated = [estimate_tokens(len(text.encode("utf-8", errors="surrogatepass"))) for text in texts]
+    _report("estimated", start, sum(estimated))
+
+    if not TokenCounter().exact:
+        click.echo("exact counting unavailable: tiktoken or its encoding could not be loaded")
+        return
+
+    uncapped = EXACT_TOKEN_COUNT_MAX_BYTES * 1024
+    start = time.perf_counter()
+    counter = TokenCounter(exact_max_bytes=uncapped, cache_size=0)
+    exact = [counter.count(text) for text in texts]
+    _report("exact, per file", start, sum(exact))
+
+    start = time.perf_counter()
+    counter = TokenCounter(exact_max_bytes=uncapped, cache_size=0)
+    batched = [
+        count for i in range(0, len(texts), batch_size) for count in counter.count_many(texts[i : i + batch_size])
+    ]
+    _report("exact, batched", start, sum(batched))
+
+    start = time.perf_counter()
+    counter = TokenCounter(cache_size=0)
+    capped = [
+        count for i in range(0, len(texts), batch_size) for count in counter.count_many(texts[i : i + batch_size])
+    ]
+    _report("batched, capped", start, sum(capped))
+
+    error = abs(sum(estimated) - sum(exact)) / max(sum(exact), 1)
+    click.echo(f"estimate error on the total: {error:.1%}")
+
+
+def _report(method: str, start: float, tokens: int) -> None:
+    """Print the duration of a counting method since `start` and the total it found."""
+    click.echo(f"{method:<18} {time.perf_counter() - start:8.3f} s  {tokens:>12,} tokens")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,115 @@
+""" Selection of the files of a digest that fit a token budget, before any of them is read. """
+
+from collections.abc import Iterable
+
+from placeholder.config import ENTRY_POINT_NAMES, MAX_FILES, MAX_TOTAL_SIZE_BYTES
+from placeholder.formatter import format_file, format_summary, format_tree
+from placeholder.ingestion import FileEntry, IngestionStats
+from placeholder.tokens import estimate_tokens
+
+
+def rank_files(entries: Iterable[FileEntry]) -> list[FileEntry]:
+    """
+    Order files by how much they tell about a repository for their cost.
+
+    READMEs come first, then entry points and manifests named in `ENTRY_POINT_NAMES`, then every other file. Within
+    each group, shallower files come before deeper ones, and smaller files before larger ones.
+
+    Parameters
+    ----------
+    entries : Iterable[FileEntry]
+        The files to rank.
+
+    Returns
+    -------
+    list[FileEntry]
+        The files, most relevant first.
+    """
+    return sorted(entries, key=_rank)
+
+
+def select_within_budget(
+    entries: Iterable[FileEntry], max_tokens: int, stats: IngestionStats, source: str = ""
+) -> list[FileEntry]:
+    """
+    Select the files whose estimated tokens fit in a budget, in order of rank, and drop the others unread.
+
+    Files are taken greedily from `rank_files`: a file too large for what is left of the budget is skipped, and a
+    smaller file ranked after it may still be taken. Token counts are estimated from file sizes, since no file has
+    been read yet.
+
+    The budget covers the whole text of the digest: the summary is set aside first, and each file is charged the
+    header of its section and its lines in the directory structure on top of its content.
+
+    Parameters
+    ----------
+    entries : Iterable[FileEntry]
+        The files listed by the walk, in walk order.
+    max_tokens : int
+        The token budget of the digest.
+    stats : IngestionStats
+        The stats of the walk, updated to count only the selected files, and flagged with the `max_tokens` limit if
+        any file was dropped.
+    source : str
+        The name shown in the summary of the digest, by default empty.
+
+    Returns
+    -------
+    list[FileEntry]
+        The selected files, in walk order.
+    """
+    entries = list(entries)
+    remaining = max_tokens - estimate_tokens(_header_size(source))
+    directories: set[str] = set()
+    selected: set[int] = set()
+    for entry in rank_files(entries):
+        parents = _parents(entry.path)
+        tree_lines = format_tree([entry.path]).split("\n")
+        # Directory lines are only charged to the first selected file below them
+        tree_size = sum(
+            len(line.encode()) + 1 for line, parent in zip(tree_lines, parents) if parent not in directories
+        )
+        tree_size += len(tree_lines[-1].encode()) + 1
+        tokens = estimate_tokens(entry.size + len(format_file(entry.path, "").encode()) + tree_size)
+        if tokens <= remaining:
+            selected.add(id(entry))
+            directories.update(parents)
+            remaining -= tokens
+
+    kept = [entry for entry in entries if id(entry) in selected]
+    if len(kept) < len(entries):
+        stats.limit_reached = stats.limit_reached or "max_tokens"
+        stats.files -= len(entries) - len(kept)
+        stats.total_size -= sum(entry.size for entry in entries) - sum(entry.size for entry in kept)
+    return kept
+
+
+def _header_size(source: str) -> int:
+    """Size in bytes of the longest summary of a digest, followed by the heading of its directory structure."""
+    stats = IngestionStats(
+        files=MAX_FILES,
+        total_size=MAX_TOTAL_SIZE_BYTES,
+        skipped_files=MAX_FILES,
+        skipped_directories=MAX_FILES,
+        limit_reached="max_total_size_bytes",
+        tokens=MAX_TOTAL_SIZE_BYTES,
+    )
+    return len(f"{format_summary(source, stats)}\nDirectory structure:\n\n\n".encode())
+
+
+def _parents(path: str) -> list[str]:
+    """The directories containing a file, outermost first."""
+    parts = path.split("/")
+    return ["/".join(parts[:depth]) for depth in range(1, len(parts))]
+
+
+def _rank(entry: FileEntry) -> tuple[int, int, int, str]:
+    """Sort key of a file: its group, then its depth, its size and its path."""
+    name = entry.path.rsplit("/", 1)[-1]
+    if name.lower().startswith("readme"):
+        group = 0
+    elif name in ENTRY_POINT_NAMES:
+        group = 1
+    else:
+        group = 2
+    return group, entry.depth, entry.size, entry.path
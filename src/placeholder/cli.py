@@ -6,12 +6,23 @@ import asyncio
 
 import click
 
+from placeholder.ingestion import IngestionLimits
 from placeholder.main import main
+from placeholder.patterns import PatternMatcher
 
 
 @click.command()
 @click.argument("source", type=str, default=".")
-def cli(source: str):
+@click.option("--include-pattern", "-i", multiple=True, help="Glob of files to include; repeat for several.")
+@click.option("--exclude-pattern", "-e", multiple=True, help="Glob of files or directories to exclude.")
+@click.option(
+    "--max-tokens",
+    "-t",
+    type=click.IntRange(min=0),
+    default=None,
+    help="Token budget; the most relevant files that fit in it are kept.",
+)
+def cli(source: str, include_pattern: tuple[str, ...], exclude_pattern: tuple[str, ...], max_tokens: int | None):
     """
     Main entry point for the CLI. This function is called when the CLI is run as a script.
 
@@ -21,14 +32,23 @@ def cli(source: str):
     ----------
     source : str
         The source directory or repository to analyze.
+    include_pattern : tuple[str, ...]
+        Globs a file must match to be included; every file is included if there are none.
+    exclude_pattern : tuple[str, ...]
+        Globs of files and directories to exclude.
+    max_tokens : int | None
+        The token budget of the digest, unbounded if None.
     """
 
     # Main entry point for the CLI. This function is called when the CLI is run as a script.
-    asyncio.run(_async_cli(source))
+    patterns = PatternMatcher(include=include_pattern, exclude=exclude_pattern)
+    asyncio.run(_async_cli(source, patterns, IngestionLimits(max_tokens=max_tokens)))
 
 
 async def _async_cli(
     source: str,
+    patterns: PatternMatcher | None = None,
+    limits: IngestionLimits | None = None,
 ) -> None:
     """
     Analyze a directory or repository and create a text dump of its contents.
@@ -40,6 +60,10 @@ async def _async_cli(
     ----------
     source : str
         The source directory or repository to analyze.
+    patterns : PatternMatcher | None
+        The include and exclude patterns selecting the files to analyze.
+    limits : IngestionLimits | None
+        The limits to enforce, including the token budget.
 
     Raises
     ------
@@ -47,11 +71,11 @@ async def _async_cli(
         If there is an error during the execution of the command, this exception is raised to abort the process.
     """
     try:
-
-        result = main(source)
+        result = await main(source, limits=limits, patterns=patterns)
 
         click.echo("Analysis complete!\nSummary:")
-        click.echo(result)
+        for piece in result.iter_text():
+            click.echo(piece, nl=False)
 
     except Exception as e:
         click.echo(f"Error: {e}", err=True)
@@ -59,4 +83,4 @@ async def _async_cli(
 
 
 if __name__ == "__main__":
-    main()
+    cli()
@@ -0,0 +1,259 @@
+""" Functions to resolve and clone remote Git repositories. """
+
+import os
+import re
+from dataclasses import dataclass
+from urllib.parse import urlparse
+
+from placeholder.config import MAX_FILE_SIZE
+from placeholder.exceptions import GitError, InvalidRepositoryURLError
+from placeholder.utils import run_subprocess
+
+DEFAULT_HOST = "github.com"
+DEFAULT_ALLOWED_SCHEMES: tuple[str, ...] = ("https", "http")
+
+_SLUG_PATTERN = re.compile(r"^[\w.-]+/[\w.-]+$")
+_COMMIT_PATTERN = re.compile(r"^[0-9a-f]{40}$")
+
+
+@dataclass
+class CloneConfig:
+    """
+    Options controlling how much of a repository is fetched.
+
+    Attributes
+    ----------
+    depth : int | None
+        Number of commits of history to fetch, by default only the tip commit. `None` fetches the full history.
+    blob_limit : int | None
+        Blobs larger than this (in bytes) are neither fetched nor checked out, by default `MAX_FILE_SIZE`.
+        `None` fetches every blob.
+    sparse_patterns : list[str] | None
+        Gitignore-style patterns selecting the paths to check out, by default the whole tree.
+    checkout : bool
+        Whether to check out the commit, by default True. Without a checkout, a bare repository holding only the
+        fetched objects is created, to be read with `placeholder.git_objects`.
+    """
+
+    depth: int | None = 1
+    blob_limit: int | None = MAX_FILE_SIZE
+    sparse_patterns: list[str] | None = None
+    checkout: bool = True
+
+
+def normalize_repo_url(source: str, allowed_schemes: tuple[str, ...] = DEFAULT_ALLOWED_SCHEMES) -> str:
+    """
+    Normalize a repository URL or `owner/repo` slug into a canonical clone URL.
+
+    Slugs are resolved against GitHub, URLs without a scheme are assumed to be HTTPS, and the host is lowercased.
+    Trailing slashes and a trailing `.git` suffix are removed, so different spellings of the same repository map
+    to the same URL.
+
+    Parameters
+    ----------
+    source : str
+        The URL or slug provided by the user.
+    allowed_schemes : tuple[str, ...]
+        The URL schemes accepted, by default HTTP and HTTPS.
+
+    Returns
+    -------
+    str
+        The normalized clone URL.
+
+    Raises
+    ------
+    InvalidRepositoryURLError
+        If the source is not a URL with an allowed scheme, or does not point to a repository.
+    """
+    source = source.strip()
+
+    if _SLUG_PATTERN.match(source):
+        source = f"https://{DEFAULT_HOST}/{source}"
+    elif "://" not in source:
+        source = f"https://{source}"
+
+    parsed = urlparse(source)
+    if parsed.scheme not in allowed_schemes:
+        raise InvalidRepositoryURLError(f"Unsupported URL scheme: {parsed.scheme!r}")
+
+    path = parsed.path.rstrip("/").removesuffix(".git")
+    if parsed.scheme == "file":
+        if not path:
+            raise InvalidRepositoryURLError(f"Invalid repository URL: {source}")
+        return f"file://{path}"
+
+    if not parsed.netloc or path.count("/") < 2:
+        raise InvalidRepositoryURLError(f"Invalid repository URL: {source}")
+
+    return f"{parsed.scheme}://{parsed.netloc.lower()}{path}"
+
+
+async def run_git(*args: str, cwd: str | None = None) -> bytes:
+    """
+    Run a git command without blocking the event loop.
+
+    If the caller is cancelled, the command and the processes it spawned are terminated.
+
+    Parameters
+    ----------
+    *args : str
+        The arguments passed to `git`.
+    cwd : str | None
+        The working directory of the command, by default the current directory.
+
+    Returns
+    -------
+    bytes
+        The standard output of the command.
+
+    Raises
+    ------
+    GitError
+        If the command exits with a non-zero status.
+    """
+    returncode, stdout, stderr = await run_subprocess(
+        "git", *args, cwd=cwd, env={**os.environ, "GIT_TERMINAL_PROMPT": "0"}
+    )
+
+    if returncode != 0:
+        raise GitError(f"git {args[0]} failed: {stderr.decode(errors='replace').strip()}")
+
+    return stdout
+
+
+async def resolve_commit(url: str, ref: str = "HEAD") -> str:
+    """
+    Resolve a reference of a remote repository to a commit SHA without cloning it.
+
+    Parameters
+    ----------
+    url : str
+        The clone URL of the repository.
+    ref : str
+        The reference to resolve, by default `HEAD`. Full commit SHAs are returned unchanged.
+
+    Returns
+    -------
+    str
+        The 40-character commit SHA the reference points to.
+
+    Raises
+    ------
+    GitError
+        If the repository cannot be reached or the reference does not exist.
+    """
+    if _COMMIT_PATTERN.match(ref):
+        return ref
+
+    output = await run_git("ls-remote", url, ref)
+    for line in output.decode().splitlines():
+        sha, _, name = line.partition("\t")
+        if name in (ref, f"refs/heads/{ref}", f"refs/tags/{ref}"):
+            return sha
+
+    raise GitError(f"Reference {ref!r} not found in {url}")
+
+
+async def clone_repo(url: str, dest: str, commit: str, config: CloneConfig | None = None) -> None:
+    """
+    Fetch a single commit of a repository into `dest` and, unless disabled by the config, check it out.
+
+    By default only the tip commit is fetched (`--depth 1`) and blobs larger than `MAX_FILE_SIZE` are filtered out
+    on the server side (`--filter=blob:limit=...`). Paths whose blobs were filtered out are excluded from the
+    checkout through sparse-checkout, so git never fetches them lazily afterwards.
+
+    Parameters
+    ----------
+    url : str
+        The clone URL of the repository.
+    dest : str
+        The directory to clone into. It must not exist yet.
+    commit : str
+        The commit SHA to check out.
+    config : CloneConfig | None
+        Options controlling the depth, blob filter and sparse patterns, by default a shallow filtered clone.
+
+    Raises
+    ------
+    GitError
+        If fetching or checking out fails.
+    """
+    config = config or CloneConfig()
+
+    await run_git("init", "--quiet", *([] if config.checkout else ["--bare"]), dest)
+    await run_git("remote", "add", "origin", url, cwd=dest)
+
+    fetch_args = ["fetch", "--quiet", "--no-tags"]
+    if config.depth is not None:
+        fetch_args.append(f"--depth={config.depth}")
+    if config.blob_limit is not None:
+        fetch_args.append(f"--filter=blob:limit={config.blob_limit}")
+    await run_git(*fetch_args, "origin", commit, cwd=dest)
+
+    if not config.checkout:
+        return
+
+    patterns = list(config.sparse_patterns or [])
+    if config.blob_limit is not None:
+        missing = await _missing_paths(dest, commit)
+        if missing:
+            patterns = (patterns or ["/*"]) + [f"!/{_escape_pattern(path)}" for path in missing]
+
+    if patterns:
+        await run_git("config", "core.sparseCheckout", "true", cwd=dest)
+        info_dir = os.path.join(dest, ".git", "info")
+        os.makedirs(info_dir, exist_ok=True)
+        with open(os.path.join(info_dir, "sparse-checkout"), "w", encoding="utf-8") as f:
+            f.write("\n".join(patterns) + "\n")
+
+    await run_git("checkout", "--quiet", commit, cwd=dest)
+
+
+async def _missing_paths(repository: str, commit: str) -> list[str]:
+    """
+    List the paths of a commit whose blobs are absent from a partial clone.
+
+    Parameters
+    ----------
+    repository : str
+        The local repository.
+    commit : str
+        The commit whose tree is inspected.
+
+    Returns
+    -------
+    list[str]
+        The paths whose blobs were filtered out during the fetch.
+    """
+    output = await run_git("rev-list", "--objects", "--missing=print", "--no-object-names", commit, cwd=repository)
+    missing = {line[1:] for line in output.decode().splitlines() if line.startswith("?")}
+    if not missing:
+        return []
+
+    tree = await run_git("ls-tree", "-r", "-z", commit, cwd=repository)
+    paths = []
+    for record in tree.decode(errors="surrogateescape").split("\0"):
+        if not record:
+            continue
+        info, _, path = record.partition("\t")
+        if info.split()[2] in missing:
+            paths.append(path)
+    return paths
+
+
+def _escape_pattern(path: str) -> str:
+    """
+    Escape the characters of a path that have a special meaning in sparse-checkout patterns.
+
+    Parameters
+    ----------
+    path : str
+        A path relative to the repository root.
+
+    Returns
+    -------
+    str
+        The path, matching only itself when used as a pattern.
+    """
+    return re.sub(r"([\\*?\[\]!# ])", r"\\\1", path)
@@ -4,3 +4,37 @@ MAX_FILE_SIZE = 10 * 1024 * 1024  # 10 MB
 MAX_DIRECTORY_DEPTH = 20  # Maximum depth of directory traversal
 MAX_FILES = 10_000  # Maximum number of files to process
 MAX_TOTAL_SIZE_BYTES = 500 * 1024 * 1024  # 500 MB
+MAX_TOKENS: int | None = None  # Token budget of a digest, unbounded by default
+TIMEOUT_GRACE_PERIOD = 5  # Seconds given to child work to stop after a timeout before it is killed
+READ_WORKERS = 8  # Threads reading file contents concurrently during ingestion
+MMAP_THRESHOLD = 1024 * 1024  # 1 MB, files at least this large are memory-mapped rather than read
+BINARY_SNIFF_SIZE = 8 * 1024  # Bytes inspected at the start of a file to detect binary content
+DEFAULT_EXCLUDE_PATTERNS = (".git",)  # Always skipped during ingestion, whatever the submitted patterns
+FRAGMENT_PIN_TIMEOUT = 60 * 60  # Seconds after which a reference held on a stored fragment is considered leaked
+FRAGMENT_BATCH_SIZE = 256  # Files whose fragments are looked up, or stored, in one transaction of the store's index
+TOKEN_ENCODING = "o200k_base"  # tiktoken encoding used for exact token counts
+TOKEN_ENCODING_LOAD_TIMEOUT = 10  # Seconds given to tiktoken to load its encoding, downloading it if it is not cached
+TOKEN_BATCH_SIZE = 64  # Files whose tokens are counted in one call to the tokenizer
+TOKEN_WORKERS = 4  # Threads the tokenizer spreads each batch over
+TOKEN_CACHE_SIZE = 10_000  # Token counts kept in memory, keyed by content hash
+EXACT_TOKEN_COUNT_MAX_BYTES = 256 * 1024  # 256 kB, larger files have their tokens estimated from their size
+BYTES_PER_TOKEN = 4  # Average size of a token, used to estimate token counts
+ENTRY_POINT_NAMES = (  # Files ranked right after READMEs when selecting files within a token budget
+    "__main__.py",
+    "main.py",
+    "app.py",
+    "cli.py",
+    "manage.py",
+    "setup.py",
+    "pyproject.toml",
+    "package.json",
+    "index.js",
+    "index.ts",
+    "main.go",
+    "go.mod",
+    "main.rs",
+    "lib.rs",
+    "Cargo.toml",
+    "Makefile",
+    "Dockerfile",
+)
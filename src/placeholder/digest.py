@@ -0,0 +1,180 @@
+""" Structured digest: a summary, a directory tree and the content of every file in one buffer. """
+
+import time
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+
+from placeholder.formatter import format_file
+
+
+@dataclass(slots=True)
+class DigestFile:
+    """
+    A file of a digest, located in the digest's content buffer.
+
+    Attributes
+    ----------
+    path : str
+        Path relative to the ingested root, using forward slashes.
+    size : int
+        Size of the file in bytes.
+    offset : int
+        Position of the file's content in `Digest.content`, in characters.
+    length : int
+        Length of the file's content, in characters.
+    tokens : int | None
+        Number of tokens of the file's content, if it was counted.
+    """
+
+    path: str
+    size: int
+    offset: int
+    length: int
+    tokens: int | None = None
+
+
+@dataclass(slots=True)
+class Digest:
+    """
+    The outcome of an ingestion, kept as structured data rather than as text.
+
+    The decoded content of every file is stored back to back in a single string, and each `DigestFile` records
+    where its content starts and ends, so a consumer can slice out one file without parsing the text. The text
+    form expected by LLMs is only rendered on demand, by `text` or piece by piece by `iter_text`.
+
+    Attributes
+    ----------
+    summary : str
+        A few lines describing what was ingested and whether a limit was hit.
+    tree : str
+        The directory structure of the ingested files.
+    files : list[DigestFile]
+        The ingested files, in walk order.
+    content : str
+        The content of every file, concatenated in the order of `files`.
+    limit_reached : str | None
+        Name of the limit that stopped the ingestion early, if any.
+    timings : dict[str, float]
+        Seconds spent in each stage of the build: `walk`, `read`, `tokens` and `format`.
+    """
+
+    summary: str
+    tree: str
+    files: list[DigestFile]
+    content: str
+    limit_reached: str | None = None
+    timings: dict[str, float] = field(default_factory=dict, compare=False)
+
+    @property
+    def size(self) -> int:
+        """Total size of the ingested files in bytes."""
+        return sum(file.size for file in self.files)
+
+    @property
+    def header(self) -> str:
+        """The summary followed by the directory structure, as they start the text of the digest."""
+        return f"{self.summary}\nDirectory structure:\n{self.tree}\n\n"
+
+    @property
+    def tokens(self) -> int:
+        """Number of tokens of all the files whose tokens were counted."""
+        return sum(file.tokens or 0 for file in self.files)
+
+    @property
+    def text(self) -> str:
+        """The text of the digest: the header, then one section per file."""
+        return "".join(self.iter_text())
+
+    def render(self) -> "RenderedDigest":
+        """
+        Render the text of the digest, keeping its statistics but not its structure.
+
+        This is the form handed back by a worker process: the text is pickled once, instead of the content buffer
+        being pickled and then rendered again by the receiving process.
+
+        Returns
+        -------
+        RenderedDigest
+            The text of the digest, with the time spent rendering it added to the `format` stage.
+        """
+        started = time.perf_counter()
+        text = self.text
+        timings = {**self.timings, "format": self.timings.get("format", 0.0) + time.perf_counter() - started}
+        return RenderedDigest(text, len(self.files), self.size, self.limit_reached, timings)
+
+    def read(self, file: DigestFile) -> str:
+        """
+        Slice the content of a file out of the content buffer.
+
+        Parameters
+        ----------
+        file : DigestFile
+            One of the files of this digest.
+
+        Returns
+        -------
+        str
+            The decoded content of the file.
+        """
+        return self.content[file.offset : file.offset + file.length]
+
+    def find(self, path: str) -> DigestFile | None:
+        """
+        Look up a file by path.
+
+        Parameters
+        ----------
+        path : str
+            The path of the file, relative to the ingested root.
+
+        Returns
+        -------
+        DigestFile | None
+            The file, or None if it is not part of the digest.
+        """
+        return next((file for file in self.files if file.path == path), None)
+
+    def iter_text(self) -> Iterator[str]:
+        """
+        Render the text of the digest piece by piece, so it can be written out without being held as a whole.
+
+        Yields
+        ------
+        str
+            The header, then the section of each file.
+        """
+        yield self.header
+        for file in self.files:
+            yield format_file(file.path, self.read(file))
+
+    def __str__(self) -> str:
+        return self.text
+
+
+@dataclass(slots=True)
+class RenderedDigest:
+    """
+    The text of a digest along with the statistics of its ingestion, as returned by `Digest.render`.
+
+    Attributes
+    ----------
+    text : str
+        The text of the digest.
+    files : int
+        Number of ingested files.
+    size : int
+        Total size of the ingested files in bytes.
+    limit_reached : str | None
+        Name of the limit that stopped the ingestion early, if any.
+    timings : dict[str, float]
+        Seconds spent in each stage of the build, rendering included.
+    """
+
+    text: str
+    files: int
+    size: int
+    limit_reached: str | None = None
+    timings: dict[str, float] = field(default_factory=dict, compare=False)
+
+    def __str__(self) -> str:
+        return self.text
@@ -1,5 +1,7 @@
 """ Custom exceptions for the application. """
 
+from typing import Any
+
 
 class AsyncTimeoutError(Exception):
     """
@@ -7,4 +9,27 @@ class AsyncTimeoutError(Exception):
 
     This exception is used by the `async_timeout` decorator to signal that the wrapped
     asynchronous function has exceeded the specified time limit for execution.
+
+    Attributes
+    ----------
+    partial_result : Any
+        The result produced before the deadline, when the decorator was asked to collect it.
+    """
+
+    def __init__(self, message: str, partial_result: Any = None) -> None:
+        super().__init__(message)
+        self.partial_result = partial_result
+
+
+class GitError(Exception):
+    """
+    Exception raised when a git command fails.
+
+    The message contains the command that was run and the error output reported by git.
+    """
+
+
+class InvalidRepositoryURLError(ValueError):
+    """
+    Exception raised when a source cannot be interpreted as a supported repository URL.
     """
@@ -0,0 +1,208 @@
+""" Functions to turn ingested files into a text digest. """
+
+import codecs
+import mmap
+from typing import BinaryIO
+
+from placeholder.config import BINARY_SNIFF_SIZE, MMAP_THRESHOLD
+from placeholder.ingestion import FileEntry, IngestionStats
+
+SEPARATOR = "=" * 48
+
+_DECODE_CHUNK_SIZE = 1024 * 1024
+
+
+def read_file_content(entry: FileEntry) -> str:
+    """
+    Read a file and decode it as UTF-8 text.
+
+    Only the first `BINARY_SNIFF_SIZE` bytes decide whether the file is binary: a NUL byte or invalid UTF-8 there
+    marks it as such, while invalid bytes further down are replaced. Files of at least `MMAP_THRESHOLD` bytes are
+    memory-mapped and decoded in chunks instead of being read into a single buffer.
+
+    Parameters
+    ----------
+    entry : FileEntry
+        The file to read.
+
+    Returns
+    -------
+    str
+        The decoded content, or a short marker if the file is binary or cannot be read.
+    """
+    try:
+        with open(entry.abs_path, "rb") as f:
+            head = f.read(BINARY_SNIFF_SIZE)
+            if _is_binary(head):
+                return "[Binary file]"
+            if len(head) < BINARY_SNIFF_SIZE:
+                return head.decode("utf-8", errors="replace")
+            if entry.size < MMAP_THRESHOLD:
+                return (head + f.read()).decode("utf-8", errors="replace")
+            return _decode_mapped(f)
+    except OSError as e:
+        return f"[Error reading file: {e}]"
+
+
+def decode_content(data: bytes) -> str:
+    """
+    Decode the content of a file already in memory, such as a git blob, as UTF-8 text.
+
+    Binary content is detected from the first `BINARY_SNIFF_SIZE` bytes, as in `read_file_content`.
+
+    Parameters
+    ----------
+    data : bytes
+        The raw content of the file.
+
+    Returns
+    -------
+    str
+        The decoded content, or a short marker if the content is binary.
+    """
+    if _is_binary(data[:BINARY_SNIFF_SIZE]):
+        return "[Binary file]"
+    return data.decode("utf-8", errors="replace")
+
+
+def _is_binary(head: bytes) -> bool:
+    """Tell whether the first bytes of a file look binary, tolerating a multi-byte character cut at the end."""
+    if b"\0" in head:
+        return True
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+    except UnicodeDecodeError:
+        return True
+    return False
+
+
+def _decode_mapped(f: BinaryIO) -> str:
+    """Decode an open file as UTF-8 through a memory map, one chunk at a time."""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    parts: list[str] = []
+    try:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:  # The file was truncated to empty since it was measured, and empty files cannot be mapped
+        return ""
+    with mapped:
+        for start in range(0, len(mapped), _DECODE_CHUNK_SIZE):
+            parts.append(decoder.decode(mapped[start : start + _DECODE_CHUNK_SIZE]))
+    parts.append(decoder.decode(b"", final=True))
+    return "".join(parts)
+
+
+def format_file(path: str, content: str) -> str:
+    """
+    Format a single file section of the digest.
+
+    Parameters
+    ----------
+    path : str
+        The path of the file the section describes.
+    content : str
+        The decoded content of the file.
+
+    Returns
+    -------
+    str
+        The file section, headed by its path.
+    """
+    return f"{SEPARATOR}\nFile: {path}\n{SEPARATOR}\n{content}\n\n"
+
+
+def format_tree(paths: list[str]) -> str:
+    """
+    Render a list of relative file paths as an indented directory tree.
+
+    Parameters
+    ----------
+    paths : list[str]
+        Relative paths using forward slashes, in walk order.
+
+    Returns
+    -------
+    str
+        One line per directory or file, indented by depth.
+    """
+    lines: list[str] = []
+    seen_directories: set[str] = set()
+
+    for path in paths:
+        parts = path.split("/")
+        for depth in range(1, len(parts)):
+            directory = "/".join(parts[:depth])
+            if directory not in seen_directories:
+                seen_directories.add(directory)
+                lines.append(f"{'    ' * (depth - 1)}└── {parts[depth - 1]}/")
+        lines.append(f"{'    ' * (len(parts) - 1)}└── {parts[-1]}")
+
+    return "\n".join(lines)
+
+
+def format_summary(source: str, stats: IngestionStats) -> str:
+    """
+    Summarize an ingestion run.
+
+    Parameters
+    ----------
+    source : str
+        The directory or repository that was ingested.
+    stats : IngestionStats
+        The statistics collected during the walk.
+
+    Returns
+    -------
+    str
+        A few lines describing what was ingested and whether a limit was hit.
+    """
+    summary = f"Source: {source}\nFiles analyzed: {stats.files}\nTotal size: {_format_size(stats.total_size)}\n"
+    summary += f"{'Tokens' if stats.exact_tokens else 'Estimated tokens'}: {_format_tokens(stats.tokens)}\n"
+    if stats.skipped_files:
+        summary += f"Files skipped (too large): {stats.skipped_files}\n"
+    if stats.skipped_directories:
+        summary += f"Directories skipped (too deep): {stats.skipped_directories}\n"
+    if stats.truncated:
+        summary += f"Truncated: {stats.limit_reached} limit reached\n"
+    return summary
+
+
+def _format_tokens(tokens: int) -> str:
+    """
+    Format a token count for display.
+
+    Parameters
+    ----------
+    tokens : int
+        The number of tokens.
+
+    Returns
+    -------
+    str
+        The count as is, or in thousands (k) or millions (M).
+    """
+    if tokens < 1000:
+        return str(tokens)
+    if tokens < 1_000_000:
+        return f"{tokens / 1000:.1f}k"
+    return f"{tokens / 1_000_000:.1f}M"
+
+
+def _format_size(size: int) -> str:
+    """
+    Format a size in bytes for display.
+
+    Parameters
+    ----------
+    size : int
+        The size in bytes.
+
+    Returns
+    -------
+    str
+        The size in B, kB or MB.
+    """
+    if size < 1024:
+        return f"{size} B"
+    if size < 1024 * 1024:
+        return f"{size / 1024:.1f} kB"
+    return f"{size / (1024 * 1024):.1f} MB"
@@ -0,0 +1,247 @@
+""" Content-addressed store of per-file ingestion output, shared across repositories and commits. """
+
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import Iterable, Sequence
+from contextlib import suppress
+from pathlib import Path
+
+from placeholder.config import FRAGMENT_PIN_TIMEOUT
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fragments (
+    blob TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    refs INTEGER NOT NULL DEFAULT 0,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (blob, kind)
+)
+"""
+
+
+class FragmentStore:
+    """
+    Per-file ingestion output on disk, keyed by the object ID of the file's git blob and the kind of output.
+
+    A blob ID identifies a file's content, so a file unchanged between two commits, or vendored in several
+    repositories and forks, has the same ID everywhere, and its fragments are computed once. Kinds include the
+    decoded text (`text`) and derived values such as token counts.
+
+    Fragments are plain files written atomically, indexed in a SQLite database that records their size and the
+    number of builds currently using them, so several worker processes can share a store. `evict` deletes the least
+    recently used fragments that no build references until the store fits in `max_bytes`.
+
+    Every transaction of the index goes through its single writer, so builds read and store fragments in batches.
+
+    Parameters
+    ----------
+    directory : str
+        The directory holding the fragments and their index, created on first use.
+    max_bytes : int | None
+        The size the store is shrunk to by `evict`, by default unbounded.
+    """
+
+    def __init__(self, directory: str, max_bytes: int | None = None) -> None:
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+
+    def __getstate__(self) -> dict:
+        # Connections cannot cross process boundaries; each process opens its own
+        return {"directory": self.directory, "max_bytes": self.max_bytes}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(str(state["directory"]), state["max_bytes"])
+
+    def path(self, blob: str, kind: str = "text") -> Path:
+        """
+        Locate a fragment.
+
+        Parameters
+        ----------
+        blob : str
+            The object ID of the blob.
+        kind : str
+            The kind of output, by default the decoded text.
+
+        Returns
+        -------
+        Path
+            The fragment's file, fanned out over subdirectories named after the first two characters of the ID.
+        """
+        return self.directory / blob[:2] / f"{blob[2:]}.{kind}"
+
+    def get(self, blob: str, kind: str = "text") -> str | None:
+        """
+        Read a fragment and take a reference on it, which must be given back with `release`.
+
+        Parameters
+        ----------
+        blob : str
+            The object ID of the blob.
+        kind : str
+            The kind of output, by default the decoded text.
+
+        Returns
+        -------
+        str | None
+            The fragment, or None if it is not stored, in which case no reference is taken.
+        """
+        return self.get_many([blob], kind).get(blob)
+
+    def get_many(self, blobs: Sequence[str], kind: str = "text") -> dict[str, str]:
+        """
+        Read fragments and take a reference on each of them, in a single transaction of the index.
+
+        Parameters
+        ----------
+        blobs : Sequence[str]
+            The object IDs of the blobs. A blob listed several times is referenced as many times.
+        kind : str
+            The kind of output, by default the decoded text.
+
+        Returns
+        -------
+        dict[str, str]
+            The stored fragments, keyed by blob ID. No reference is taken on the blobs missing from it.
+        """
+        now = time.time()
+        with self._connection() as db:
+            found = {
+                blob
+                for blob in blobs
+                if db.execute(
+                    "UPDATE fragments SET refs = refs + 1, last_used = ? WHERE blob = ? AND kind = ?",
+                    (now, blob, kind),
+                ).rowcount
+            }
+
+        contents: dict[str, str] = {}
+        for blob in found:
+            with suppress(OSError):
+                contents[blob] = self.path(blob, kind).read_text(encoding="utf-8")
+        if len(contents) < len(found):
+            self.release([blob for blob in blobs if blob in found and blob not in contents], kind)
+        return contents
+
+    def put(self, blob: str, content: str, kind: str = "text") -> None:
+        """
+        Store a fragment and take a reference on it, which must be given back with `release`.
+
+        Parameters
+        ----------
+        blob : str
+            The object ID of the blob.
+        content : str
+            The fragment.
+        kind : str
+            The kind of output, by default the decoded text.
+        """
+        self.put_many([(blob, content)], kind)
+
+    def put_many(self, fragments: Iterable[tuple[str, str]], kind: str = "text") -> None:
+        """
+        Store fragments and take a reference on each of them, in a single transaction of the index.
+
+        Parameters
+        ----------
+        fragments : Iterable[tuple[str, str]]
+            The object ID of each blob with its fragment.
+        kind : str
+            The kind of output, by default the decoded text.
+        """
+        rows = []
+        for blob, content in fragments:
+            path = self.path(blob, kind)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            staging = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            staging.write_text(content, encoding="utf-8")
+            os.replace(staging, path)
+            rows.append((blob, kind, path.stat().st_size, time.time()))
+
+        with self._connection() as db:
+            db.executemany(
+                "INSERT INTO fragments (blob, kind, size, refs, last_used) VALUES (?, ?, ?, 1, ?) "
+                "ON CONFLICT (blob, kind) DO UPDATE "
+                "SET size = excluded.size, refs = refs + 1, last_used = excluded.last_used",
+                rows,
+            )
+
+    def release(self, blobs: Iterable[str], kind: str = "text") -> None:
+        """
+        Give back the references taken by `get` and `put`.
+
+        Parameters
+        ----------
+        blobs : Iterable[str]
+            The object IDs of the blobs, once per reference taken.
+        kind : str
+            The kind of output, by default the decoded text.
+        """
+        with self._connection() as db:
+            db.executemany(
+                "UPDATE fragments SET refs = MAX(refs - 1, 0) WHERE blob = ? AND kind = ?",
+                ((blob, kind) for blob in blobs),
+            )
+
+    @property
+    def total_size(self) -> int:
+        """Size of all stored fragments in bytes."""
+        with self._connection() as db:
+            return db.execute("SELECT COALESCE(SUM(size), 0) FROM fragments").fetchone()[0]
+
+    def evict(self) -> int:
+        """
+        Delete the least recently used unreferenced fragments until the store fits in `max_bytes`.
+
+        References older than `FRAGMENT_PIN_TIMEOUT` are ignored, so a build that was killed without releasing
+        its references does not keep fragments forever.
+
+        Returns
+        -------
+        int
+            The number of bytes freed.
+        """
+        if self.max_bytes is None:
+            return 0
+
+        excess = self.total_size - self.max_bytes
+        if excess <= 0:
+            return 0
+
+        freed = 0
+        stale = time.time() - FRAGMENT_PIN_TIMEOUT
+        with self._connection() as db:
+            # Lock the index so no build can take a reference on a fragment between its selection and its deletion
+            db.execute("BEGIN IMMEDIATE")
+            candidates = db.execute(
+                "SELECT blob, kind, size FROM fragments WHERE refs = 0 OR last_used < ? ORDER BY last_used",
+                (stale,),
+            ).fetchall()
+            for blob, kind, size in candidates:
+                if freed >= excess:
+                    break
+                self.path(blob, kind).unlink(missing_ok=True)
+                db.execute("DELETE FROM fragments WHERE blob = ? AND kind = ?", (blob, kind))
+                freed += size
+        return freed
+
+    def reset_references(self) -> None:
+        """Drop every reference, for use at startup when no build can be running."""
+        with self._connection() as db:
+            db.execute("UPDATE fragments SET refs = 0")
+
+    def _connection(self) -> sqlite3.Connection:
+        """The index database connection of the calling thread, opened on first use."""
+        db = getattr(self._local, "db", None)
+        if db is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(self.directory / "index.sqlite", timeout=30)
+            db.execute("PRAGMA journal_mode = WAL")
+            db.execute("PRAGMA synchronous = NORMAL")
+            db.execute(_SCHEMA)
+            self._local.db = db
+        return db
@@ -0,0 +1,240 @@
+""" Listing and reading the files of a commit straight from the git object database, without a checkout. """
+
+import os
+import subprocess
+from collections.abc import Iterator
+from types import TracebackType
+
+from placeholder.exceptions import GitError
+from placeholder.ingestion import FileEntry, IngestionLimits, IngestionStats
+from placeholder.patterns import PatternMatcher
+
+_BLOB_MODES = ("100644", "100755")
+
+
+def walk_tree(
+    repository: str,
+    commit: str,
+    limits: IngestionLimits | None = None,
+    stats: IngestionStats | None = None,
+    patterns: PatternMatcher | None = None,
+) -> Iterator[FileEntry]:
+    """
+    List the files of a commit in the same order and under the same limits as `walk_directory`.
+
+    Sizes come from the object database, so files are selected before any content is read. Blobs absent from a
+    partial clone were filtered out for exceeding the fetch's size limit, and are counted as skipped. Symbolic
+    links and submodules are never listed.
+
+    Parameters
+    ----------
+    repository : str
+        The local repository, bare or not.
+    commit : str
+        The commit whose tree is listed.
+    limits : IngestionLimits | None
+        The limits to enforce, by default the values from `placeholder.config`.
+    stats : IngestionStats | None
+        A stats object to update in place, so callers can inspect it after (or during) the walk.
+    patterns : PatternMatcher | None
+        The include and exclude patterns to apply, by default only `DEFAULT_EXCLUDE_PATTERNS` are excluded.
+
+    Yields
+    ------
+    FileEntry
+        The next file that fits within the limits, with its blob's object ID.
+
+    Raises
+    ------
+    GitError
+        If the tree or the object sizes cannot be listed.
+    """
+    limits = limits or IngestionLimits()
+    stats = stats if stats is not None else IngestionStats()
+    patterns = patterns or PatternMatcher()
+
+    blobs = list_blobs(repository, commit)
+    sizes = _object_sizes(repository)
+    included_directories: dict[str, bool] = {}
+    skipped_directories: set[str] = set()
+
+    for path, blob in sorted(blobs, key=lambda item: _walk_order(item[0])):
+        parts = path.split("/")
+        depth = len(parts) - 1
+        if depth > limits.max_directory_depth:
+            skipped_directories.add("/".join(parts[: limits.max_directory_depth + 1]))
+            continue
+        if not _directories_included(parts[:-1], patterns, included_directories) or not patterns.includes_file(path):
+            continue
+
+        size = sizes.get(blob)
+        if size is None or size > limits.max_file_size:
+            stats.skipped_files += 1
+            continue
+
+        if stats.files >= limits.max_files:
+            stats.limit_reached = "max_files"
+            break
+
+        if stats.total_size + size > limits.max_total_size_bytes:
+            stats.limit_reached = "max_total_size_bytes"
+            break
+
+        stats.files += 1
+        stats.total_size += size
+        yield FileEntry(path=path, abs_path="", size=size, depth=depth, blob=blob)
+
+    stats.skipped_directories += len(skipped_directories)
+
+
+def list_blobs(repository: str, commit: str) -> list[tuple[str, str]]:
+    """
+    List the regular files of a commit with `git ls-tree`.
+
+    Parameters
+    ----------
+    repository : str
+        The local repository.
+    commit : str
+        The commit whose tree is listed.
+
+    Returns
+    -------
+    list[tuple[str, str]]
+        The `(path, object ID)` of every regular file, in git's order.
+    """
+    output = _run_git(repository, "ls-tree", "-r", "-z", commit)
+    blobs = []
+    for record in output.decode(errors="surrogateescape").split("\0"):
+        if not record:
+            continue
+        info, _, path = record.partition("\t")
+        mode, kind, oid = info.split()
+        if kind == "blob" and mode in _BLOB_MODES:
+            blobs.append((path, oid))
+    return blobs
+
+
+class GitObjectReader:
+    """
+    A long-lived `git cat-file --batch` process reading blobs from one repository.
+
+    Objects are requested one at a time over the process's standard input, so reading many small files costs a
+    single process rather than one per file. Use it as a context manager to stop the process.
+    """
+
+    def __init__(self, repository: str) -> None:
+        self.repository = repository
+        # The process serves every `read` until `close`, which stops it, so it cannot be scoped by a `with` block
+        self._process = subprocess.Popen(  # pylint: disable=consider-using-with
+            ["git", "cat-file", "--batch"],
+            cwd=repository,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            env=_git_env(),
+        )
+
+    def read(self, oid: str) -> bytes:
+        """
+        Read the content of an object.
+
+        Parameters
+        ----------
+        oid : str
+            The object ID.
+
+        Returns
+        -------
+        bytes
+            The raw content of the object.
+
+        Raises
+        ------
+        GitError
+            If the object does not exist or the process has exited.
+        """
+        try:
+            self._process.stdin.write(f"{oid}\n".encode())
+            self._process.stdin.flush()
+            header = self._process.stdout.readline().decode().split()
+        except (BrokenPipeError, ValueError) as e:
+            raise GitError(f"git cat-file failed: {e}") from e
+
+        if len(header) != 3:
+            raise GitError(f"git cat-file failed: object {oid} is missing")
+
+        content = self._process.stdout.read(int(header[2]))
+        self._process.stdout.read(1)  # Trailing newline
+        return content
+
+    def close(self) -> None:
+        """Stop the process."""
+        if self._process.poll() is None:
+            self._process.stdin.close()
+            try:
+                self._process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+                self._process.wait()
+        self._process.stdout.close()
+
+    def __enter__(self) -> "GitObjectReader":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+
+def _object_sizes(repository: str) -> dict[str, int]:
+    """
+    Map the ID of every object present in a repository to its size.
+
+    Unlike `git ls-tree -l`, enumerating the objects that are present never makes git fetch the blobs a partial
+    clone filtered out.
+    """
+    output = _run_git(
+        repository, "cat-file", "--batch-all-objects", "--batch-check=%(objectname) %(objecttype) %(objectsize)"
+    )
+    sizes = {}
+    for line in output.decode().splitlines():
+        oid, kind, size = line.split()
+        if kind == "blob":
+            sizes[oid] = int(size)
+    return sizes
+
+
+def _walk_order(path: str) -> list[tuple[int, str]]:
+    """Sort key listing, within each directory, files by name before subdirectories by name."""
+    *directories, name = path.split("/")
+    return [(1, directory) for directory in directories] + [(0, name)]
+
+
+def _directories_included(directories: list[str], patterns: PatternMatcher, cache: dict[str, bool]) -> bool:
+    """Tell whether every ancestor directory of a file is accepted by the patterns, caching the answers."""
+    path = ""
+    for directory in directories:
+        path = f"{path}/{directory}" if path else directory
+        if path not in cache:
+            cache[path] = patterns.includes_directory(path)
+        if not cache[path]:
+            return False
+    return True
+
+
+def _run_git(repository: str, *args: str) -> bytes:
+    """Run a git command synchronously in a repository and return its output, raising `GitError` on failure."""
+    process = subprocess.run(["git", *args], cwd=repository, capture_output=True, env=_git_env(), check=False)
+    if process.returncode != 0:
+        raise GitError(f"git {args[0]} failed: {process.stderr.decode(errors='replace').strip()}")
+    return process.stdout
+
+
+def _git_env() -> dict[str, str]:
+    """Environment of git commands, which must never prompt for credentials."""
+    return {**os.environ, "GIT_TERMINAL_PROMPT": "0"}
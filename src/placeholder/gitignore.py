@@ -0,0 +1,140 @@
+""" Parsing and evaluation of `.gitignore` rules during the directory walk. """
+
+import os
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+
+from placeholder.patterns import glob_to_regex
+
+IGNORE_FILE = ".gitignore"
+EXCLUDE_FILE = os.path.join(".git", "info", "exclude")
+
+
+@dataclass(frozen=True)
+class IgnoreRule:
+    """
+    A single line of an ignore file.
+
+    Attributes
+    ----------
+    regex : re.Pattern[str]
+        Expression matching the paths the rule applies to, relative to the walked root.
+    negated : bool
+        Whether the rule re-includes the paths it matches (`!pattern`).
+    directory_only : bool
+        Whether the rule only applies to directories (`pattern/`).
+    """
+
+    regex: re.Pattern[str]
+    negated: bool
+    directory_only: bool
+
+
+class IgnoreRules:
+    """
+    The ignore rules in effect in a directory: those of its own ignore file followed by those inherited from its
+    ancestors.
+
+    Rule sets are immutable, so a directory without an ignore file shares the rule set of its parent. As in git,
+    the last matching rule decides, which gives the rules of deeper ignore files precedence.
+    """
+
+    def __init__(self, rules: tuple[IgnoreRule, ...] = ()) -> None:
+        self.rules = rules
+
+    def extend(self, path: str, base: str) -> "IgnoreRules":
+        """
+        Add the rules of an ignore file to those inherited by a directory.
+
+        Parameters
+        ----------
+        path : str
+            The ignore file to read; it is parsed at most once while it is unchanged.
+        base : str
+            Path of the directory the rules are relative to, from the walked root, empty or ending with a slash.
+
+        Returns
+        -------
+        IgnoreRules
+            The combined rule set, or this rule set if the file is missing or has no rules.
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return self
+
+        rules = _load_rules(path, base, stat.st_mtime_ns, stat.st_size)
+        return IgnoreRules(self.rules + rules) if rules else self
+
+    def ignores(self, path: str, is_dir: bool) -> bool:
+        """
+        Tell whether a path is ignored.
+
+        Parameters
+        ----------
+        path : str
+            Path relative to the walked root, using forward slashes.
+        is_dir : bool
+            Whether the path is a directory.
+
+        Returns
+        -------
+        bool
+            True if the last rule matching the path is not negated.
+        """
+        for rule in reversed(self.rules):
+            if rule.directory_only and not is_dir:
+                continue
+            if rule.regex.fullmatch(path):
+                return not rule.negated
+        return False
+
+
+@lru_cache(maxsize=4096)
+# The modification time and size are only read by `lru_cache`, as part of the key
+# pylint: disable-next=unused-argument
+def _load_rules(path: str, base: str, mtime_ns: int, size: int) -> tuple[IgnoreRule, ...]:
+    """Parse an ignore file; the modification time and size are part of the cache key so edits are picked up."""
+    try:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            return tuple(rule for line in f if (rule := parse_rule(line, base)) is not None)
+    except OSError:
+        return ()
+
+
+def parse_rule(line: str, base: str = "") -> IgnoreRule | None:
+    """
+    Parse a line of an ignore file.
+
+    Parameters
+    ----------
+    line : str
+        The line, with or without its line terminator.
+    base : str
+        Path of the directory containing the ignore file, from the walked root, empty or ending with a slash.
+
+    Returns
+    -------
+    IgnoreRule | None
+        The rule, or None for blank lines and comments.
+    """
+    line = line.rstrip("\r\n")
+    if not line.endswith("\\ "):
+        line = line.rstrip(" ")
+    if not line or line.startswith("#"):
+        return None
+
+    negated = line.startswith("!")
+    if negated:
+        line = line[1:]
+    elif line.startswith("\\"):
+        line = line[1:]
+
+    directory_only = line.endswith("/")
+    pattern = line.replace("\\ ", " ")
+    if not pattern.strip("/"):
+        return None
+
+    regex = re.compile(re.escape(base) + glob_to_regex(pattern), re.DOTALL)
+    return IgnoreRule(regex=regex, negated=negated, directory_only=directory_only)
@@ -0,0 +1,230 @@
+""" Bounded, incremental traversal of a local directory. """
+
+import os
+from collections.abc import Iterator
+from dataclasses import dataclass
+
+from placeholder.config import MAX_DIRECTORY_DEPTH, MAX_FILE_SIZE, MAX_FILES, MAX_TOKENS, MAX_TOTAL_SIZE_BYTES
+from placeholder.gitignore import EXCLUDE_FILE, IGNORE_FILE, IgnoreRules
+from placeholder.patterns import PatternMatcher
+
+
+@dataclass
+class IngestionLimits:
+    """
+    Limits enforced while walking a directory.
+
+    Attributes
+    ----------
+    max_file_size : int
+        Files larger than this (in bytes) are skipped.
+    max_directory_depth : int
+        Directories nested deeper than this below the root are not descended into.
+    max_files : int
+        The walk stops once this many files have been yielded.
+    max_total_size_bytes : int
+        The walk stops before the cumulative size of yielded files would exceed this.
+    max_tokens : int | None
+        Token budget of the digest: once the walk is complete, the files ranked most relevant are kept until their
+        estimated tokens fill it, and the others are never read. Unbounded if None.
+    """
+
+    max_file_size: int = MAX_FILE_SIZE
+    max_directory_depth: int = MAX_DIRECTORY_DEPTH
+    max_files: int = MAX_FILES
+    max_total_size_bytes: int = MAX_TOTAL_SIZE_BYTES
+    max_tokens: int | None = MAX_TOKENS
+
+
+@dataclass
+class IngestionStats:
+    """
+    Counters updated while a walk is in progress.
+
+    Attributes
+    ----------
+    files : int
+        Number of files yielded so far.
+    total_size : int
+        Cumulative size (in bytes) of the files yielded so far.
+    skipped_files : int
+        Number of files skipped because they exceed `max_file_size`.
+    skipped_directories : int
+        Number of directories not descended into because of `max_directory_depth`.
+    limit_reached : str | None
+        Name of the limit that stopped the walk early, if any.
+    tokens : int
+        Number of tokens of the files read so far, or estimated from their sizes before they are read.
+    exact_tokens : bool
+        Whether every file was tokenized to count `tokens`, rather than some of them estimated from their sizes.
+    """
+
+    files: int = 0
+    total_size: int = 0
+    skipped_files: int = 0
+    skipped_directories: int = 0
+    limit_reached: str | None = None
+    tokens: int = 0
+    exact_tokens: bool = False
+
+    @property
+    def truncated(self) -> bool:
+        """Whether the walk stopped before visiting the whole tree."""
+        return self.limit_reached is not None
+
+
+@dataclass
+class FileEntry:
+    """
+    A file discovered during the walk.
+
+    Attributes
+    ----------
+    path : str
+        Path relative to the walked root, using forward slashes.
+    abs_path : str
+        Absolute path on disk.
+    size : int
+        Size of the file in bytes.
+    depth : int
+        Number of directories between the root and the file.
+    blob : str | None
+        Object ID of the file's blob when the entry was listed from a git tree rather than from the file system,
+        in which case `abs_path` is empty.
+    tokens : int | None
+        Number of tokens of the file's content, once it has been read and counted.
+    """
+
+    path: str
+    abs_path: str
+    size: int
+    depth: int
+    blob: str | None = None
+    tokens: int | None = None
+
+
+def walk_directory(
+    root: str,
+    limits: IngestionLimits | None = None,
+    stats: IngestionStats | None = None,
+    patterns: PatternMatcher | None = None,
+    respect_gitignore: bool = True,
+) -> Iterator[FileEntry]:
+    """
+    Walk a directory with `os.scandir` and yield its files one at a time.
+
+    Within a directory, files are yielded in name order before its subdirectories are visited. Limits are checked
+    before each file is yielded, so the walk never looks further into the tree than it has to. Directories
+    rejected by the patterns or ignored by git are pruned before they are listed. Symbolic links are never
+    followed.
+
+    Ignore rules are read from the root's `.git/info/exclude` and from the `.gitignore` of every directory
+    visited. Each directory inherits the rule set of its parent, extended with its own file if it has one, so
+    every ignore file is parsed once.
+
+    Parameters
+    ----------
+    root : str
+        The directory to walk.
+    limits : IngestionLimits | None
+        The limits to enforce, by default the values from `placeholder.config`.
+    stats : IngestionStats | None
+        A stats object to update in place, so callers can inspect it after (or during) the walk.
+    patterns : PatternMatcher | None
+        The include and exclude patterns to apply, by default only `DEFAULT_EXCLUDE_PATTERNS` are excluded.
+    respect_gitignore : bool
+        Whether to skip the files and directories ignored by git, by default True.
+
+    Yields
+    ------
+    FileEntry
+        The next file that fits within the limits.
+    """
+    limits = limits or IngestionLimits()
+    stats = stats if stats is not None else IngestionStats()
+    patterns = patterns or PatternMatcher()
+    root = os.path.abspath(root)
+
+    rules = IgnoreRules()
+    if respect_gitignore:
+        rules = rules.extend(os.path.join(root, EXCLUDE_FILE), "")
+
+    # Stack of (absolute path, relative prefix, depth, inherited ignore rules); directories are popped in name order
+    stack: list[tuple[str, str, int, IgnoreRules]] = [(root, "", 0, rules)]
+
+    while stack:
+        directory, prefix, depth, rules = stack.pop()
+        files, subdirectories = _scan(directory)
+        if respect_gitignore and any(name == IGNORE_FILE for name, _, _ in files):
+            rules = rules.extend(os.path.join(directory, IGNORE_FILE), prefix)
+
+        subdirectories = [
+            (name, path)
+            for name, path in subdirectories
+            if patterns.includes_directory(prefix + name) and not rules.ignores(prefix + name, is_dir=True)
+        ]
+
+        for name, abs_path, size in files:
+            if not patterns.includes_file(prefix + name) or rules.ignores(prefix + name, is_dir=False):
+                continue
+
+            if size > limits.max_file_size:
+                stats.skipped_files += 1
+                continue
+
+            if stats.files >= limits.max_files:
+                stats.limit_reached = "max_files"
+                return
+
+            if stats.total_size + size > limits.max_total_size_bytes:
+                stats.limit_reached = "max_total_size_bytes"
+                return
+
+            stats.files += 1
+            stats.total_size += size
+            yield FileEntry(path=prefix + name, abs_path=abs_path, size=size, depth=depth)
+
+        if depth >= limits.max_directory_depth:
+            stats.skipped_directories += len(subdirectories)
+            continue
+
+        for name, abs_path in reversed(subdirectories):
+            stack.append((abs_path, f"{prefix}{name}/", depth + 1, rules))
+
+
+def _scan(directory: str) -> tuple[list[tuple[str, str, int]], list[tuple[str, str]]]:
+    """
+    List the regular files and subdirectories of a single directory.
+
+    Parameters
+    ----------
+    directory : str
+        The directory to list.
+
+    Returns
+    -------
+    tuple[list[tuple[str, str, int]], list[tuple[str, str]]]
+        The `(name, path, size)` of each file and the `(name, path)` of each subdirectory, both sorted by name.
+        Unreadable directories yield two empty lists.
+    """
+    files: list[tuple[str, str, int]] = []
+    subdirectories: list[tuple[str, str]] = []
+
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                try:
+                    if entry.is_symlink():
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirectories.append((entry.name, entry.path))
+                    elif entry.is_file(follow_symlinks=False):
+                        files.append((entry.name, entry.path, entry.stat(follow_symlinks=False).st_size))
+                except OSError:
+                    continue
+    except OSError:
+        return [], []
+
+    files.sort()
+    subdirectories.sort()
+    return files, subdirectories
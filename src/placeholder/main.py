@@ -1,28 +1,436 @@
 """ Main entry point for the application. """
 
-from typing import Any
+import os
+import threading
+import time
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import islice
 
 from console import console
+from placeholder.budget import select_within_budget
+from placeholder.config import FRAGMENT_BATCH_SIZE, READ_WORKERS, TOKEN_BATCH_SIZE
+from placeholder.digest import Digest, DigestFile, RenderedDigest
+from placeholder.formatter import decode_content, format_file, format_summary, format_tree, read_file_content
+from placeholder.fragments import FragmentStore
+from placeholder.git_objects import GitObjectReader, walk_tree
+from placeholder.ingestion import FileEntry, IngestionLimits, IngestionStats, walk_directory
+from placeholder.patterns import PatternMatcher
+from placeholder.timing import StageTimer
+from placeholder.tokens import count_file_tokens, estimate_tokens
+from placeholder.utils import CancelEvent, run_cancellable
+
+CANCEL_CHECK_INTERVAL = 0.05  # In seconds
 
 
 async def main(
     source: str,
-) -> Any:
+    limits: IngestionLimits | None = None,
+    name: str | None = None,
+    patterns: PatternMatcher | None = None,
+) -> Digest:
     """
     This is the main entry point for the application. This is where the core logic
     of the application starts.
 
+    The digest is built by `build_digest` in a worker thread, so the event loop stays responsive, and is returned
+    as structured data whose text is rendered on demand. Cancelling the returned coroutine stops the worker at the
+    next file; inside `async_timeout(partial=True)`, the digest built up to that point is attached to the timeout
+    error.
+
     Parameters
     ----------
     source : str
-        The source to analyze, which can be a URL (for a Git repository) or a local directory path.
+        The local directory path to analyze.
+    limits : IngestionLimits | None
+        The limits to enforce during the walk, by default the values from `placeholder.config`.
+    name : str | None
+        The name shown in the digest summary, by default the source path.
+    patterns : PatternMatcher | None
+        The include and exclude patterns selecting the files to ingest, by default every file outside `.git`.
 
     Returns
     -------
-    Any
-        The resulting information from your implementation, to be used by the CLI or the API.
+    Digest
+        The digest: a summary with the number of tokens of the whole digest, the directory structure, and every
+        ingested file with its token count, its content held in one buffer.
+
+    Raises
+    ------
+    ValueError
+        If the source is not an existing directory.
     """
 
     console.log(f"New query: '{source}'")
 
-    return "This website was generated with the default values of the template! It does not do anything by default."
+    return await run_cancellable(
+        None,
+        build_digest,
+        source,
+        limits=limits,
+        name=name,
+        patterns=patterns,
+        cancel_event=threading.Event(),
+    )
+
+
+def build_digest(
+    source: str,
+    limits: IngestionLimits | None = None,
+    name: str | None = None,
+    patterns: PatternMatcher | None = None,
+    cancel_event: CancelEvent | None = None,
+    commit: str | None = None,
+    fragments: FragmentStore | None = None,
+) -> Digest:
+    """
+    Build the digest of a local directory, or of a commit of a local git repository.
+
+    The source directory is walked incrementally: each file is handed to a pool of `READ_WORKERS` reader threads
+    as soon as the walk yields it, and the walk stops as soon as one of the configured limits is reached. With a
+    `commit`, files are listed from its tree and read through a single `git cat-file --batch` process instead, so
+    the repository needs no checkout. This function is synchronous and blocks on I/O and decoding, and is meant to
+    run in a worker thread or process.
+
+    Parameters
+    ----------
+    source : str
+        The local directory path to analyze.
+    limits : IngestionLimits | None
+        The limits to enforce during the walk, by default the values from `placeholder.config`.
+    name : str | None
+        The name shown in the digest summary, by default the source path.
+    patterns : PatternMatcher | None
+        The include and exclude patterns selecting the files to ingest, by default every file outside `.git`.
+    cancel_event : CancelEvent | None
+        An event checked between files; once it is set the walk stops and the digest of the files read so far is
+        returned, flagged as truncated by the `time` limit.
+    commit : str | None
+        The commit to read from the object database of the repository at `source`, by default None to walk the
+        directory itself.
+    fragments : FragmentStore | None
+        The store of decoded blobs and token counts reused across commits when reading from the object database,
+        by default None.
+
+    Returns
+    -------
+    Digest
+        The digest: a summary with the number of tokens of the whole digest, the directory structure, and every
+        ingested file with its token count, its content held in one buffer, along with the time spent in each
+        stage of the build.
+
+    Raises
+    ------
+    ValueError
+        If the source is not an existing directory.
+    """
+    if not os.path.isdir(source):
+        raise ValueError(f"Directory not found: {source}")
+
+    stats = IngestionStats()
+    timer = StageTimer()
+    read: list[FileEntry] = []
+    contents: list[str] = []
+    batch: list[tuple[FileEntry, str]] = []
+
+    # The walk is lazy and runs inside the reader, so the time of the read stage is what is left of the loop
+    entries = timer.timed(_list_files(source, commit, limits, stats, patterns, name or source), "walk")
+    if cancel_event is not None:
+        entries = _until_cancelled(entries, cancel_event, stats)
+
+    stats.exact_tokens = True  # Until a count is estimated
+    with timer.measure("read"):
+        for entry, content in _read_files(source, commit, entries, fragments):
+            read.append(entry)
+            contents.append(content)
+            batch.append((entry, content))
+            if len(batch) >= TOKEN_BATCH_SIZE:
+                with timer.measure("tokens"):
+                    stats.tokens += count_file_tokens(batch, fragments, stats=stats)
+                batch.clear()
+        with timer.measure("tokens"):
+            stats.tokens += count_file_tokens(batch, fragments, stats=stats)
+    timer.add("read", -timer.durations.get("walk", 0.0) - timer.durations["tokens"])
+
+    with timer.measure("format"):
+        files: list[DigestFile] = []
+        offset = 0
+        for entry, content in zip(read, contents):
+            files.append(DigestFile(entry.path, entry.size, offset, len(content), entry.tokens))
+            offset += len(content)
+        summary = format_summary(name or source, stats)
+        tree = format_tree([file.path for file in files])
+
+    return Digest(
+        summary=summary,
+        tree=tree,
+        files=files,
+        content="".join(contents),
+        limit_reached=stats.limit_reached,
+        timings=timer.durations,
+    )
+
+
+def render_digest(
+    source: str,
+    limits: IngestionLimits | None = None,
+    name: str | None = None,
+    patterns: PatternMatcher | None = None,
+    cancel_event: CancelEvent | None = None,
+    commit: str | None = None,
+    fragments: FragmentStore | None = None,
+) -> RenderedDigest:
+    """
+    Build the digest of a local directory with `build_digest` and render its text.
+
+    Meant to run in a worker process, which then hands back the text rather than the structured digest. Once
+    `cancel_event` is set, the text of the files read so far is returned.
+
+    Parameters
+    ----------
+    source : str
+        The local directory path to analyze.
+    limits : IngestionLimits | None
+        The limits to enforce during the walk, by default the values from `placeholder.config`.
+    name : str | None
+        The name shown in the digest summary, by default the source path.
+    patterns : PatternMatcher | None
+        The include and exclude patterns selecting the files to ingest, by default every file outside `.git`.
+    cancel_event : CancelEvent | None
+        An event checked between files, stopping the walk once it is set.
+    commit : str | None
+        The commit to read from the object database of the repository at `source`, by default None to walk the
+        directory itself.
+    fragments : FragmentStore | None
+        The store of decoded blobs and token counts reused across commits, by default None.
+
+    Returns
+    -------
+    RenderedDigest
+        The text of the digest and the statistics of its build.
+    """
+    digest = build_digest(
+        source,
+        limits=limits,
+        name=name,
+        patterns=patterns,
+        cancel_event=cancel_event,
+        commit=commit,
+        fragments=fragments,
+    )
+    return digest.render()
+
+
+def iter_digest(
+    source: str,
+    limits: IngestionLimits | None = None,
+    name: str | None = None,
+    patterns: PatternMatcher | None = None,
+    cancel_event: CancelEvent | None = None,
+    commit: str | None = None,
+    fragments: FragmentStore | None = None,
+    timer: StageTimer | None = None,
+) -> Iterator[str]:
+    """
+    Generate the digest of a local directory, or of a commit of a local git repository, piece by piece.
+
+    The tree is walked first, collecting only file metadata, so the summary and directory structure can be
+    produced before any file is read, with a token count estimated from the file sizes. The content of each file
+    is then read and yielded one file at a time, so a consumer can forward the digest as it is produced without
+    ever holding all of it. Each piece is produced on demand and blocks on I/O, so the generator is meant to be
+    advanced from a worker thread.
+
+    Parameters
+    ----------
+    source : str
+        The local directory path to analyze.
+    limits : IngestionLimits | None
+        The limits to enforce during the walk, by default the values from `placeholder.config`.
+    name : str | None
+        The name shown in the digest summary, by default the source path.
+    patterns : PatternMatcher | None
+        The include and exclude patterns selecting the files to ingest, by default every file outside `.git`.
+    cancel_event : CancelEvent | None
+        An event checked between files, during the walk and then between sections; once it is set the walk or the
+        digest ends early.
+    commit : str | None
+        The commit to read from the object database of the repository at `source`, by default None to walk the
+        directory itself.
+    fragments : FragmentStore | None
+        The store of decoded blobs reused across commits when reading from the object database, by default None.
+    timer : StageTimer | None
+        The timer receiving the time spent in the `walk`, `read` and `format` stages, by default None.
+
+    Yields
+    ------
+    str
+        The summary and directory structure, then one section per file.
+
+    Raises
+    ------
+    ValueError
+        If the source is not an existing directory.
+    """
+    if not os.path.isdir(source):
+        raise ValueError(f"Directory not found: {source}")
+
+    timer = timer or StageTimer()
+    stats = IngestionStats()
+    with timer.measure("walk"):
+        listed = _list_files(source, commit, limits, stats, patterns, name or source)
+        entries = list(listed if cancel_event is None else _until_cancelled(listed, cancel_event, stats))
+    stats.tokens = sum(estimate_tokens(entry.size) for entry in entries)
+
+    with timer.measure("format"):
+        tree = format_tree([entry.path for entry in entries])
+        header = f"{format_summary(name or source, stats)}\nDirectory structure:\n{tree}\n\n"
+    yield header
+    to_read = entries if cancel_event is None else _until_cancelled(entries, cancel_event, stats)
+    for entry, content in timer.timed(_read_files(source, commit, to_read, fragments), "read"):
+        with timer.measure("format"):
+            section = format_file(entry.path, content)
+        yield section
+
+
+def read_files(entries: Iterable[FileEntry], workers: int = READ_WORKERS) -> Iterator[tuple[FileEntry, str]]:
+    """
+    Read files in a bounded thread pool, preserving their order.
+
+    At most twice as many files as there are workers are read ahead of the consumer, so a slow consumer or a large
+    tree never buffers more than a few file contents.
+
+    Parameters
+    ----------
+    entries : Iterable[FileEntry]
+        The files to read, typically the output of `walk_directory`.
+    workers : int
+        The number of reader threads, by default `READ_WORKERS`.
+
+    Yields
+    ------
+    tuple[FileEntry, str]
+        Each entry with its decoded content, in the order of `entries`.
+    """
+    pending: deque[tuple[FileEntry, Future[str]]] = deque()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="reader") as executor:
+        for entry in entries:
+            pending.append((entry, executor.submit(read_file_content, entry)))
+            if len(pending) >= 2 * workers:
+                entry, future = pending.popleft()
+                yield entry, future.result()
+
+        while pending:
+            entry, future = pending.popleft()
+            yield entry, future.result()
+
+
+def read_blobs(
+    repository: str,
+    entries: Iterable[FileEntry],
+    fragments: FragmentStore | None = None,
+) -> Iterator[tuple[FileEntry, str]]:
+    """
+    Read files from the object database of a repository, through one `git cat-file --batch` process.
+
+    With a fragment store, blobs whose fragment is already stored are not read at all: re-ingesting a new commit,
+    or a fork, only reads the files whose content is new to the store, and reassembles the others from their
+    fragments. The `git cat-file` process is only started once a blob has to be read.
+
+    Parameters
+    ----------
+    repository : str
+        The local repository.
+    entries : Iterable[FileEntry]
+        The files to read, typically the output of `walk_tree`.
+    fragments : FragmentStore | None
+        The store of decoded blobs to reuse and fill, by default None to read every blob.
+
+    Yields
+    ------
+    tuple[FileEntry, str]
+        Each entry with its decoded content, in the order of `entries`.
+    """
+    reader: GitObjectReader | None = None
+    referenced: list[str] = []
+    created: list[tuple[str, str]] = []
+    entries = iter(entries)
+    try:
+        # Fragments are looked up and stored `FRAGMENT_BATCH_SIZE` files at a time, in one transaction each
+        while batch := list(islice(entries, FRAGMENT_BATCH_SIZE)):
+            stored = fragments.get_many([entry.blob for entry in batch]) if fragments is not None else {}
+            referenced.extend(entry.blob for entry in batch if entry.blob in stored)
+            for entry in batch:
+                content = stored.get(entry.blob)
+                if content is None:
+                    reader = reader or GitObjectReader(repository)
+                    content = decode_content(reader.read(entry.blob))
+                    if fragments is not None:
+                        created.append((entry.blob, content))
+                yield entry, content
+            if created:
+                fragments.put_many(created)
+                referenced.extend(blob for blob, _ in created)
+                created = []
+    finally:
+        if reader is not None:
+            reader.close()
+        if created:
+            fragments.put_many(created)
+            referenced.extend(blob for blob, _ in created)
+        # The fragments used by this digest are protected from eviction until it is complete
+        if referenced:
+            fragments.release(referenced)
+
+
+def _list_files(
+    source: str,
+    commit: str | None,
+    limits: IngestionLimits | None,
+    stats: IngestionStats,
+    patterns: PatternMatcher | None,
+    name: str,
+) -> Iterator[FileEntry]:
+    """
+    List the files to ingest from the commit's tree if there is one, otherwise from the directory.
+
+    With a token budget, the whole tree is listed before the files that fit in it, along with a summary showing
+    `name`, are selected.
+    """
+    if commit is not None:
+        entries = walk_tree(source, commit, limits=limits, stats=stats, patterns=patterns)
+    else:
+        entries = walk_directory(source, limits=limits, stats=stats, patterns=patterns)
+    if limits is not None and limits.max_tokens is not None:
+        return iter(select_within_budget(entries, limits.max_tokens, stats, name))
+    return entries
+
+
+def _read_files(
+    source: str,
+    commit: str | None,
+    entries: Iterable[FileEntry],
+    fragments: FragmentStore | None,
+) -> Iterator[tuple[FileEntry, str]]:
+    """Read files from the object database if there is a commit, otherwise from the file system."""
+    if commit is not None:
+        return read_blobs(source, entries, fragments)
+    return read_files(entries)
+
+
+def _until_cancelled(
+    entries: Iterable[FileEntry], cancel_event: CancelEvent, stats: IngestionStats
+) -> Iterator[FileEntry]:
+    """
+    Forward entries until `cancel_event` is set, then flag the run as truncated by the `time` limit.
+
+    The event may be a proxy to another process, so it is polled at a bounded rate rather than per file.
+    """
+    next_check = time.monotonic()
+    for entry in entries:
+        if time.monotonic() >= next_check:
+            if cancel_event.is_set():
+                stats.limit_reached = "time"
+                return
+            next_check = time.monotonic() + CANCEL_CHECK_INTERVAL
+        yield entry
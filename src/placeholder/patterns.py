@@ -0,0 +1,196 @@
+""" Include and exclude glob patterns, compiled once and applied while a directory is walked. """
+
+import re
+from collections.abc import Iterable
+from enum import Enum
+
+from placeholder.config import DEFAULT_EXCLUDE_PATTERNS
+
+
+class PatternType(str, Enum):
+    """How the patterns submitted with a query are applied."""
+
+    INCLUDE = "include"
+    EXCLUDE = "exclude"
+
+
+class PatternMatcher:
+    """
+    A set of include and exclude globs compiled into one regular expression per kind.
+
+    Patterns follow `.gitignore` conventions: a pattern without a slash matches a file or directory name at any
+    depth, while a pattern containing a slash is anchored to the root of the walk. `*` and `?` never match a
+    slash, `**` matches any number of directories, and a pattern matching a directory matches everything below it.
+
+    Directories are tested before they are descended into, so excluded trees such as `node_modules` are never
+    listed. With include patterns, directories that cannot contain a match are pruned as well.
+
+    Parameters
+    ----------
+    include : Iterable[str]
+        Globs a file must match to be ingested; every file is included if there are none.
+    exclude : Iterable[str]
+        Globs of files and directories to skip, in addition to `DEFAULT_EXCLUDE_PATTERNS`.
+    """
+
+    def __init__(self, include: Iterable[str] = (), exclude: Iterable[str] = ()) -> None:
+        self.include = sorted(set(include))
+        self.exclude = sorted(set(exclude))
+
+        self._include = _compile(self.include) if self.include else None
+        self._exclude = _compile([*DEFAULT_EXCLUDE_PATTERNS, *self.exclude])
+        self._include_prefixes = _compile_prefixes(self.include) if self.include else None
+
+    @classmethod
+    def from_form(cls, pattern_type: PatternType | str, pattern: str) -> "PatternMatcher":
+        """
+        Build a matcher from the `pattern_type` and `pattern` fields of the query form.
+
+        Parameters
+        ----------
+        pattern_type : PatternType | str
+            Whether the patterns select the files to include or the files to exclude.
+        pattern : str
+            Globs separated by commas or whitespace.
+
+        Returns
+        -------
+        PatternMatcher
+            The compiled matcher.
+
+        Raises
+        ------
+        ValueError
+            If `pattern_type` is neither `include` nor `exclude`.
+        """
+        patterns = [p for p in re.split(r"[,\s]+", pattern) if p]
+        if PatternType(pattern_type) == PatternType.INCLUDE:
+            return cls(include=patterns)
+        return cls(exclude=patterns)
+
+    @property
+    def signature(self) -> str:
+        """A canonical description of the patterns, for use in cache keys."""
+        return f"include={','.join(self.include)};exclude={','.join(self.exclude)}"
+
+    def includes_directory(self, path: str) -> bool:
+        """
+        Tell whether a directory should be descended into.
+
+        Parameters
+        ----------
+        path : str
+            Path of the directory relative to the walked root, using forward slashes.
+
+        Returns
+        -------
+        bool
+            False if the directory is excluded, or if no include pattern can match anything below it.
+        """
+        if self._exclude.fullmatch(path):
+            return False
+        if self._include is None or self._include_prefixes is None:
+            return True
+        return bool(self._include.fullmatch(path) or self._include_prefixes.fullmatch(path))
+
+    def includes_file(self, path: str) -> bool:
+        """
+        Tell whether a file should be ingested.
+
+        Parameters
+        ----------
+        path : str
+            Path of the file relative to the walked root, using forward slashes.
+
+        Returns
+        -------
+        bool
+            True if the file is not excluded and matches the include patterns, if any.
+        """
+        if self._exclude.fullmatch(path):
+            return False
+        return self._include is None or bool(self._include.fullmatch(path))
+
+
+def _compile(patterns: Iterable[str]) -> re.Pattern[str]:
+    """Compile globs into a single expression matching a path or any path below it."""
+    alternatives = "|".join(glob_to_regex(pattern) for pattern in patterns)
+    return re.compile(f"(?:{alternatives})(?:/.*)?", re.DOTALL) if alternatives else re.compile(r"(?!)")
+
+
+def _compile_prefixes(patterns: list[str]) -> re.Pattern[str] | None:
+    """
+    Compile include globs into an expression matching the directories that may contain a match.
+
+    Returns None if any pattern can match at any depth, in which case no directory can be pruned.
+    """
+    alternatives = []
+    for pattern in patterns:
+        parts = pattern.strip("/").split("/")
+        if not _is_anchored(pattern) or parts[0] == "**":
+            return None
+        alternatives.append(_prefix_regex(parts))
+    return re.compile("|".join(alternatives), re.DOTALL)
+
+
+def _is_anchored(pattern: str) -> bool:
+    """Whether a glob is matched against the full path rather than against names at any depth."""
+    return "/" in pattern.rstrip("/")
+
+
+def glob_to_regex(pattern: str) -> str:
+    """
+    Translate a glob into a regular expression matching a full relative path.
+
+    Parameters
+    ----------
+    pattern : str
+        A glob following `.gitignore` conventions; it is anchored to the root if it contains a slash other than a
+        trailing one.
+
+    Returns
+    -------
+    str
+        An uncompiled regular expression, to be used with `fullmatch`.
+    """
+    parts = pattern.strip("/").split("/")
+    regex = "" if _is_anchored(pattern) else "(?:.*/)?"
+    for i, part in enumerate(parts):
+        last = i == len(parts) - 1
+        if part == "**":
+            regex += ".*" if last else "(?:.*/)?"
+        else:
+            regex += _component_regex(part) + ("" if last else "/")
+    return regex
+
+
+def _prefix_regex(parts: list[str]) -> str:
+    """Translate the components of an anchored glob into an expression matching its leading directories."""
+    part, rest = parts[0], parts[1:]
+    if part == "**":
+        return ".*"
+    if not rest:
+        return _component_regex(part)
+    return f"{_component_regex(part)}(?:/{_prefix_regex(rest)})?"
+
+
+def _component_regex(part: str) -> str:
+    """Translate a single path component of a glob, in which wildcards never match a slash."""
+    regex = ""
+    i = 0
+    while i < len(part):
+        char = part[i]
+        if char == "*":
+            regex += "[^/]*"
+        elif char == "?":
+            regex += "[^/]"
+        elif char == "[" and (end := part.find("]", i + 2)) != -1:
+            body = part[i + 1 : end]
+            negate = body[0] in "!^"
+            body = (body[1:] if negate else body).replace("\\", "\\\\")
+            regex += f"[^{body}]" if negate else f"[{body}]"
+            i = end
+        else:
+            regex += re.escape(char)
+        i += 1
+    return regex
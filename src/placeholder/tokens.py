@@ -0,0 +1,261 @@
+""" Token counts of ingested files, exact with `tiktoken` when it is available and estimated from sizes otherwise. """
+
+import hashlib
+import threading
+from collections import OrderedDict
+from collections.abc import Sequence
+from contextlib import suppress
+from typing import Any
+
+from placeholder.config import (
+    BYTES_PER_TOKEN,
+    EXACT_TOKEN_COUNT_MAX_BYTES,
+    TOKEN_CACHE_SIZE,
+    TOKEN_ENCODING,
+    TOKEN_ENCODING_LOAD_TIMEOUT,
+    TOKEN_WORKERS,
+)
+from placeholder.fragments import FragmentStore
+from placeholder.ingestion import FileEntry, IngestionStats
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - optional dependency
+    tiktoken = None
+
+TOKENS_KIND = "tokens"  # Kind of the fragments holding token counts
+
+
+class TokenCounter:
+    """
+    Count the tokens of many texts at once, caching the counts by content hash.
+
+    Texts are tokenized in batches with `tiktoken`, which spreads each batch over several threads. Texts larger
+    than `exact_max_bytes`, which would dominate the cost of a batch, are estimated from their size instead, as
+    is everything when `tiktoken` or its encoding is unavailable. Counts are cached by a hash of the text, so a
+    file vendored in several places, or ingested again, is counted once.
+
+    Parameters
+    ----------
+    encoding : str
+        The name of the `tiktoken` encoding, loaded on first use, by default `TOKEN_ENCODING`.
+    exact_max_bytes : int
+        The size above which a text is estimated rather than tokenized, by default `EXACT_TOKEN_COUNT_MAX_BYTES`.
+    cache_size : int
+        The number of counts kept in memory, by default `TOKEN_CACHE_SIZE`.
+    """
+
+    def __init__(
+        self,
+        encoding: str = TOKEN_ENCODING,
+        exact_max_bytes: int = EXACT_TOKEN_COUNT_MAX_BYTES,
+        cache_size: int = TOKEN_CACHE_SIZE,
+    ) -> None:
+        self.encoding = encoding
+        self.exact_max_bytes = exact_max_bytes
+        self.cache_size = cache_size
+        self._cache: OrderedDict[bytes, tuple[int, bool]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._tokenizer: Any = None
+        self._loaded = False
+
+    @property
+    def exact(self) -> bool:
+        """Whether texts up to `exact_max_bytes` are tokenized, rather than every count being estimated."""
+        return self._load() is not None
+
+    def load(self) -> bool:
+        """
+        Load the tokenizer now rather than when the first text is counted, such as when a server starts.
+
+        Returns
+        -------
+        bool
+            Whether the tokenizer is available, as `exact`.
+        """
+        with self._lock:
+            return self._load() is not None
+
+    def count(self, text: str) -> int:
+        """
+        Count the tokens of a text.
+
+        Parameters
+        ----------
+        text : str
+            The text to count.
+
+        Returns
+        -------
+        int
+            The number of tokens, exact or estimated.
+        """
+        return self.count_many([text])[0]
+
+    def count_many(self, texts: Sequence[str]) -> list[int]:
+        """
+        Count the tokens of several texts, tokenizing those not in the cache in a single batch.
+
+        Parameters
+        ----------
+        texts : Sequence[str]
+            The texts to count.
+
+        Returns
+        -------
+        list[int]
+            The number of tokens of each text, in the order of `texts`.
+        """
+        return [count for count, _ in self.measure_many(texts)]
+
+    def measure_many(self, texts: Sequence[str]) -> list[tuple[int, bool]]:
+        """
+        Count the tokens of several texts as `count_many` does, telling which counts are exact.
+
+        Parameters
+        ----------
+        texts : Sequence[str]
+            The texts to count.
+
+        Returns
+        -------
+        list[tuple[int, bool]]
+            The number of tokens of each text, in the order of `texts`, with whether it was tokenized rather than
+            estimated from its size.
+        """
+        counts: list[tuple[int, bool] | None] = [None] * len(texts)
+        keys: list[bytes] = []
+        batch: list[int] = []
+        with self._lock:
+            for index, text in enumerate(texts):
+                data = text.encode("utf-8", errors="surrogatepass")
+                keys.append(hashlib.blake2b(data, digest_size=16).digest())
+                cached = self._cache.get(keys[index])
+                if cached is not None:
+                    self._cache.move_to_end(keys[index])
+                    counts[index] = cached
+                elif len(data) <= self.exact_max_bytes and self._load() is not None:
+                    batch.append(index)
+                else:
+                    counts[index] = (estimate_tokens(len(data)), False)
+
+        if batch:
+            tokenized = self._tokenizer.encode_ordinary_batch([texts[i] for i in batch], num_threads=TOKEN_WORKERS)
+            for index, tokens in zip(batch, tokenized):
+                counts[index] = (len(tokens), True)
+
+        with self._lock:
+            for key, count in zip(keys, counts):
+                self._cache[key] = count
+                self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return counts
+
+    def _load(self) -> Any:
+        """The tokenizer, loaded on first use, or None if it is unavailable."""
+        if not self._loaded:
+            self._tokenizer = _load_encoding(self.encoding)
+            self._loaded = True
+        return self._tokenizer
+
+
+def count_file_tokens(
+    files: Sequence[tuple[FileEntry, str]],
+    fragments: FragmentStore | None = None,
+    counter: TokenCounter | None = None,
+    stats: IngestionStats | None = None,
+) -> int:
+    """
+    Count the tokens of a batch of files and record each count on its entry.
+
+    With a fragment store, the exact counts of files read from git objects are stored next to their content,
+    keyed by blob ID, so they are shared across processes, commits and repositories.
+
+    Parameters
+    ----------
+    files : Sequence[tuple[FileEntry, str]]
+        The files with their decoded content.
+    fragments : FragmentStore | None
+        The store of token counts to reuse and fill, by default None.
+    counter : TokenCounter | None
+        The counter to use, by default the process-wide `token_counter`.
+    stats : IngestionStats | None
+        The stats of the ingestion, marked as having estimated tokens if any count of the batch is estimated.
+
+    Returns
+    -------
+    int
+        The number of tokens of all the files.
+    """
+    counter = counter or token_counter
+    store = fragments if fragments is not None and counter.exact else None
+    blobs = [entry.blob for entry, _ in files if entry.blob] if store is not None else []
+    # The stored counts are read, and the new ones stored, in one transaction each
+    cached = store.get_many(blobs, kind=TOKENS_KIND) if blobs else {}
+    referenced = [blob for blob in blobs if blob in cached]
+    pending: list[tuple[FileEntry, str]] = []
+    for entry, content in files:
+        if entry.blob in cached:
+            entry.tokens = int(cached[entry.blob])
+        else:
+            pending.append((entry, content))
+
+    created = []
+    for (entry, _), (count, exact) in zip(pending, counter.measure_many([content for _, content in pending])):
+        entry.tokens = count
+        if not exact and stats is not None:
+            stats.exact_tokens = False
+        # Only exact counts are stored, so the stored ones never make a count look exact when it is estimated
+        if store is not None and entry.blob and exact:
+            created.append((entry.blob, str(count)))
+    if created:
+        store.put_many(created, kind=TOKENS_KIND)
+        referenced.extend(blob for blob, _ in created)
+
+    if referenced:
+        store.release(referenced, kind=TOKENS_KIND)
+    return sum(entry.tokens for entry, _ in files)
+
+
+def estimate_tokens(size: int) -> int:
+    """
+    Estimate the number of tokens of a text from its size.
+
+    Parameters
+    ----------
+    size : int
+        The size of the text in bytes, once encoded in UTF-8.
+
+    Returns
+    -------
+    int
+        The estimated number of tokens, at `BYTES_PER_TOKEN` bytes per token.
+    """
+    return -(-size // BYTES_PER_TOKEN)
+
+
+def _load_encoding(name: str) -> Any:
+    """
+    Load a `tiktoken` encoding, or return None if `tiktoken` is not installed or cannot load it in time.
+
+    An encoding missing from the `tiktoken` cache is downloaded, without a timeout of its own, so it is loaded in a
+    daemon thread that is given up on after `TOKEN_ENCODING_LOAD_TIMEOUT` seconds.
+    """
+    if tiktoken is None:
+        return None
+
+    loaded: list[Any] = []
+
+    def load() -> None:
+        # Downloading fails without network access, in which case tokens are estimated
+        with suppress(Exception):
+            loaded.append(tiktoken.get_encoding(name))
+
+    loader = threading.Thread(target=load, name="token-encoding-loader", daemon=True)
+    loader.start()
+    loader.join(TOKEN_ENCODING_LOAD_TIMEOUT)
+    return loaded[0] if loaded else None
+
+
+token_counter = TokenCounter()
@@ -2,16 +2,66 @@
 
 import asyncio
 import functools
+import os
+import signal
+from asyncio.subprocess import Process
 from collections.abc import Awaitable, Callable
-from typing import ParamSpec, TypeVar
+from concurrent.futures import Executor
+from contextlib import suppress
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, ParamSpec, Protocol, TypeVar
 
+from placeholder.config import TIMEOUT_GRACE_PERIOD
 from placeholder.exceptions import AsyncTimeoutError
 
 T = TypeVar("T")
 P = ParamSpec("P")
 
 
-def async_timeout(seconds: int = 10) -> Callable[[Callable[P, Awaitable[T]]], Callable[P, Awaitable[T]]]:
+class CancelEvent(Protocol):
+    """
+    An event used to ask a worker to stop.
+
+    `threading.Event`, `multiprocessing.Event` and the events created by a `multiprocessing.Manager` all satisfy
+    this protocol.
+    """
+
+    def is_set(self) -> bool:
+        """Return whether the event is set."""
+
+    def set(self) -> None:
+        """Set the event."""
+
+
+@dataclass
+class _TimeoutScope:
+    """
+    State shared between `async_timeout` and the child work started by the function it wraps.
+
+    Attributes
+    ----------
+    grace_period : float
+        Seconds given to child work to stop on its own before it is killed or abandoned.
+    collect_partial : bool
+        Whether child work should hand back the partial result it produced before stopping.
+    partial_result : Any
+        The partial result handed back, if any.
+    """
+
+    grace_period: float
+    collect_partial: bool = False
+    partial_result: Any = None
+
+
+_timeout_scope: ContextVar[_TimeoutScope | None] = ContextVar("timeout_scope", default=None)
+
+
+def async_timeout(
+    seconds: int = 10,
+    grace_period: float = TIMEOUT_GRACE_PERIOD,
+    partial: bool = False,
+) -> Callable[[Callable[P, Awaitable[T]]], Callable[P, Awaitable[T]]]:
     """
     Async Timeout decorator.
 
@@ -19,11 +69,22 @@ def async_timeout(seconds: int = 10) -> Callable[[Callable[P, Awaitable[T]]], Ca
     longer than the specified number of seconds. If the function execution exceeds
     this limit, it raises an `AsyncTimeoutError`.
 
+    The wrapped function is cancelled on expiry, and the child work it started is stopped
+    before the error is raised: subprocesses started through `run_subprocess` are terminated,
+    then killed if they are still running after `grace_period` seconds, and executor tasks
+    started through `run_cancellable` have their cancel event set and are given the same
+    grace period to return.
+
     Parameters
     ----------
     seconds : int
         The maximum allowed time (in seconds) for the asynchronous function to complete.
         The default is 10 seconds.
+    grace_period : float
+        Time (in seconds) given to child work to stop on its own, by default `TIMEOUT_GRACE_PERIOD`.
+    partial : bool
+        If True, the result an executor task returns after being cancelled is attached to the
+        `AsyncTimeoutError` as `partial_result`, by default False.
 
     Returns
     -------
@@ -36,11 +97,147 @@ def async_timeout(seconds: int = 10) -> Callable[[Callable[P, Awaitable[T]]], Ca
     def decorator(func: Callable[P, Awaitable[T]]) -> Callable[P, Awaitable[T]]:
         @functools.wraps(func)
         async def wrapper(*args: P.args, **kwargs: P.kwargs) -> T:
+            scope = _TimeoutScope(grace_period=grace_period, collect_partial=partial)
+            token = _timeout_scope.set(scope)
             try:
                 return await asyncio.wait_for(func(*args, **kwargs), timeout=seconds)
             except asyncio.TimeoutError as exc:
-                raise AsyncTimeoutError(f"Operation timed out after {seconds} seconds") from exc
+                raise AsyncTimeoutError(
+                    f"Operation timed out after {seconds} seconds", partial_result=scope.partial_result
+                ) from exc
+            finally:
+                _timeout_scope.reset(token)
 
         return wrapper
 
     return decorator
+
+
+def _current_grace_period() -> float:
+    """Grace period of the innermost `async_timeout`, or the default outside of one."""
+    scope = _timeout_scope.get()
+    return scope.grace_period if scope is not None else TIMEOUT_GRACE_PERIOD
+
+
+async def run_subprocess(
+    *args: str, cwd: str | None = None, env: dict[str, str] | None = None
+) -> tuple[int, bytes, bytes]:
+    """
+    Run a subprocess without blocking the event loop, stopping it if the caller is cancelled.
+
+    The subprocess runs in its own process group, so that on cancellation the signal also reaches the processes
+    it spawned (such as the helpers `git clone` starts). It is sent SIGTERM first, then SIGKILL if it is still
+    running after the grace period of the enclosing `async_timeout`.
+
+    Parameters
+    ----------
+    *args : str
+        The program to run followed by its arguments.
+    cwd : str | None
+        The working directory of the subprocess, by default the current directory.
+    env : dict[str, str] | None
+        The environment of the subprocess, by default the environment of the current process.
+
+    Returns
+    -------
+    tuple[int, bytes, bytes]
+        The exit status, standard output and standard error of the subprocess.
+    """
+    process = await asyncio.create_subprocess_exec(
+        *args,
+        cwd=cwd,
+        env=env,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        start_new_session=True,
+    )
+    try:
+        stdout, stderr = await process.communicate()
+    except asyncio.CancelledError:
+        await terminate_process(process, _current_grace_period())
+        raise
+
+    return process.returncode, stdout, stderr
+
+
+async def terminate_process(process: Process, grace_period: float) -> None:
+    """
+    Terminate a subprocess and its process group, killing them if they outlive the grace period.
+
+    Parameters
+    ----------
+    process : Process
+        The subprocess to stop. It must have been started in its own session.
+    grace_period : float
+        Time (in seconds) given to the subprocess to exit after SIGTERM before SIGKILL is sent.
+    """
+    if process.returncode is not None:
+        return
+
+    _signal_process_group(process, signal.SIGTERM)
+    try:
+        await asyncio.wait_for(process.wait(), timeout=grace_period)
+    except asyncio.TimeoutError:
+        _signal_process_group(process, getattr(signal, "SIGKILL", signal.SIGTERM))
+        await process.wait()
+
+
+def _signal_process_group(process: Process, sig: int) -> None:
+    """Send a signal to the process group of a subprocess, or to the subprocess alone where groups do not exist."""
+    with suppress(ProcessLookupError):
+        if hasattr(os, "killpg"):
+            os.killpg(process.pid, sig)
+        else:
+            process.send_signal(sig)
+
+
+async def run_cancellable(
+    executor: Executor | None,
+    func: Callable[..., T],
+    *args,
+    cancel_event: CancelEvent,
+    **kwargs,
+) -> T:
+    """
+    Run a blocking function in an executor, propagating cancellation to it.
+
+    A running executor task cannot be interrupted, so `func` receives `cancel_event` as a keyword argument and is
+    expected to poll it. If the awaiting coroutine is cancelled (for instance by `async_timeout`), the event is set
+    and the task is given the grace period of the enclosing `async_timeout` to return. Inside an `async_timeout`
+    with `partial=True`, the value it returns is kept as the partial result of the timed out operation. A task
+    that does not return within the grace period is abandoned.
+
+    Parameters
+    ----------
+    executor : Executor | None
+        The executor to run `func` in, or None for the event loop's default thread pool.
+    func : Callable[..., T]
+        The blocking function to run. It must accept a `cancel_event` keyword argument.
+    *args
+        Positional arguments passed to `func`.
+    cancel_event : CancelEvent
+        The event passed to `func` and set on cancellation. It must be usable from the executor's workers.
+    **kwargs
+        Additional keyword arguments passed to `func`.
+
+    Returns
+    -------
+    T
+        The return value of `func`.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(executor, functools.partial(func, *args, cancel_event=cancel_event, **kwargs))
+    try:
+        # Shielded so that cancellation leaves the future alive and its late result can still be collected
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        cancel_event.set()
+        scope = _timeout_scope.get()
+        try:
+            result = await asyncio.wait_for(asyncio.shield(future), timeout=_current_grace_period())
+        except Exception:
+            pass
+        else:
+            if scope is not None and scope.collect_partial:
+                scope.partial_result = result
+        raise
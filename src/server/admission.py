@@ -0,0 +1,142 @@
+""" Admission control bounding the number of ingestions a worker runs and queues at once. """
+
+import asyncio
+from collections.abc import Callable
+from dataclasses import dataclass
+
+from server.server_config import (
+    ADMISSION_RETRY_AFTER,
+    ADMISSION_WAIT_TIMEOUT,
+    MAX_CONCURRENT_INGESTIONS,
+    MAX_WAITING_INGESTIONS,
+)
+
+
+class AdmissionRejected(Exception):
+    """
+    Raised when an ingestion cannot be admitted because the worker is saturated.
+
+    Parameters
+    ----------
+    retry_after : int
+        Number of seconds the client should wait before retrying.
+    """
+
+    def __init__(self, retry_after: int) -> None:
+        super().__init__(f"The server is busy, please try again in {retry_after} seconds")
+        self.retry_after = retry_after
+
+
+@dataclass
+class AdmissionStats:
+    """
+    Counters of the ingestions going through an `AdmissionController`.
+
+    Attributes
+    ----------
+    running : int
+        Ingestions holding a slot.
+    waiting : int
+        Ingestions waiting for a slot.
+    rejected : int
+        Ingestions rejected since the start of the process.
+    """
+
+    running: int = 0
+    waiting: int = 0
+    rejected: int = 0
+
+
+class AdmissionController:
+    """
+    A global semaphore in front of every clone and digest build, with a bounded wait queue.
+
+    At most `max_concurrency` ingestions run at once. Further ingestions wait for a slot, but only `max_waiting` of
+    them at a time and for at most `wait_timeout` seconds; beyond that they are rejected at once with
+    `AdmissionRejected`, so a spike degrades into fast `503` responses rather than into hundreds of concurrent
+    clones exhausting memory. Digests served from a cache never need a slot.
+
+    Parameters
+    ----------
+    max_concurrency : int
+        The number of ingestions running at once, by default `MAX_CONCURRENT_INGESTIONS`.
+    max_waiting : int
+        The number of ingestions waiting for a slot, by default `MAX_WAITING_INGESTIONS`.
+    wait_timeout : float
+        The time an ingestion waits for a slot before it is rejected, by default `ADMISSION_WAIT_TIMEOUT`.
+    retry_after : int
+        The delay suggested to rejected clients, by default `ADMISSION_RETRY_AFTER`.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = MAX_CONCURRENT_INGESTIONS,
+        max_waiting: int = MAX_WAITING_INGESTIONS,
+        wait_timeout: float = ADMISSION_WAIT_TIMEOUT,
+        retry_after: int = ADMISSION_RETRY_AFTER,
+    ) -> None:
+        self.max_concurrency = max_concurrency
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        self.retry_after = retry_after
+        self.stats = AdmissionStats()
+        self._semaphore: asyncio.Semaphore | None = None
+
+    async def acquire(self) -> Callable[[], None]:
+        """
+        Wait for an ingestion slot.
+
+        Returns
+        -------
+        Callable[[], None]
+            A function giving the slot back. It may be called several times, the slot is only released once.
+
+        Raises
+        ------
+        AdmissionRejected
+            If the wait queue is full, or no slot was freed within `wait_timeout` seconds.
+        RuntimeError
+            If the controller has not been started.
+        """
+        if self._semaphore is None:
+            raise RuntimeError("The admission controller has not been started")
+
+        if self._semaphore.locked():
+            if self.stats.waiting >= self.max_waiting:
+                self.stats.rejected += 1
+                raise AdmissionRejected(self.retry_after)
+
+            self.stats.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=self.wait_timeout)
+            except asyncio.TimeoutError:
+                self.stats.rejected += 1
+                raise AdmissionRejected(self.retry_after) from None
+            finally:
+                self.stats.waiting -= 1
+        else:
+            await self._semaphore.acquire()
+
+        self.stats.running += 1
+        semaphore = self._semaphore
+        released = False
+
+        def release() -> None:
+            nonlocal released
+            if not released:
+                released = True
+                self.stats.running -= 1
+                semaphore.release()
+
+        return release
+
+    async def start(self) -> None:
+        """Create the semaphore, in the event loop of the application."""
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def stop(self) -> None:
+        """Forget the semaphore. Ingestions still running release their slot into it harmlessly."""
+        self._semaphore = None
+
+
+admission = AdmissionController()
@@ -0,0 +1,393 @@
+""" On-disk cache of cloned repositories, keyed by repository URL and commit. """
+
+import asyncio
+import fcntl
+import hashlib
+import os
+import shutil
+import time
+import uuid
+import zlib
+from collections import Counter
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager, suppress
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from placeholder.clone import CloneConfig, clone_repo, resolve_commit
+from server.result_cache import CacheStats
+from server.server_config import (
+    CLONE_CACHE_DIR,
+    CLONE_CACHE_MAX_BYTES,
+    CLONE_CACHE_SWEEP_INTERVAL,
+    CLONE_PIN_TIMEOUT,
+    DELETE_REPO_AFTER,
+)
+from server.server_logging import logger
+from server.shared_state import SharedState, shared_state
+
+_LOCK_STRIPES = 256  # Lock files serializing the clones and evictions of all checkouts across processes
+
+
+@dataclass
+class CacheEntry:
+    """
+    A cloned repository held in the cache.
+
+    Attributes
+    ----------
+    path : Path
+        The directory containing the checkout.
+    size : int
+        Disk usage of the checkout in bytes.
+    created_at : float
+        Time at which the checkout was created.
+    last_used : float
+        Time at which the checkout was last handed out.
+    in_use : int
+        Number of requests of this process currently reading the checkout; entries in use are never evicted.
+    """
+
+    path: Path
+    size: int
+    created_at: float = field(default_factory=time.time)
+    last_used: float = field(default_factory=time.time)
+    in_use: int = 0
+
+
+@dataclass
+class EvictionPolicy:
+    """
+    When the checkouts of a `CloneCache` are deleted.
+
+    Attributes
+    ----------
+    max_age : int
+        Checkouts older than this (in seconds) are evicted once no request reads them.
+    max_bytes : int
+        Least recently used checkouts are evicted while the cache is larger than this (in bytes).
+    sweep_interval : int
+        Seconds between two sweeps evicting expired checkouts.
+    """
+
+    max_age: int = DELETE_REPO_AFTER
+    max_bytes: int = CLONE_CACHE_MAX_BYTES
+    sweep_interval: int = CLONE_CACHE_SWEEP_INTERVAL
+
+
+@dataclass
+class CheckoutLeases:
+    """
+    The leases a process holds on the checkouts it reads, as shared state records.
+
+    A lease expires `CLONE_PIN_TIMEOUT` seconds after it was last taken, so the leases of a killed process
+    eventually lapse. The methods block on the shared state and are meant to run in a worker thread.
+
+    Attributes
+    ----------
+    state : SharedState
+        The state shared by the processes using the cache directory.
+    scope : str
+        Prefix separating the leases of different cache directories.
+    owner : str
+        Identifier of the process holding the leases.
+    """
+
+    state: SharedState
+    scope: str
+    owner: str = field(default_factory=lambda: uuid.uuid4().hex)
+
+    def take(self, key: str) -> None:
+        """Take or refresh the lease of this process on a checkout."""
+        self.state.put(self._key(key, self.owner), "", CLONE_PIN_TIMEOUT)
+
+    def drop(self, key: str) -> None:
+        """Give back the lease of this process on a checkout."""
+        self.state.clear(self._key(key, self.owner))
+
+    def held(self, key: str) -> bool:
+        """Tell whether any process holds a lease on a checkout."""
+        return self.state.count(self._key(key, "")) > 0
+
+    def _key(self, key: str, owner: str) -> str:
+        """Key of a lease in the shared state; the leases of a checkout share the key with an empty owner as prefix."""
+        return f"checkout:{self.scope}:{key}:{owner}"
+
+
+class KeyLocks:
+    """Locks serializing the work on each key within a process, each dropped once no task holds or awaits it."""
+
+    def __init__(self) -> None:
+        self.locks: dict[str, asyncio.Lock] = {}
+        self._users: Counter[str] = Counter()
+
+    @asynccontextmanager
+    async def hold(self, key: str) -> AsyncIterator[None]:
+        """Hold the lock of a key."""
+        lock = self.locks.setdefault(key, asyncio.Lock())
+        self._users[key] += 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._users[key] -= 1
+            if not self._users[key]:
+                del self._users[key], self.locks[key]
+
+
+class CloneCache:
+    """
+    Cache of repository checkouts on disk.
+
+    Checkouts are keyed by normalized repository URL and resolved commit SHA, so repeated submissions of the same
+    repository reuse one checkout until a new commit is pushed. Entries are evicted once they are older than
+    `max_age` seconds, or least-recently-used first when the cache grows beyond `max_bytes`.
+
+    Several server processes can share the cache directory: a checkout is cloned under a file lock, so one process
+    clones it while the others wait and then use it, and no process deletes a checkout another one is reading.
+    Each process holds one lease on each checkout it reads, a shared state record that expires after
+    `CLONE_PIN_TIMEOUT` seconds unless the sweeper refreshes it, so the lease of a killed process eventually
+    lapses while a checkout read for longer than the timeout stays protected.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        max_age: int = DELETE_REPO_AFTER,
+        max_bytes: int = CLONE_CACHE_MAX_BYTES,
+        sweep_interval: int = CLONE_CACHE_SWEEP_INTERVAL,
+        state: SharedState = shared_state,
+    ) -> None:
+        self.root = Path(root)
+        self.policy = EvictionPolicy(max_age=max_age, max_bytes=max_bytes, sweep_interval=sweep_interval)
+        self.entries: dict[str, CacheEntry] = {}
+        self.stats = CacheStats()
+        self._leases = CheckoutLeases(state, scope=str(self.root))
+        self._locks = KeyLocks()
+        self._sweeper: asyncio.Task | None = None
+
+    @property
+    def total_size(self) -> int:
+        """Disk usage of all cached checkouts in bytes."""
+        return sum(entry.size for entry in self.entries.values())
+
+    @asynccontextmanager
+    async def checkout(self, url: str, ref: str = "HEAD", config: CloneConfig | None = None) -> AsyncIterator[Path]:
+        """
+        Provide a checkout of a repository, cloning it only if it is not cached yet.
+
+        The checkout is protected from eviction until the context exits.
+
+        Parameters
+        ----------
+        url : str
+            The normalized clone URL of the repository.
+        ref : str
+            The branch, tag or commit to check out, by default `HEAD`.
+        config : CloneConfig | None
+            Options controlling how much of the repository is fetched, by default a shallow filtered clone.
+
+        Yields
+        ------
+        Path
+            The directory containing the checkout.
+        """
+        config = config or CloneConfig()
+        commit = await resolve_commit(url, ref)
+        key = self.cache_key(url, commit, config)
+
+        async with self._locks.hold(key), self._file_lock(key):
+            entry = self.entries.get(key)
+            if entry is None or not entry.path.exists():
+                entry = await self._adopt(key)
+            if entry is None:
+                self.stats.misses += 1
+                entry = await self._populate(key, url, commit, config)
+            else:
+                self.stats.hits += 1
+            entry.in_use += 1
+            entry.last_used = time.time()
+            await asyncio.to_thread(self._leases.take, key)
+
+        try:
+            yield entry.path
+        finally:
+            async with self._locks.hold(key):
+                entry.in_use -= 1
+                if not entry.in_use:
+                    await asyncio.to_thread(self._leases.drop, key)
+            await self._enforce_budget()
+
+    @staticmethod
+    def cache_key(url: str, commit: str, config: CloneConfig | None = None) -> str:
+        """
+        Build the cache key of a checkout.
+
+        Parameters
+        ----------
+        url : str
+            The normalized clone URL of the repository.
+        commit : str
+            The commit SHA of the checkout.
+        config : CloneConfig | None
+            The clone options; checkouts with different options are cached separately.
+
+        Returns
+        -------
+        str
+            A path-safe key: a hash of the URL and clone options followed by the commit SHA.
+        """
+        config = config or CloneConfig()
+        options = f"{url}\0{config.depth}\0{config.blob_limit}\0{config.sparse_patterns}\0{config.checkout}"
+        return f"{hashlib.sha256(options.encode()).hexdigest()[:16]}-{commit}"
+
+    async def _adopt(self, key: str) -> CacheEntry | None:
+        """Register a checkout cloned by another process, if there is one."""
+        path = self.root / key
+        if not path.is_dir():
+            return None
+        entry = CacheEntry(path=path, size=await asyncio.to_thread(_directory_size, path))
+        self.entries[key] = entry
+        return entry
+
+    async def _populate(self, key: str, url: str, commit: str, config: CloneConfig) -> CacheEntry:
+        """
+        Clone a repository into the cache.
+
+        The clone is made into a temporary directory and renamed into place once complete, so a crash or a failed
+        clone never leaves a partial checkout behind under the final key.
+        """
+        path = self.root / key
+        staging = self.root / f".{key}.{os.getpid()}.tmp"
+        self.root.mkdir(parents=True, exist_ok=True)
+        await asyncio.to_thread(shutil.rmtree, staging, True)
+
+        try:
+            await clone_repo(url, str(staging), commit, config)
+            await asyncio.to_thread(shutil.rmtree, path, True)
+            staging.rename(path)
+        finally:
+            await asyncio.to_thread(shutil.rmtree, staging, True)
+
+        entry = CacheEntry(path=path, size=await asyncio.to_thread(_directory_size, path))
+        self.entries[key] = entry
+        return entry
+
+    async def sweep(self) -> None:
+        """Refresh the leases of the entries in use, evict expired entries, then enforce the byte budget."""
+        now = time.time()
+        for key, entry in list(self.entries.items()):
+            if entry.in_use:
+                await asyncio.to_thread(self._leases.take, key)
+            if entry.in_use == 0 and now - entry.created_at > self.policy.max_age:
+                await self._evict(key)
+        await self._enforce_budget()
+
+    async def _enforce_budget(self) -> None:
+        """Evict the least recently used entries that are not in use until the cache fits in `max_bytes`."""
+        if self.total_size <= self.policy.max_bytes:
+            return
+
+        for key, entry in sorted(self.entries.items(), key=lambda item: item[1].last_used):
+            if self.total_size <= self.policy.max_bytes:
+                break
+            if entry.in_use == 0:
+                await self._evict(key)
+
+    async def _evict(self, key: str) -> None:
+        """Remove an entry from the index and delete its checkout, unless another process is reading it."""
+        async with self._file_lock(key):
+            entry = self.entries.pop(key, None)
+            if entry is not None and not await asyncio.to_thread(self._leases.held, key):
+                await asyncio.to_thread(shutil.rmtree, entry.path, True)
+
+    @asynccontextmanager
+    async def _file_lock(self, key: str) -> AsyncIterator[None]:
+        """
+        Hold the lock of a checkout shared by every process using the cache directory.
+
+        Keys are spread over `_LOCK_STRIPES` lock files, which are never deleted, so a process can never lock a
+        file that another process is about to replace.
+        """
+        locks = self.root / ".locks"
+        locks.mkdir(parents=True, exist_ok=True)
+        fd = os.open(locks / str(zlib.crc32(key.encode()) % _LOCK_STRIPES), os.O_RDWR | os.O_CREAT)
+        try:
+            await asyncio.to_thread(fcntl.flock, fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)  # Closing the file releases the lock
+
+    async def _sweep_forever(self) -> None:
+        """Run `sweep` every `sweep_interval` seconds, logging failures so that one of them never stops eviction."""
+        while True:
+            await asyncio.sleep(self.policy.sweep_interval)
+            try:
+                await self.sweep()
+            except Exception:
+                logger.exception("Sweep of the clone cache failed")
+
+    async def start(self) -> None:
+        """
+        Index checkouts left on disk by a previous run and start the background sweeper.
+
+        Leftover checkouts are registered with their modification time as creation time, so they expire normally.
+        Staging directories are only removed if the process that created them is gone.
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+        for path in self.root.iterdir():
+            if path.name.endswith(".tmp") and not _process_alive(path.name.split(".")[-2]):
+                await asyncio.to_thread(shutil.rmtree, path, True)
+            elif path.is_dir() and not path.name.startswith(".") and path.name not in self.entries:
+                created_at = path.stat().st_mtime
+                size = await asyncio.to_thread(_directory_size, path)
+                self.entries[path.name] = CacheEntry(path=path, size=size, created_at=created_at, last_used=created_at)
+
+        await self.sweep()
+        self._sweeper = asyncio.create_task(self._sweep_forever())
+
+    async def stop(self) -> None:
+        """Stop the background sweeper. Cached checkouts are kept on disk for the next run."""
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._sweeper
+            self._sweeper = None
+
+
+def _process_alive(pid: str) -> bool:
+    """Tell whether a process exists, given its PID as found in the name of a staging directory."""
+    try:
+        os.kill(int(pid), 0)
+    except ValueError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+
+def _directory_size(path: Path) -> int:
+    """
+    Compute the disk usage of a directory tree.
+
+    Parameters
+    ----------
+    path : Path
+        The directory to measure.
+
+    Returns
+    -------
+    int
+        The total size in bytes of all regular files below `path`.
+    """
+    total = 0
+    for directory, _, files in os.walk(path):
+        for name in files:
+            with suppress(OSError):
+                total += os.lstat(os.path.join(directory, name)).st_size
+    return total
+
+
+clone_cache = CloneCache(CLONE_CACHE_DIR)
@@ -0,0 +1,320 @@
+""" On-disk store of computed digests, served in several formats and encodings. """
+
+import asyncio
+import gzip
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import suppress
+from pathlib import Path
+
+from server.server_config import DELETE_REPO_AFTER, DIGEST_STORE_DIR, DIGEST_STORE_SWEEP_INTERVAL
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+FORMATS: tuple[str, ...] = ("txt", "json")
+
+_COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def available_encodings() -> list[str]:
+    """
+    List the content encodings the store can produce, most preferred first.
+
+    Returns
+    -------
+    list[str]
+        `zstd` and `br` when their optional dependency is installed, then `gzip`.
+    """
+    encodings = []
+    if zstandard is not None:
+        encodings.append("zstd")
+    if brotli is not None:
+        encodings.append("br")
+    encodings.append("gzip")
+    return encodings
+
+
+class DigestStore:
+    """
+    Digests written to disk under an identifier, for download after the request that computed them.
+
+    Each digest is stored as plain text next to a small metadata file. The JSON representation and compressed
+    variants are produced lazily on first request and kept next to the original, so repeated downloads are served
+    straight from disk. All files of a digest are deleted once it is older than `max_age` seconds.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_age: int = DELETE_REPO_AFTER,
+        sweep_interval: int = DIGEST_STORE_SWEEP_INTERVAL,
+    ) -> None:
+        self.directory = Path(directory)
+        self.max_age = max_age
+        self.sweep_interval = sweep_interval
+        self._sweeper: asyncio.Task | None = None
+
+    def _path(self, digest_id: str, suffix: str) -> Path:
+        """Path of one of the files of a digest."""
+        return self.directory / f"{digest_id}.{suffix}"
+
+    def exists(self, digest_id: str) -> bool:
+        """
+        Check whether a digest is stored.
+
+        Parameters
+        ----------
+        digest_id : str
+            The identifier of the digest.
+
+        Returns
+        -------
+        bool
+            True if the digest is stored and has not expired.
+        """
+        return digest_id.isalnum() and self._path(digest_id, "txt").exists()
+
+    async def save(self, digest_id: str, content: str, metadata: dict[str, str]) -> None:
+        """
+        Store a digest, unless a digest with the same identifier is already stored.
+
+        Parameters
+        ----------
+        digest_id : str
+            An alphanumeric identifier, unique to the content.
+        content : str
+            The digest.
+        metadata : dict[str, str]
+            Information about the digest, included in its JSON representation.
+        """
+        await asyncio.to_thread(self._save, digest_id, content, metadata)
+
+    def _save(self, digest_id: str, content: str, metadata: dict[str, str]) -> None:
+        """Write the text and metadata files of a digest, unless it is already stored."""
+        if self.exists(digest_id):
+            return
+        writer = self.open_writer(digest_id, metadata)
+        writer.write(content)
+        writer.commit()
+
+    def open_writer(self, digest_id: str, metadata: dict[str, str]) -> "DigestWriter":
+        """
+        Start writing a digest incrementally, for digests that are produced in chunks and never held in memory.
+
+        The writer performs blocking file I/O and should be used from a worker thread.
+
+        Parameters
+        ----------
+        digest_id : str
+            An alphanumeric identifier, unique to the content.
+        metadata : dict[str, str]
+            Information about the digest, included in its JSON representation.
+
+        Returns
+        -------
+        DigestWriter
+            The writer, whose digest becomes available only once committed.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        return DigestWriter(self._path(digest_id, "txt"), self._path(digest_id, "meta"), metadata)
+
+    async def read(self, digest_id: str, limit: int) -> str | None:
+        """
+        Read the beginning of a stored digest.
+
+        Parameters
+        ----------
+        digest_id : str
+            The identifier of the digest.
+        limit : int
+            The maximum number of characters to read.
+
+        Returns
+        -------
+        str | None
+            Up to `limit` characters of the digest, or None if it does not exist.
+        """
+        if not self.exists(digest_id):
+            return None
+        return await asyncio.to_thread(self._read, self._path(digest_id, "txt"), limit)
+
+    @staticmethod
+    def _read(path: Path, limit: int) -> str | None:
+        """Read up to `limit` characters of a file, or None if it was deleted meanwhile."""
+        try:
+            with open(path, encoding="utf-8") as f:
+                return f.read(limit)
+        except FileNotFoundError:
+            return None
+
+    async def get_file(self, digest_id: str, fmt: str, encoding: str | None = None) -> Path | None:
+        """
+        Locate the file holding a digest in the given format and encoding, producing it if needed.
+
+        Parameters
+        ----------
+        digest_id : str
+            The identifier of the digest.
+        fmt : str
+            One of `FORMATS`.
+        encoding : str | None
+            One of `available_encodings()`, or None for the uncompressed representation.
+
+        Returns
+        -------
+        Path | None
+            The file, or None if the digest does not exist.
+        """
+        if fmt not in FORMATS or not self.exists(digest_id):
+            return None
+
+        path = self._path(digest_id, fmt)
+        if fmt == "json" and not path.exists():
+            await asyncio.to_thread(self._write_json, digest_id, path)
+
+        if encoding is None:
+            return path
+
+        encoded = self._path(digest_id, f"{fmt}.{encoding}")
+        if not encoded.exists():
+            await asyncio.to_thread(_compress, path, encoded, encoding)
+        return encoded
+
+    def _write_json(self, digest_id: str, path: Path) -> None:
+        """
+        Write the JSON representation of a digest.
+
+        The content is encoded chunk by chunk, so the digest is never held in memory as a whole.
+        """
+        metadata = json.loads(self._path(digest_id, "meta").read_bytes())
+        staging = _staging_path(path)
+        with open(self._path(digest_id, "txt"), encoding="utf-8") as src, open(staging, "w", encoding="utf-8") as dst:
+            dst.write(json.dumps(metadata)[:-1] + ', "content": "')
+            while chunk := src.read(_COPY_CHUNK_SIZE):
+                dst.write(json.dumps(chunk)[1:-1])
+            dst.write('"}')
+        os.replace(staging, path)
+
+    async def sweep(self) -> None:
+        """Delete every file of the digests older than `max_age` seconds."""
+        await asyncio.to_thread(self._sweep)
+
+    def _sweep(self) -> None:
+        """Delete expired digests, including the variants produced from them."""
+        if not self.directory.exists():
+            return
+
+        cutoff = time.time() - self.max_age
+        for path in self.directory.iterdir():
+            with suppress(OSError):
+                if path.stat().st_mtime < cutoff:
+                    digest_id = path.name.split(".", 1)[0]
+                    for related in self.directory.glob(f"{digest_id}.*"):
+                        related.unlink(missing_ok=True)
+
+    async def _sweep_forever(self) -> None:
+        """Run `sweep` every `sweep_interval` seconds."""
+        while True:
+            await self.sweep()
+            await asyncio.sleep(self.sweep_interval)
+
+    async def start(self) -> None:
+        """Start the background sweeper, which first removes digests expired while the server was down."""
+        self._sweeper = asyncio.create_task(self._sweep_forever())
+
+    async def stop(self) -> None:
+        """Stop the background sweeper. Stored digests are kept on disk for the next run."""
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._sweeper
+            self._sweeper = None
+
+
+class DigestWriter:
+    """
+    A digest being written to the store one chunk at a time.
+
+    Chunks are appended to a staging file, which is renamed into place by `commit`, so `DigestStore.exists` never
+    sees a partial digest. `discard` drops the staging file instead.
+    """
+
+    def __init__(self, path: Path, meta_path: Path, metadata: dict[str, str]) -> None:
+        self.path = path
+        self.meta_path = meta_path
+        self.metadata = metadata
+        self._staging = _staging_path(path)
+        # The file outlives this call, as the chunks of a streamed digest are written from several threads in turn;
+        # `commit` or `discard` closes it
+        self._file = open(self._staging, "w", encoding="utf-8")  # pylint: disable=consider-using-with
+
+    def write(self, chunk: str) -> None:
+        """Append a chunk of the digest."""
+        self._file.write(chunk)
+
+    def commit(self) -> None:
+        """Publish the digest, metadata first and text last."""
+        self._file.close()
+        _write_atomic(self.meta_path, json.dumps({"id": self.path.stem, **self.metadata}).encode())
+        os.replace(self._staging, self.path)
+
+    def discard(self) -> None:
+        """Drop the chunks written so far."""
+        self._file.close()
+        self._staging.unlink(missing_ok=True)
+
+
+def _staging_path(path: Path) -> Path:
+    """Temporary path a file is written to before being renamed into place, unique to the writing thread."""
+    return path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    """Write a file through a temporary file, so readers never see it partially written."""
+    staging = _staging_path(path)
+    staging.write_bytes(data)
+    os.replace(staging, path)
+
+
+def _compress(src: Path, dst: Path, encoding: str) -> None:
+    """
+    Compress a file with the given content encoding, one chunk at a time.
+
+    Parameters
+    ----------
+    src : Path
+        The file to compress.
+    dst : Path
+        The compressed file to write.
+    encoding : str
+        One of `available_encodings()`.
+    """
+    staging = _staging_path(dst)
+    with open(src, "rb") as fin, open(staging, "wb") as fout:
+        if encoding == "gzip":
+            with gzip.GzipFile(fileobj=fout, mode="wb", mtime=0) as gz:
+                shutil.copyfileobj(fin, gz, _COPY_CHUNK_SIZE)
+        elif encoding == "br":
+            compressor = brotli.Compressor()
+            while chunk := fin.read(_COPY_CHUNK_SIZE):
+                fout.write(compressor.process(chunk))
+            fout.write(compressor.finish())
+        elif encoding == "zstd":
+            zstandard.ZstdCompressor().copy_stream(fin, fout)
+        else:
+            raise ValueError(f"Unsupported encoding: {encoding}")
+    os.replace(staging, dst)
+
+
+digest_store = DigestStore(DIGEST_STORE_DIR)
@@ -0,0 +1,64 @@
+""" Process-wide fragment store shared by every digest built from git objects, with background eviction. """
+
+import asyncio
+from contextlib import suppress
+
+from placeholder.fragments import FragmentStore
+from server.server_config import FRAGMENT_STORE_DIR, FRAGMENT_STORE_MAX_BYTES, FRAGMENT_STORE_SWEEP_INTERVAL, WORKERS
+from server.server_logging import logger
+
+
+class FragmentCache:
+    """
+    Lifecycle of the fragment store used by the server.
+
+    The store itself is passed to the digest builds, which run in the process pool and take and release
+    references on the fragments they use; this class only evicts fragments in the background.
+    """
+
+    def __init__(
+        self,
+        store: FragmentStore,
+        sweep_interval: int = FRAGMENT_STORE_SWEEP_INTERVAL,
+        reset_on_start: bool = WORKERS == 1,
+    ) -> None:
+        self.store = store
+        self.sweep_interval = sweep_interval
+        self.reset_on_start = reset_on_start
+        self._sweeper: asyncio.Task | None = None
+
+    async def sweep(self) -> None:
+        """Evict the least recently used unreferenced fragments beyond the store's byte budget."""
+        await asyncio.to_thread(self.store.evict)
+
+    async def _sweep_forever(self) -> None:
+        """Run `sweep` every `sweep_interval` seconds, logging failures so that one of them never stops eviction."""
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                await self.sweep()
+            except Exception:
+                logger.exception("Sweep of the fragment store failed")
+
+    async def start(self) -> None:
+        """
+        Drop the references left by builds of a previous run, evict, and start the background sweeper.
+
+        With several server processes, another one may be running builds, so references are left to expire instead.
+        """
+        if self.reset_on_start:
+            await asyncio.to_thread(self.store.reset_references)
+        await self.sweep()
+        self._sweeper = asyncio.create_task(self._sweep_forever())
+
+    async def stop(self) -> None:
+        """Stop the background sweeper. Stored fragments are kept on disk for the next run."""
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._sweeper
+            self._sweeper = None
+
+
+fragment_store = FragmentStore(FRAGMENT_STORE_DIR, max_bytes=FRAGMENT_STORE_MAX_BYTES)
+fragment_cache = FragmentCache(fragment_store)
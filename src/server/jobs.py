@@ -0,0 +1,512 @@
+""" Background job queue running queries outside of the HTTP request that submitted them. """
+
+import asyncio
+import json
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+from contextlib import suppress
+from dataclasses import dataclass, field
+from enum import Enum
+from functools import partial
+
+from placeholder.patterns import PatternMatcher
+from server.query_processor import run_query
+from server.server_config import (
+    DELETE_REPO_AFTER,
+    JOB_POLL_INTERVAL,
+    JOB_PRUNE_INTERVAL,
+    JOB_QUEUE_MAX_SIZE,
+    JOB_WORKERS,
+)
+from server.server_logging import current_request_id, logger, set_request_id
+from server.shared_state import SharedState, shared_state
+
+
+class JobStatus(str, Enum):
+    """Lifecycle states of a job."""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+@dataclass
+class JobQuery:
+    """
+    The query run by a job.
+
+    Attributes
+    ----------
+    input_text : str
+        Input text provided by the user, typically a Git repository URL or slug.
+    is_index : bool
+        Whether the query was submitted from the index page, which selects the template of the result page.
+    patterns : PatternMatcher
+        The include and exclude patterns selecting the files to ingest.
+    max_tokens : int | None
+        The token budget of the digest, unbounded if None.
+    profile : bool
+        Whether the query was explicitly asked to be profiled.
+    request_id : str | None
+        Identifier of the request that submitted the job, attached to the logs of the query.
+    """
+
+    input_text: str
+    is_index: bool = False
+    patterns: PatternMatcher = field(default_factory=PatternMatcher)
+    max_tokens: int | None = None
+    profile: bool = False
+    request_id: str | None = field(default_factory=current_request_id)
+
+    @property
+    def key(self) -> tuple[str, bool, str, int | None]:
+        """Key under which jobs running identical queries are de-duplicated."""
+        return self.input_text, self.is_index, self.patterns.signature, self.max_tokens
+
+
+@dataclass
+class JobState:
+    """
+    The progress and outcome of a job, as published to the other workers.
+
+    Attributes
+    ----------
+    status : JobStatus
+        Current state of the job.
+    progress : str
+        Description of the stage currently running.
+    digest_id : str | None
+        Identifier of the stored digest, once the job is done. The digest itself is only kept by the digest store.
+    error : str | None
+        The error message, if the job failed.
+    created_at : float
+        Time at which the job was submitted.
+    updated_at : float
+        Time of the last status or progress change.
+    version : int
+        Counter incremented on every status or progress change.
+    """
+
+    status: JobStatus = JobStatus.QUEUED
+    progress: str = "Queued"
+    digest_id: str | None = None
+    error: str | None = None
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+    version: int = 0
+
+
+@dataclass
+class Job:
+    """
+    A query submitted for background processing.
+
+    Attributes
+    ----------
+    query : JobQuery
+        The query to run.
+    id : str
+        Unique identifier returned to the client.
+    state : JobState
+        The progress and outcome of the job.
+    on_change : Callable[[Job], None] | None
+        Called after every status or progress change, by the queue to publish the job to the other workers.
+    """
+
+    query: JobQuery
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    state: JobState = field(default_factory=JobState)
+    on_change: Callable[["Job"], None] | None = field(default=None, repr=False)
+    _changed: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+    _refresh: Callable[[], Awaitable[dict | None]] | None = field(default=None, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        """Whether the job is done or failed."""
+        return self.state.status in (JobStatus.DONE, JobStatus.FAILED)
+
+    def update(self, status: JobStatus | None = None, progress: str | None = None) -> None:
+        """
+        Update the status and/or progress of the job and wake up its subscribers.
+
+        Parameters
+        ----------
+        status : JobStatus | None
+            The new status, if it changed.
+        progress : str | None
+            The new progress description, if it changed.
+        """
+        if status is not None:
+            self.state.status = status
+        if progress is not None:
+            self.state.progress = progress
+        self.state.updated_at = time.time()
+        self.state.version += 1
+
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+        if self.on_change is not None:
+            self.on_change(self)
+
+    async def wait(self, version: int, timeout: float | None = None) -> bool:
+        """
+        Wait until the job changes after having been observed at `version`.
+
+        Parameters
+        ----------
+        version : int
+            The `state.version` of the job when the caller last observed it.
+        timeout : float | None
+            Maximum time to wait in seconds, by default no limit.
+
+        Returns
+        -------
+        bool
+            True if the job changed, False if the timeout expired first.
+        """
+        if self.state.version != version:
+            return True
+        if self._refresh is not None:
+            return await self._poll(version, timeout)
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def _poll(self, version: int, timeout: float | None) -> bool:
+        """Wait for a job running in another worker to change, by reading its record every `JOB_POLL_INTERVAL`."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.state.version == version:
+            delay = JOB_POLL_INTERVAL if deadline is None else min(JOB_POLL_INTERVAL, deadline - time.monotonic())
+            if delay <= 0:
+                return False
+            await asyncio.sleep(delay)
+            if (record := await self._refresh()) is not None:
+                self._apply(record)
+        return True
+
+    def _apply(self, record: dict) -> None:
+        """Copy the state of a job published by another worker."""
+        self.state = JobState(
+            status=JobStatus(record["status"]),
+            progress=record["progress"],
+            digest_id=record["digest_id"],
+            error=record["error"],
+            created_at=record["created_at"],
+            updated_at=record["updated_at"],
+            version=record["version"],
+        )
+
+    @classmethod
+    def from_record(cls, record: dict, refresh: Callable[[], Awaitable[dict | None]]) -> "Job":
+        """
+        Rebuild a job published by another worker.
+
+        Parameters
+        ----------
+        record : dict
+            The job as published, see `JobQueue.get`.
+        refresh : Callable[[], Awaitable[dict | None]]
+            Reads the latest record of the job, used by `wait` to follow it.
+
+        Returns
+        -------
+        Job
+            A snapshot of the job.
+        """
+        job = cls(
+            JobQuery(input_text=record["input_text"], is_index=record["is_index"]), id=record["id"], _refresh=refresh
+        )
+        job._apply(record)
+        return job
+
+    def to_dict(self) -> dict[str, str | float | None]:
+        """
+        Describe the job for the status endpoint.
+
+        Returns
+        -------
+        dict[str, str | float | None]
+            The identifier, status, progress and error of the job, and the identifier of its stored digest, without
+            the digest itself.
+        """
+        return {
+            "id": self.id,
+            "status": self.state.status.value,
+            "progress": self.state.progress,
+            "error": self.state.error,
+            "digest_id": self.state.digest_id,
+            "created_at": self.state.created_at,
+            "updated_at": self.state.updated_at,
+        }
+
+
+@dataclass
+class JobQueueLimits:
+    """
+    Bounds of a `JobQueue`.
+
+    Attributes
+    ----------
+    workers : int
+        Number of jobs processed at once.
+    max_size : int
+        Number of jobs waiting for a worker beyond which submissions are rejected.
+    retention : int
+        Seconds for which a job is kept after its last change.
+    """
+
+    workers: int = JOB_WORKERS
+    max_size: int = JOB_QUEUE_MAX_SIZE
+    retention: int = DELETE_REPO_AFTER
+
+
+@dataclass
+class Publication:
+    """
+    The changes of jobs waiting to be written to the shared state.
+
+    Attributes
+    ----------
+    jobs : dict[str, Job]
+        The jobs changed since they were last written, by identifier.
+    changed : asyncio.Event
+        Set when a job is added to `jobs`.
+    lock : asyncio.Lock
+        Held while jobs are written, so a job is never overwritten by an older state of itself.
+    """
+
+    jobs: dict[str, Job] = field(default_factory=dict)
+    changed: asyncio.Event = field(default_factory=asyncio.Event)
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+
+class JobQueue:
+    """
+    A bounded queue of jobs processed by a fixed pool of worker tasks.
+
+    Submitting the same query while an identical job is still queued or running returns the existing job, so
+    client retries do not create new work. Finished jobs are kept for `retention` seconds so their results can be
+    fetched, and are forgotten by a background task every `JOB_PRUNE_INTERVAL` seconds as well as on submission.
+
+    Every change of a job is also published to the shared state, so that with several server processes, a client
+    following a job can be served by any of them, not only by the one running it. A background task writes the
+    changes in a thread, coalescing those made while it writes, and `submit` writes a new job before returning it.
+    """
+
+    def __init__(
+        self,
+        workers: int = JOB_WORKERS,
+        max_size: int = JOB_QUEUE_MAX_SIZE,
+        retention: int = DELETE_REPO_AFTER,
+        state: SharedState = shared_state,
+    ) -> None:
+        self.limits = JobQueueLimits(workers=workers, max_size=max_size, retention=retention)
+        self.state = state
+        self.jobs: dict[str, Job] = {}
+        self._pending: dict[tuple[str, bool, str, int | None], Job] = {}
+        self._queue: asyncio.Queue[Job] | None = None
+        self._tasks: list[asyncio.Task] = []
+        self._publication = Publication()
+
+    async def submit(
+        self,
+        input_text: str,
+        is_index: bool = False,
+        patterns: PatternMatcher | None = None,
+        max_tokens: int | None = None,
+        profile: bool = False,
+    ) -> Job:
+        """
+        Queue a query for processing.
+
+        Parameters
+        ----------
+        input_text : str
+            Input text provided by the user, typically a Git repository URL or slug.
+        is_index : bool
+            Whether the query was submitted from the index page.
+        patterns : PatternMatcher | None
+            The include and exclude patterns selecting the files to ingest.
+        max_tokens : int | None
+            The token budget of the digest, unbounded if None.
+        profile : bool
+            Whether the query was explicitly asked to be profiled, by default False. An identical job already
+            queued or running is returned as is, without being profiled.
+
+        Returns
+        -------
+        Job
+            The new job, or the unfinished job already processing the same query.
+
+        Raises
+        ------
+        asyncio.QueueFull
+            If the queue already holds `max_size` jobs.
+        RuntimeError
+            If the workers have not been started.
+        """
+        if self._queue is None:
+            raise RuntimeError("The job queue has not been started")
+
+        self._prune()
+
+        input_text = input_text.strip()
+        patterns = patterns or PatternMatcher()
+        query = JobQuery(input_text, is_index=is_index, patterns=patterns, max_tokens=max_tokens, profile=profile)
+        if (pending := self._pending.get(query.key)) is not None:
+            return pending
+
+        job = Job(query)
+        self._queue.put_nowait(job)
+        self.jobs[job.id] = job
+        self._pending[query.key] = job
+        job.on_change = self._publish
+        self._publish(job)
+        try:
+            await self._flush()  # Any worker can then report the job as soon as its ID is returned
+        except Exception:
+            logger.exception("Publication of a new job to the shared state failed")
+        return job
+
+    async def get(self, job_id: str) -> Job | None:
+        """
+        Look up a job by its identifier.
+
+        Parameters
+        ----------
+        job_id : str
+            The identifier returned on submission.
+
+        Returns
+        -------
+        Job | None
+            The job, a snapshot of it if it was submitted to another worker, or None if it does not exist or has
+            expired.
+        """
+        if (job := self.jobs.get(job_id)) is not None:
+            return job
+
+        refresh = partial(self._fetch, job_id)
+        record = await refresh()
+        return Job.from_record(record, refresh) if record is not None else None
+
+    def _publish(self, job: Job) -> None:
+        """Queue a job to be written to the shared state by `_publish_forever`."""
+        self._publication.jobs[job.id] = job
+        self._publication.changed.set()
+
+    async def _flush(self) -> None:
+        """
+        Write the queued jobs to the shared state, where each expires `retention` seconds after its last change.
+
+        Flushes run one at a time, so a job is never overwritten by an older state of itself. Jobs that could not be
+        written are queued again.
+        """
+        publication = self._publication
+        async with publication.lock:
+            jobs, publication.jobs = publication.jobs, {}
+            publication.changed.clear()
+            records = {job.id: json.dumps(_record(job)) for job in jobs.values()}
+            try:
+                await asyncio.to_thread(self._write, records)
+            except BaseException:
+                publication.jobs = {**jobs, **publication.jobs}
+                publication.changed.set()
+                raise
+
+    def _write(self, records: dict[str, str]) -> None:
+        """Store job records in the shared state."""
+        for job_id, record in records.items():
+            self.state.put(_record_key(job_id), record, ttl=self.limits.retention)
+
+    async def _publish_forever(self) -> None:
+        """Write queued jobs as they change, logging failures so that one of them never stops publication."""
+        while True:
+            await self._publication.changed.wait()
+            try:
+                await self._flush()
+            except Exception:
+                logger.exception("Publication of jobs to the shared state failed")
+                await asyncio.sleep(JOB_POLL_INTERVAL)
+
+    async def _fetch(self, job_id: str) -> dict | None:
+        """Read a job published by any worker."""
+        record = await asyncio.to_thread(self.state.fetch, _record_key(job_id))
+        return json.loads(record) if record is not None else None
+
+    async def _work(self) -> None:
+        """Process jobs from the queue until cancelled."""
+        while True:
+            job = await self._queue.get()
+            job.update(status=JobStatus.RUNNING, progress="Starting")
+            set_request_id(job.query.request_id)
+            try:
+                result = await run_query(
+                    job.query.input_text,
+                    patterns=job.query.patterns,
+                    progress=lambda stage, job=job: job.update(progress=stage),
+                    max_tokens=job.query.max_tokens,
+                    profile=job.query.profile,
+                )
+            except Exception as e:
+                job.state.error = str(e)
+                job.update(status=JobStatus.FAILED, progress="Failed")
+            else:
+                job.state.digest_id = result.digest_id
+                job.update(status=JobStatus.DONE, progress="Done")
+            finally:
+                self._pending.pop(job.query.key, None)
+                self._queue.task_done()
+
+    def _prune(self) -> None:
+        """Forget finished jobs older than `limits.retention` seconds."""
+        cutoff = time.time() - self.limits.retention
+        for job_id, job in list(self.jobs.items()):
+            if job.finished and job.state.updated_at < cutoff:
+                del self.jobs[job_id]
+
+    async def _prune_forever(self) -> None:
+        """Forget expired jobs every `JOB_PRUNE_INTERVAL` seconds."""
+        while True:
+            await asyncio.sleep(JOB_PRUNE_INTERVAL)
+            self._prune()
+
+    async def start(self) -> None:
+        """Create the queue and start the worker tasks."""
+        self._queue = asyncio.Queue(maxsize=self.limits.max_size)
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.limits.workers)]
+        self._tasks.append(asyncio.create_task(self._publish_forever()))
+        self._tasks.append(asyncio.create_task(self._prune_forever()))
+
+    async def stop(self) -> None:
+        """Cancel the worker tasks and publish the last changes. Jobs still queued or running are abandoned."""
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            with suppress(asyncio.CancelledError):
+                await task
+        self._tasks = []
+        self._queue = None
+        await self._flush()
+
+
+def _record_key(job_id: str) -> str:
+    """Key of the record of a job in the shared state."""
+    return f"job:{job_id}"
+
+
+def _record(job: Job) -> dict[str, str | float | bool | None]:
+    """The record of a job in the shared state, from which `Job.from_record` rebuilds it."""
+    return {
+        **job.to_dict(),
+        "input_text": job.query.input_text,
+        "is_index": job.query.is_index,
+        "version": job.state.version,
+    }
+
+
+job_queue = JobQueue()
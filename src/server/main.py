@@ -6,14 +6,17 @@ from pathlib import Path
 from api_analytics.fastapi import Analytics
 from dotenv import load_dotenv
 from fastapi import FastAPI, Request
-from fastapi.responses import FileResponse, HTMLResponse
+from fastapi.responses import FileResponse, HTMLResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from slowapi.errors import RateLimitExceeded
 from starlette.middleware.trustedhost import TrustedHostMiddleware
 
-from server.routers import dynamic, index
+from server.admission import AdmissionRejected
+from server.metrics import MetricsMiddleware, metrics
+from server.routers import admin, digest, dynamic, index, jobs, stream
 from server.server_config import templates
-from server.server_utils import lifespan, limiter, rate_limit_exception_handler
+from server.server_logging import RequestLoggingMiddleware
+from server.server_utils import admission_rejected_handler, lifespan, limiter, rate_limit_exception_handler
 
 # Load environment variables from .env file
 load_dotenv()
@@ -22,8 +25,9 @@ load_dotenv()
 app = FastAPI(lifespan=lifespan)
 app.state.limiter = limiter
 
-# Register the custom exception handler for rate limits
+# Register the custom exception handlers for rate limits and admission control
 app.add_exception_handler(RateLimitExceeded, rate_limit_exception_handler)
+app.add_exception_handler(AdmissionRejected, admission_rejected_handler)
 
 
 # Mount static files dynamically to serve CSS, JS, and other static assets
@@ -47,6 +51,12 @@ else:
 # Add middleware to enforce allowed hosts
 app.add_middleware(TrustedHostMiddleware, allowed_hosts=allowed_hosts)
 
+# Count and time every request, including those rejected by the middlewares above
+app.add_middleware(MetricsMiddleware)
+
+# Give every request an identifier attached to its logs, and log it once it is sent
+app.add_middleware(RequestLoggingMiddleware)
+
 
 @app.get("/health")
 async def health_check() -> dict[str, str]:
@@ -61,6 +71,22 @@ async def health_check() -> dict[str, str]:
     return {"status": "healthy"}
 
 
+@app.get("/metrics")
+async def metrics_endpoint() -> PlainTextResponse:
+    """
+    Export the metrics of this server process for Prometheus.
+
+    With several workers, each scrape is served by one of them, so every worker reports its own counters.
+
+    Returns
+    -------
+    PlainTextResponse
+        The request counts, in-flight ingestions, per-stage latency histograms, cache hit ratios and ingested
+        volumes, in the Prometheus text format.
+    """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.head("/")
 async def head_root() -> HTMLResponse:
     """
@@ -92,7 +118,7 @@ async def api_docs(request: Request) -> HTMLResponse:
     HTMLResponse
         A rendered HTML page displaying API documentation.
     """
-    return templates.TemplateResponse("api.jinja", {"request": request})
+    return templates.TemplateResponse(request, "api.jinja")
 
 
 @app.get("/robots.txt")
@@ -110,4 +136,8 @@ async def robots() -> FileResponse:
 
 # Include routers for modular endpoints
 app.include_router(index)
+app.include_router(jobs)
+app.include_router(stream)
+app.include_router(digest)
+app.include_router(admin)
 app.include_router(dynamic)
@@ -0,0 +1,378 @@
+""" Metrics of the server, exported at `/metrics` in the Prometheus text format. """
+
+import bisect
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections.abc import Callable, Iterator, Sequence
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from placeholder.config import MAX_FILES, MAX_TOTAL_SIZE_BYTES
+from server.admission import admission
+from server.clone_cache import clone_cache
+from server.result_cache import result_cache
+
+Labels = tuple[str, ...]
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)  # In seconds
+
+
+class Metric(ABC):
+    """
+    A named family of samples, one per combination of label values.
+
+    Parameters
+    ----------
+    name : str
+        The name of the metric.
+    documentation : str
+        The help text of the metric.
+    kind : str
+        The Prometheus type of the metric: `counter`, `gauge` or `histogram`.
+    labelnames : Sequence[str]
+        The names of the labels distinguishing the samples, by default none.
+    """
+
+    def __init__(self, name: str, documentation: str, kind: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def samples(self) -> Iterator[tuple[str, Labels, float]]:
+        """
+        Read the current samples.
+
+        Yields
+        ------
+        tuple[str, Labels, float]
+            The suffix of the sample name, the label values of the sample and its value.
+        """
+
+    def render(self, constant_labels: dict[str, str] | None = None) -> str:
+        """
+        Export the metric.
+
+        Parameters
+        ----------
+        constant_labels : dict[str, str] | None
+            Labels added to every sample, before its own, by default none.
+
+        Returns
+        -------
+        str
+            The metric in the Prometheus text format, with its help and type lines.
+        """
+        constant_labels = constant_labels or {}
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, value in self.samples():
+            names = tuple(constant_labels) + self.labelnames + (("le",) if suffix == "_bucket" else ())
+            values = tuple(constant_labels.values()) + labels
+            lines.append(f"{self.name}{suffix}{_format_labels(names, values)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class Counter(Metric):
+    """A value that only goes up, such as a number of requests."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, "counter", labelnames)
+        self._values: dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        """Add to the sample with the given label values."""
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> Iterator[tuple[str, Labels, float]]:
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            yield "", labels, value
+
+
+class Histogram(Metric):
+    """
+    A distribution of observed values, counted in cumulative buckets.
+
+    Parameters
+    ----------
+    name : str
+        The name of the metric.
+    documentation : str
+        The help text of the metric.
+    labelnames : Sequence[str]
+        The names of the labels distinguishing the samples, by default none.
+    buckets : Sequence[float]
+        The upper bounds of the buckets, in increasing order, by default `LATENCY_BUCKETS`.
+    """
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> None:
+        super().__init__(name, documentation, "histogram", labelnames)
+        self.buckets = tuple(buckets)
+        self._counts: dict[Labels, list[int]] = {}
+        self._sums: dict[Labels, float] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        """Count a value in the sample with the given label values."""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(labels)
+            if counts is None:
+                counts = self._counts[labels] = [0] * (len(self.buckets) + 1)
+                self._sums[labels] = 0.0
+            counts[index] += 1
+            self._sums[labels] += value
+
+    def samples(self) -> Iterator[tuple[str, Labels, float]]:
+        with self._lock:
+            values = [(labels, list(counts), self._sums[labels]) for labels, counts in self._counts.items()]
+        for labels, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield "_bucket", labels + (_format_value(bound),), cumulative
+            yield "_sum", labels, total
+            yield "_count", labels, cumulative
+
+
+class Collector(Metric):
+    """
+    A metric read from the state of another component when it is exported, so updating it costs nothing.
+
+    Parameters
+    ----------
+    name : str
+        The name of the metric.
+    documentation : str
+        The help text of the metric.
+    kind : str
+        The Prometheus type of the metric, `counter` or `gauge`.
+    collect : Callable[[], dict[Labels, float]]
+        Reads the value of each sample, keyed by its label values.
+    labelnames : Sequence[str]
+        The names of the labels distinguishing the samples, by default none.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        kind: str,
+        collect: Callable[[], dict[Labels, float]],
+        labelnames: Sequence[str] = (),
+    ) -> None:
+        super().__init__(name, documentation, kind, labelnames)
+        self.collect = collect
+
+    def samples(self) -> Iterator[tuple[str, Labels, float]]:
+        for labels, value in self.collect().items():
+            yield "", labels, value
+
+
+class MetricsRegistry:
+    """
+    The metrics exported by a server process.
+
+    Parameters
+    ----------
+    constant_labels : Callable[[], dict[str, str]]
+        Reads the labels added to every sample when the metrics are exported, by default none.
+    """
+
+    def __init__(self, constant_labels: Callable[[], dict[str, str]] = dict) -> None:
+        self.metrics: list[Metric] = []
+        self.constant_labels = constant_labels
+
+    def register(self, metric: Metric) -> Metric:
+        """Export a metric, returning it."""
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """
+        Export every metric.
+
+        Returns
+        -------
+        str
+            The metrics in the Prometheus text exposition format, version 0.0.4.
+        """
+        constant_labels = self.constant_labels()
+        return "".join(metric.render(constant_labels) for metric in self.metrics)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware counting HTTP requests and timing them until their response is fully sent.
+
+    Requests are labelled with the path template of the route that handled them rather than with their path, so
+    the number of samples stays bounded.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = getattr(scope.get("route"), "path", "unmatched")
+            http_requests.inc(scope["method"], route, str(status))
+            http_request_duration.observe(time.perf_counter() - start, route)
+
+
+def observe_stages(timings: dict[str, float]) -> None:
+    """
+    Record the time spent in each stage of an ingestion.
+
+    Parameters
+    ----------
+    timings : dict[str, float]
+        Seconds spent in each stage, as measured by a `StageTimer`.
+    """
+    for stage, seconds in timings.items():
+        ingestion_stage_duration.observe(seconds, stage)
+
+
+def observe_ingestion(files: int, size: int, limit_reached: str | None) -> None:
+    """
+    Record the amount of data an ingestion processed, against the configured limits.
+
+    Parameters
+    ----------
+    files : int
+        The number of files ingested.
+    size : int
+        The total size of the files ingested, in bytes.
+    limit_reached : str | None
+        Name of the limit that stopped the ingestion early, if any.
+    """
+    ingested_files.observe(files)
+    ingested_bytes.observe(size)
+    if limit_reached is not None:
+        ingestion_limits_reached.inc(limit_reached)
+
+
+def _cache_requests() -> dict[Labels, float]:
+    """Hits and misses of the caches of this process."""
+    return {
+        ("result", "hit"): result_cache.stats.hits,
+        ("result", "miss"): result_cache.stats.misses,
+        ("clone", "hit"): clone_cache.stats.hits,
+        ("clone", "miss"): clone_cache.stats.misses,
+    }
+
+
+def _cache_hit_ratio() -> dict[Labels, float]:
+    """Share of the lookups of each cache that were hits, 0 before the first lookup."""
+    return {
+        (cache,): hits / (hits + misses) if hits + misses else 0.0
+        for cache, hits, misses in (
+            ("result", result_cache.stats.hits, result_cache.stats.misses),
+            ("clone", clone_cache.stats.hits, clone_cache.stats.misses),
+        )
+    }
+
+
+def _format_labels(names: Labels, values: Labels) -> str:
+    """Render the labels of a sample, escaping their values."""
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _escape(value: str) -> str:
+    """Escape a label value: backslashes, double quotes and line feeds."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    """Render a sample value, or a bucket bound, as Prometheus expects it."""
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+# Each server process exports its own metrics; the PID is read at export time, so workers forked from a preloaded
+# application tell themselves apart
+metrics = MetricsRegistry(lambda: {"worker": str(os.getpid())})
+
+http_requests = metrics.register(
+    Counter("http_requests_total", "HTTP requests handled, by route and status.", ("method", "route", "status"))
+)
+http_request_duration = metrics.register(
+    Histogram("http_request_duration_seconds", "Time to handle HTTP requests, until fully sent.", ("route",))
+)
+ingestion_stage_duration = metrics.register(
+    Histogram(
+        "ingestion_stage_duration_seconds",
+        "Time spent in each stage of an ingestion: clone, walk, read, tokens, format and render.",
+        ("stage",),
+    )
+)
+ingested_files = metrics.register(
+    Histogram("ingested_files", "Files per ingestion.", buckets=(10, 100, 1000, MAX_FILES // 2, MAX_FILES))
+)
+ingested_bytes = metrics.register(
+    Histogram(
+        "ingested_bytes",
+        "Bytes of files per ingestion.",
+        buckets=(2**20, 10 * 2**20, 100 * 2**20, MAX_TOTAL_SIZE_BYTES // 2, MAX_TOTAL_SIZE_BYTES),
+    )
+)
+ingestion_limits_reached = metrics.register(
+    Counter("ingestion_limits_reached_total", "Ingestions stopped early, by limit.", ("limit",))
+)
+metrics.register(
+    Collector(
+        "ingestion_limit",
+        "Configured limits of an ingestion.",
+        "gauge",
+        lambda: {("files",): MAX_FILES, ("bytes",): MAX_TOTAL_SIZE_BYTES},
+        ("limit",),
+    )
+)
+metrics.register(
+    Collector("ingestions_in_flight", "Ingestions running.", "gauge", lambda: {(): admission.stats.running})
+)
+metrics.register(
+    Collector("ingestions_waiting", "Ingestions waiting for a slot.", "gauge", lambda: {(): admission.stats.waiting})
+)
+metrics.register(
+    Collector(
+        "ingestions_rejected_total",
+        "Ingestions rejected by admission control.",
+        "counter",
+        lambda: {(): admission.stats.rejected},
+    )
+)
+metrics.register(
+    Collector(
+        "cache_requests_total", "Cache lookups, by cache and result.", "counter", _cache_requests, ("cache", "result")
+    )
+)
+metrics.register(
+    Collector("cache_hit_ratio", "Share of cache lookups that were hits.", "gauge", _cache_hit_ratio, ("cache",))
+)
@@ -0,0 +1,75 @@
+""" Process pool running the CPU-bound stages of a query outside of the event loop. """
+
+import asyncio
+import multiprocessing
+import threading
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.managers import SyncManager
+from typing import TypeVar
+
+from placeholder.utils import run_cancellable
+from server.server_config import PROCESS_POOL_WORKERS
+
+T = TypeVar("T")
+
+
+class ProcessPool:
+    """
+    A `ProcessPoolExecutor` whose tasks can be cancelled while they run.
+
+    Each task receives a `cancel_event` created by a shared `multiprocessing.Manager`; it is set when the coroutine
+    awaiting the task is cancelled, which is what `async_timeout` does on expiry. With zero workers, tasks run in
+    the event loop's default thread pool instead.
+    """
+
+    def __init__(self, workers: int = PROCESS_POOL_WORKERS) -> None:
+        self.workers = workers
+        self._executor: ProcessPoolExecutor | None = None
+        self._manager: SyncManager | None = None
+
+    async def run(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """
+        Run a function in the pool.
+
+        Parameters
+        ----------
+        func : Callable[..., T]
+            A picklable, module-level function accepting a `cancel_event` keyword argument.
+        *args
+            Positional arguments passed to `func`; they must be picklable.
+        **kwargs
+            Additional keyword arguments passed to `func`; they must be picklable.
+
+        Returns
+        -------
+        T
+            The return value of `func`.
+        """
+        if self._executor is None:
+            return await run_cancellable(None, func, *args, cancel_event=threading.Event(), **kwargs)
+
+        cancel_event = await asyncio.to_thread(self._manager.Event)
+        return await run_cancellable(self._executor, func, *args, cancel_event=cancel_event, **kwargs)
+
+    def start(self) -> None:
+        """Start the worker processes, unless the pool is configured with zero workers."""
+        if self.workers <= 0:
+            return
+
+        # Forking a process that runs an event loop and threads is unsafe, so workers are spawned
+        context = multiprocessing.get_context("spawn")
+        self._manager = context.Manager()
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+
+    async def stop(self) -> None:
+        """Shut down the worker processes, cancelling the tasks that have not started yet."""
+        if self._executor is not None:
+            await asyncio.to_thread(self._executor.shutdown, wait=True, cancel_futures=True)
+            self._executor = None
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
+
+
+process_pool = ProcessPool()
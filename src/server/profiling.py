@@ -0,0 +1,391 @@
+""" Opt-in profiling of queries, with the profiles kept in a bounded ring buffer on disk. """
+
+import asyncio
+import cProfile
+import hmac
+import json
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from collections.abc import AsyncIterator, Callable
+from contextlib import asynccontextmanager, suppress
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from functools import partial
+from pathlib import Path
+from types import FrameType
+from typing import Any, TypeVar
+
+from fastapi import Request
+
+from server.server_config import (
+    DELETE_REPO_AFTER,
+    PROFILE_ADMIN_TOKEN,
+    PROFILE_DIR,
+    PROFILE_MAX_COUNT,
+    PROFILE_SAMPLE_INTERVAL,
+    PROFILE_SAMPLE_RATE,
+    PROFILE_SLOW_THRESHOLD,
+)
+
+T = TypeVar("T")
+
+PROFILE_HEADER = "X-Profile"  # Request header asking for a query to be profiled, carrying the admin token
+ADMIN_TOKEN_HEADER = "X-Admin-Token"  # Request header authorizing access to the saved profiles
+
+_PROFILE_NAME = re.compile(r"^[0-9T]+-[0-9a-f]+\.(prof|stacks)$")
+
+
+@dataclass
+class ProfileSession:
+    """
+    A query being profiled.
+
+    Attributes
+    ----------
+    id : str
+        Identifier of the profile, which sorts in chronological order.
+    mode : str
+        `cprofile` for a deterministic profile in pstats format, or `stacks` for stack samples in the collapsed
+        format read by flame graph tools.
+    trigger : str
+        Why the query is profiled: `requested` through the `X-Profile` header, `sampled` at random, or `slow` if
+        it is only kept should the query exceed the latency threshold.
+    build_output : Path
+        File receiving the profile of the digest build, which runs in the process pool.
+    """
+
+    id: str
+    mode: str
+    trigger: str
+    build_output: Path
+
+    @property
+    def extension(self) -> str:
+        """Extension of the saved profile."""
+        return "prof" if self.mode == "cprofile" else "stacks"
+
+
+_session: ContextVar[ProfileSession | None] = ContextVar("profile_session", default=None)
+
+
+class Profiler:
+    """
+    Decide which queries to profile, and keep their profiles.
+
+    A query is profiled with `cProfile` when a request carries the admin token in its `X-Profile` header, or at
+    random with probability `sample_rate`. With a `slow_threshold`, every other digest build is sampled by a
+    background thread reading its stacks every `PROFILE_SAMPLE_INTERVAL` seconds, which is cheap enough to leave
+    on; the samples are kept only if the query turns out to be slower than the threshold, so a pathological
+    repository is captured the first time it is seen.
+
+    Profiles cover both the event loop, where time spent in other concurrent queries is recorded too, and the
+    digest build in the process pool. They are saved in `directory`, where only the last `max_profiles` are kept,
+    and listed by the `/api/admin/profiles` endpoints.
+
+    Parameters
+    ----------
+    directory : str
+        The directory of the saved profiles, by default `PROFILE_DIR`.
+    max_profiles : int
+        The number of profiles kept, by default `PROFILE_MAX_COUNT`.
+    sample_rate : float
+        The share of queries profiled at random, by default `PROFILE_SAMPLE_RATE`.
+    slow_threshold : float | None
+        The duration beyond which the stack samples of a query are kept, by default `PROFILE_SLOW_THRESHOLD`.
+    admin_token : str | None
+        The token of the `X-Profile` and `X-Admin-Token` headers, by default `PROFILE_ADMIN_TOKEN`. Without a token,
+        profiles cannot be requested nor listed.
+    """
+
+    def __init__(
+        self,
+        directory: str = PROFILE_DIR,
+        max_profiles: int = PROFILE_MAX_COUNT,
+        sample_rate: float = PROFILE_SAMPLE_RATE,
+        slow_threshold: float | None = PROFILE_SLOW_THRESHOLD,
+        admin_token: str | None = PROFILE_ADMIN_TOKEN,
+    ) -> None:
+        self.directory = Path(directory)
+        self.max_profiles = max_profiles
+        self.sample_rate = sample_rate
+        self.slow_threshold = slow_threshold
+        self.admin_token = admin_token
+        self._profiling_loop = False
+
+    def requested(self, request: Request) -> bool:
+        """Whether a request asks for its query to be profiled, with a valid token."""
+        return self._token_matches(request.headers.get(PROFILE_HEADER))
+
+    def authorized(self, request: Request) -> bool:
+        """Whether a request may list and download the saved profiles."""
+        return self._token_matches(request.headers.get(ADMIN_TOKEN_HEADER))
+
+    @asynccontextmanager
+    async def session(self, label: str, requested: bool = False) -> AsyncIterator[ProfileSession | None]:
+        """
+        Profile the query running in the block, if it is requested, sampled or may turn out to be slow.
+
+        Parameters
+        ----------
+        label : str
+            A description of the query saved with its profile, typically the repository.
+        requested : bool
+            Whether the query was explicitly asked to be profiled, by default False.
+
+        Yields
+        ------
+        ProfileSession | None
+            The session, or None if the query is not profiled.
+        """
+        if requested:
+            mode, trigger = "cprofile", "requested"
+        elif self.sample_rate > 0 and random.random() < self.sample_rate:
+            mode, trigger = "cprofile", "sampled"
+        elif self.slow_threshold is not None:
+            mode, trigger = "stacks", "slow"
+        else:
+            yield None
+            return
+
+        profile_id = f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')}-{uuid.uuid4().hex[:12]}"
+        session = ProfileSession(profile_id, mode, trigger, self.directory / ".pending" / profile_id)
+        # Only one profiler can be active in a thread, so concurrent sessions only profile their digest build
+        loop_profile = cProfile.Profile() if mode == "cprofile" and not self._profiling_loop else None
+        if loop_profile is not None and not _enable(loop_profile):
+            loop_profile = None
+        self._profiling_loop = self._profiling_loop or loop_profile is not None
+
+        token = _session.set(session)
+        start = time.perf_counter()
+        try:
+            yield session
+        finally:
+            duration = time.perf_counter() - start
+            _session.reset(token)
+            if loop_profile is not None:
+                loop_profile.disable()
+                self._profiling_loop = False
+
+            if trigger != "slow" or duration >= self.slow_threshold:
+                await asyncio.to_thread(self._save, session, label, duration, loop_profile)
+            else:
+                await asyncio.to_thread(session.build_output.unlink, True)
+
+    def profiles(self) -> list[dict[str, Any]]:
+        """
+        Describe the saved profiles.
+
+        Returns
+        -------
+        list[dict[str, Any]]
+            The identifier, file, query, trigger, mode, duration and creation time of each profile, newest first.
+        """
+        descriptions = []
+        for path in sorted(self.directory.glob("*.json"), reverse=True):
+            with suppress(OSError, ValueError):
+                descriptions.append(json.loads(path.read_text(encoding="utf-8")))
+        return descriptions
+
+    def path(self, filename: str) -> Path | None:
+        """
+        Locate a saved profile.
+
+        Parameters
+        ----------
+        filename : str
+            The file of the profile, as listed by `profiles`.
+
+        Returns
+        -------
+        Path | None
+            The path of the profile, or None if the name is invalid or the profile has been deleted.
+        """
+        if not _PROFILE_NAME.match(filename):
+            return None
+        path = self.directory / filename
+        return path if path.is_file() else None
+
+    def _save(
+        self, session: ProfileSession, label: str, duration: float, loop_profile: cProfile.Profile | None
+    ) -> None:
+        """Save the profiles of a session as one file, with its description, and delete the oldest profiles."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        output = self.directory / f"{session.id}.{session.extension}"
+        if session.mode == "stacks":
+            with suppress(FileNotFoundError):
+                os.replace(session.build_output, output)
+        else:
+            sources = [str(session.build_output)] if session.build_output.exists() else []
+            if loop_profile is not None:
+                sources.insert(0, loop_profile)
+            if sources:
+                pstats.Stats(*sources).dump_stats(output)
+            session.build_output.unlink(missing_ok=True)
+
+        description = {
+            "id": session.id,
+            "file": output.name if output.exists() else None,
+            "query": label,
+            "trigger": session.trigger,
+            "mode": session.mode,
+            "duration": round(duration, 3),
+            "created_at": time.time(),
+        }
+        (self.directory / f"{session.id}.json").write_text(json.dumps(description), encoding="utf-8")
+        self._trim()
+
+    def _trim(self) -> None:
+        """Delete the oldest profiles beyond `max_profiles`, and builds orphaned by a server that died."""
+        for path in sorted(self.directory.glob("*.json"), reverse=True)[self.max_profiles :]:
+            for extension in ("json", "prof", "stacks"):
+                path.with_suffix(f".{extension}").unlink(missing_ok=True)
+        with suppress(FileNotFoundError):
+            for path in (self.directory / ".pending").iterdir():
+                with suppress(FileNotFoundError):
+                    if path.stat().st_mtime < time.time() - DELETE_REPO_AFTER:
+                        path.unlink()
+
+    def _token_matches(self, value: str | None) -> bool:
+        """Compare a header with the admin token in constant time."""
+        if not self.admin_token or value is None:
+            return False
+        return hmac.compare_digest(value.encode(), self.admin_token.encode())
+
+
+class StackSampler:
+    """
+    A sampling profiler, reading the stacks of every other thread of the process at a fixed interval.
+
+    Stacks are counted in the collapsed format, one line per distinct stack with its frames from the outermost to
+    the innermost, separated by semicolons, followed by the number of samples.
+
+    Parameters
+    ----------
+    interval : float
+        Seconds between two samples, by default `PROFILE_SAMPLE_INTERVAL`.
+    """
+
+    def __init__(self, interval: float = PROFILE_SAMPLE_INTERVAL) -> None:
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        """Start sampling in a daemon thread."""
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop sampling and wait for the sampling thread to exit."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def dump(self, path: str) -> None:
+        """Write the samples to a file in the collapsed format."""
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        Path(path).write_text(
+            "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common()), encoding="utf-8"
+        )
+
+    def _run(self) -> None:
+        """Sample until stopped."""
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            # pylint: disable=protected-access
+            for ident, frame in sys._current_frames().items():
+                if ident != own:
+                    self.stacks[_collapse(frame)] += 1
+
+
+def profiled(func: Callable[..., T]) -> Callable[..., T]:
+    """
+    Wrap a function sent to the process pool so that it records its profile for the current session.
+
+    Parameters
+    ----------
+    func : Callable[..., T]
+        A picklable, module-level function.
+
+    Returns
+    -------
+    Callable[..., T]
+        The function itself outside of a profiling session, otherwise a picklable wrapper running it under the
+        profiler of the session.
+    """
+    session = _session.get()
+    if session is None:
+        return func
+    return partial(profile_call, func, profile_mode=session.mode, profile_output=str(session.build_output))
+
+
+def profile_call(func: Callable[..., T], *args: Any, profile_mode: str, profile_output: str, **kwargs: Any) -> T:
+    """
+    Run a function under a profiler, and write its profile to a file even if the function fails or is cancelled.
+
+    Parameters
+    ----------
+    func : Callable[..., T]
+        The function to run.
+    *args : Any
+        Positional arguments passed to `func`.
+    profile_mode : str
+        `cprofile` to profile with `cProfile`, or `stacks` to sample stacks with a `StackSampler`.
+    profile_output : str
+        The file receiving the profile.
+    **kwargs : Any
+        Keyword arguments passed to `func`.
+
+    Returns
+    -------
+    T
+        The return value of `func`.
+    """
+    if profile_mode == "cprofile":
+        profile = cProfile.Profile()
+        enabled = _enable(profile)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            if enabled:
+                profile.disable()
+                Path(profile_output).parent.mkdir(parents=True, exist_ok=True)
+                profile.dump_stats(profile_output)
+
+    sampler = StackSampler()
+    sampler.start()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        sampler.stop()
+        sampler.dump(profile_output)
+
+
+def _enable(profile: cProfile.Profile) -> bool:
+    """Enable a profiler, unless another one is already active, which Python 3.12 forbids."""
+    try:
+        profile.enable()
+    except ValueError:
+        return False
+    return True
+
+
+def _collapse(frame: FrameType | None) -> str:
+    """Describe a stack as its frames, outermost first, separated by semicolons."""
+    frames = []
+    while frame is not None:
+        frames.append(f"{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)})")
+        frame = frame.f_back
+    return ";".join(reversed(frames))
+
+
+profiler = Profiler()
@@ -1,22 +1,151 @@
 """ Process a query by parsing input, cloning a repository, and generating a summary. """
 
+import asyncio
+import html
+import threading
+import time
+import uuid
+from collections.abc import AsyncIterator, Callable, Iterator
+from contextlib import AsyncExitStack, asynccontextmanager
+from dataclasses import dataclass
 from functools import partial
+from pathlib import Path
 
 from fastapi import Request
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from starlette.templating import _TemplateResponse
 
-from console import console
-from placeholder.main import main
-from server.server_config import EXAMPLE_REPOS, templates
+from placeholder.clone import CloneConfig, normalize_repo_url, resolve_commit
+from placeholder.exceptions import AsyncTimeoutError
+from placeholder.ingestion import IngestionLimits
+from placeholder.main import iter_digest, render_digest
+from placeholder.patterns import PatternMatcher
+from placeholder.timing import StageTimer
+from placeholder.utils import CancelEvent, async_timeout, run_cancellable
+from server.admission import admission
+from server.clone_cache import clone_cache
+from server.digest_store import DigestWriter, digest_store
+from server.fragment_cache import fragment_store
+from server.metrics import observe_ingestion, observe_stages
+from server.process_pool import process_pool
+from server.profiling import profiled, profiler
+from server.result_cache import result_cache
+from server.server_config import (
+    EXAMPLE_REPOS,
+    INGESTION_TIMEOUT,
+    MAX_DISPLAY_SIZE,
+    READ_FROM_GIT_OBJECTS,
+    STREAM_CHUNK_SIZE,
+    templates,
+)
+from server.server_logging import logger
 
+_STREAM_MARKER = "__DIGEST_STREAM_MARKER__"
 
-async def process_query(
+ProgressCallback = Callable[[str], None]
+
+
+@dataclass
+class QueryResult:
+    """
+    The outcome of a successful query.
+
+    Attributes
+    ----------
+    content : str
+        The digest.
+    digest_id : str | None
+        Identifier under which the digest can be downloaded from `/api/digest/`, or None if it was not stored.
+    """
+
+    content: str
+    digest_id: str | None = None
+
+
+async def run_query(
+    input_text: str,
+    patterns: PatternMatcher | None = None,
+    progress: ProgressCallback | None = None,
+    max_tokens: int | None = None,
+    profile: bool = False,
+) -> QueryResult:
+    """
+    Compute the digest for a query, reusing cached digests and checkouts when possible.
+
+    The query runs in a session of the profiler, which saves its profile if it was requested, sampled, or slower
+    than the configured threshold.
+
+    Parameters
+    ----------
+    input_text : str
+        Input text provided by the user, typically a Git repository URL or slug.
+    patterns : PatternMatcher | None
+        The include and exclude patterns selecting the files to ingest.
+    progress : ProgressCallback | None
+        Callback receiving a short description of each stage as it starts.
+    max_tokens : int | None
+        The token budget of the digest, unbounded if None.
+    profile : bool
+        Whether the query was explicitly asked to be profiled, by default False.
+
+    Returns
+    -------
+    QueryResult
+        The digest of the repository, truncated if it could not be completed within `INGESTION_TIMEOUT`. The digest
+        is stored for download, complete digests under their cache key and partial ones under a random identifier.
+
+    Raises
+    ------
+    AdmissionRejected
+        If the digest is not cached and the worker is too busy to ingest the repository.
+    Exception
+        Any error raised while resolving, cloning or ingesting the repository, after it has been logged.
+    """
+    progress = progress or _ignore_progress
+    patterns = patterns or PatternMatcher()
+    started = time.perf_counter()
+
+    async with profiler.session(input_text, requested=profile):
+        try:
+            progress("Resolving repository")
+            url = normalize_repo_url(input_text)
+            commit = await resolve_commit(url)
+            key = result_cache.make_key(url, commit, patterns.signature, max_tokens)
+            metadata = _metadata(url, commit, patterns, max_tokens)
+            try:
+                content = await result_cache.get_or_compute(
+                    key, partial(_compute_and_store, key, metadata, url, commit, patterns, progress, max_tokens)
+                )
+            except AsyncTimeoutError as e:
+                # A digest truncated by the deadline is shown, but never cached
+                if e.partial_result is None:
+                    raise
+                result = QueryResult(content=e.partial_result.text, digest_id=uuid.uuid4().hex)
+                await digest_store.save(result.digest_id, result.content, {**metadata, "partial": "true"})
+            else:
+                # A digest cached in memory or on disk can outlive its stored copy, which is then written again
+                if not await asyncio.to_thread(digest_store.exists, key):
+                    await digest_store.save(key, content, metadata)
+                result = QueryResult(content=content, digest_id=key)
+        except Exception as e:
+            _log_error(input_text, e, time.perf_counter() - started)
+            raise
+
+    _log_success(input_text, time.perf_counter() - started, len(result.content))
+    return result
+
+
+def render_query(
     request: Request,
     input_text: str,
     is_index: bool = False,
+    result: str | None = None,
+    error: Exception | str | None = None,
+    digest_id: str | None = None,
 ) -> _TemplateResponse:
     """
-    Process a query received from the user.
+    Render the page showing the outcome of a query.
 
     Parameters
     ----------
@@ -26,6 +155,12 @@ async def process_query(
         Input text provided by the user, typically a Git repository URL or slug.
     is_index : bool
         Flag indicating whether the request is for the index page (default is False).
+    result : str | None
+        The digest to display, if the query succeeded. Only its first `MAX_DISPLAY_SIZE` characters are rendered.
+    error : Exception | str | None
+        The error to display, if the query failed.
+    digest_id : str | None
+        Identifier of the stored digest, used to link to its download endpoints.
 
     Returns
     -------
@@ -34,37 +169,370 @@ async def process_query(
     """
 
     template = "index.jinja" if is_index else "git.jinja"
-    template_response = partial(templates.TemplateResponse, name=template)
+    template_response = partial(templates.TemplateResponse, request=request, name=template)
 
     context = {
-        "request": request,
         "repo_url": input_text,
         "examples": EXAMPLE_REPOS if is_index else [],
     }
 
+    if error is not None:
+        context["error_message"] = f"Error: {error}"
+    else:
+        context["result"], context["truncated"] = truncate_for_display(result or "", MAX_DISPLAY_SIZE)
+        context["digest_id"] = digest_id
+
+    return template_response(context=context)
+
+
+def truncate_for_display(text: str, limit: int) -> tuple[str, bool]:
+    """
+    Cut a digest down to the part rendered inline, at a line boundary.
+
+    Parameters
+    ----------
+    text : str
+        The digest.
+    limit : int
+        The maximum number of characters to keep.
+
+    Returns
+    -------
+    tuple[str, bool]
+        The longest run of whole lines fitting in `limit` characters, or the first `limit` characters if the first
+        line alone is longer, and whether anything was cut.
+    """
+    if len(text) <= limit:
+        return text, False
+
+    cut = text.rfind("\n", 0, limit) + 1
+    return text[: cut or limit], True
+
+
+async def stream_query(
+    request: Request,
+    input_text: str,
+    is_index: bool = False,
+    patterns: PatternMatcher | None = None,
+    max_tokens: int | None = None,
+) -> StreamingResponse | _TemplateResponse:
+    """
+    Process a query and stream the resulting page while the digest is being built.
+
+    The page shell, up to the start of the result text area, is sent first. The digest is then sent in chunks as
+    `iter_digest` produces them, up to `MAX_DISPLAY_SIZE` characters, followed by the rest of the page. The whole
+    digest is written to the digest store as it is produced, so the download links of the page serve it once it is
+    complete. The digest is never held in memory as a whole, and it bypasses the result cache.
+
+    Parameters
+    ----------
+    request : Request
+        The HTTP request object.
+    input_text : str
+        Input text provided by the user, typically a Git repository URL or slug.
+    is_index : bool
+        Flag indicating whether the request is for the index page (default is False).
+    patterns : PatternMatcher | None
+        The include and exclude patterns selecting the files to ingest.
+    max_tokens : int | None
+        The token budget of the digest, unbounded if None.
+
+    Returns
+    -------
+    StreamingResponse | _TemplateResponse
+        The streamed page, or a rendered error page if the repository cannot be resolved.
+
+    Raises
+    ------
+    AdmissionRejected
+        If the worker is too busy to ingest the repository, before anything is sent.
+    """
     try:
-        result = await main(input_text)
+        url = normalize_repo_url(input_text)
+        commit = await resolve_commit(url)
     except Exception as e:
-        context["error_message"] = f"Error: {e}"
-        _print_error(url=input_text, e=e)
-        return template_response(context=context)
+        _log_error(input_text, e)
+        return render_query(request, input_text, is_index=is_index, error=e)
 
-    _print_success(
-        url=input_text,
-    )
+    patterns = patterns or PatternMatcher()
+    digest_id = result_cache.make_key(url, commit, patterns.signature, max_tokens)
+    timer = StageTimer()
+    with timer.measure("render"):
+        shell = render_query(request, input_text, is_index=is_index, result=_STREAM_MARKER, digest_id=digest_id)
+    observe_stages(timer.durations)
+    head, _, tail = shell.body.decode().partition(_STREAM_MARKER)
 
-    context.update(
-        {
-            "result": result,
-        }
-    )
+    release = await admission.acquire()
+    page = _stream_page(head, tail, input_text, url, commit, patterns, max_tokens, digest_id, release)
+    # The page releases its slot when it ends; the background task covers a response that is never sent
+    return StreamingResponse(page, media_type="text/html", background=BackgroundTask(release))
 
-    return template_response(context=context)
+
+async def _stream_page(
+    head: str,
+    tail: str,
+    input_text: str,
+    url: str,
+    commit: str,
+    patterns: PatternMatcher,
+    max_tokens: int | None,
+    digest_id: str,
+    release: Callable[[], None],
+) -> AsyncIterator[str]:
+    """
+    Generate a result page whose digest is read from disk while the page is being sent.
+
+    Only the first `MAX_DISPLAY_SIZE` characters of the digest are sent inline, cut at a line boundary. Every chunk
+    is also written to the digest store, which publishes the digest under `digest_id` if it completes.
+
+    The clone and the production of every chunk are bounded by `INGESTION_TIMEOUT`, counted from the start of the
+    page: a clone running past it is killed, and the thread producing the digest is told to stop, as it is when the
+    client disconnects. A digest cut short by the deadline is sent truncated and never published.
+
+    Parameters
+    ----------
+    head : str
+        The page up to the content of the result text area.
+    tail : str
+        The rest of the page.
+    input_text : str
+        Input text provided by the user, used for logging.
+    url : str
+        The normalized clone URL of the repository.
+    commit : str
+        The commit SHA to ingest.
+    patterns : PatternMatcher
+        The include and exclude patterns selecting the files to ingest.
+    max_tokens : int | None
+        The token budget of the digest, unbounded if None.
+    digest_id : str
+        Identifier under which the complete digest is stored.
+    release : Callable[[], None]
+        Gives back the admission slot of the ingestion, called once the digest is complete or has failed.
+
+    Yields
+    ------
+    str
+        The page head, HTML-escaped chunks of the digest, then the page tail.
+    """
+    yield head
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    deadline = started + INGESTION_TIMEOUT
+    cancel_event = threading.Event()
+    writer = None
+    remaining = MAX_DISPLAY_SIZE
+    size = 0
+    timer = StageTimer()
+    try:
+        async with _checkout_within(INGESTION_TIMEOUT, url, commit) as path:
+            timer.add("clone", loop.time() - started)
+            chunks = iter_digest(
+                str(path),
+                limits=IngestionLimits(max_tokens=max_tokens),
+                name=url,
+                patterns=patterns,
+                cancel_event=cancel_event,
+                commit=_object_commit(commit),
+                fragments=fragment_store,
+                timer=timer,
+            )
+            metadata = _metadata(url, commit, patterns, max_tokens)
+            writer = await asyncio.to_thread(digest_store.open_writer, digest_id, metadata)
+            while True:
+                produce = run_cancellable(None, _next_chunk, chunks, writer, cancel_event=cancel_event)
+                try:
+                    chunk = await asyncio.wait_for(produce, timeout=deadline - loop.time())
+                except asyncio.TimeoutError:
+                    yield "\n[Truncated: time limit reached]\n"
+                    break
+                if chunk is None:
+                    await asyncio.to_thread(writer.commit)
+                    writer = None
+                    break
+                size += len(chunk)
+                if remaining > 0:
+                    shown, truncated = truncate_for_display(chunk, remaining)
+                    remaining = 0 if truncated else remaining - len(shown)
+                    for start in range(0, len(shown), STREAM_CHUNK_SIZE):
+                        yield html.escape(shown[start : start + STREAM_CHUNK_SIZE])
+                    if truncated:
+                        yield "\n[Truncated for display: download the full digest with the links above]\n"
+    except Exception as e:
+        # The status code has already been sent, so the error can only be reported inline
+        _log_error(input_text, e, loop.time() - started)
+        yield html.escape(f"\n[Error: {e}]\n")
+    else:
+        _log_success(input_text, loop.time() - started, size)
+    finally:
+        # Stops the thread producing the digest if the client went away while it was running
+        cancel_event.set()
+        # An incomplete digest is never published under the identifier of the complete one
+        if writer is not None:
+            await asyncio.to_thread(writer.discard)
+        release()
+        observe_stages(timer.durations)
+
+    yield tail
+
+
+@asynccontextmanager
+async def _checkout_within(timeout: float, url: str, commit: str) -> AsyncIterator[Path]:
+    """
+    Check out a repository through the clone cache, killing the clone if it is still running after `timeout`.
+
+    Parameters
+    ----------
+    timeout : float
+        Seconds after which the clone is given up.
+    url : str
+        The normalized clone URL of the repository.
+    commit : str
+        The commit SHA to check out.
+
+    Yields
+    ------
+    Path
+        The directory containing the checkout, protected from eviction until the context exits.
+
+    Raises
+    ------
+    AsyncTimeoutError
+        If the checkout was not ready within `timeout` seconds.
+    """
+    async with AsyncExitStack() as stack:
+        checkout = clone_cache.checkout(url, ref=commit, config=_clone_config())
+        try:
+            path = await asyncio.wait_for(stack.enter_async_context(checkout), timeout=timeout)
+        except asyncio.TimeoutError as e:
+            raise AsyncTimeoutError(f"Operation timed out after {timeout} seconds") from e
+        yield path
+
+
+def _next_chunk(chunks: Iterator[str], writer: DigestWriter, cancel_event: CancelEvent) -> str | None:
+    """
+    Produce the next chunk of a digest and write it to the store, returning None once the digest is complete.
+
+    `chunks` polls `cancel_event` itself; it is only checked here so that no chunk is started once it is set.
+    """
+    if cancel_event.is_set():
+        return None
+    chunk = next(chunks, None)
+    if chunk is not None:
+        writer.write(chunk)
+    return chunk
+
+
+async def _compute_and_store(
+    key: str,
+    metadata: dict[str, str],
+    url: str,
+    commit: str,
+    patterns: PatternMatcher,
+    progress: ProgressCallback,
+    max_tokens: int | None,
+) -> str:
+    """Compute a digest missing from the result cache with `_admit_and_ingest`, and store it for download."""
+    content = await _admit_and_ingest(url, commit, patterns, progress, max_tokens)
+    await digest_store.save(key, content, metadata)
+    return content
+
+
+async def _admit_and_ingest(
+    url: str, commit: str, patterns: PatternMatcher, progress: ProgressCallback, max_tokens: int | None
+) -> str:
+    """Wait for an admission slot, then run `_ingest`, whose timeout only starts once the slot is granted."""
+    progress("Waiting for a free worker")
+    release = await admission.acquire()
+    try:
+        return await _ingest(url, commit, patterns, progress, max_tokens)
+    finally:
+        release()
+
+
+@async_timeout(INGESTION_TIMEOUT, partial=True)
+async def _ingest(
+    url: str, commit: str, patterns: PatternMatcher, progress: ProgressCallback, max_tokens: int | None
+) -> str:
+    """
+    Check out a repository through the clone cache and build its digest in the process pool.
+
+    The digest is rendered in the pool as well, which only hands back its text. On timeout, a running clone is
+    killed, and the digest build running in the pool stops and hands back the digest of the files read so far, as a
+    `RenderedDigest` attached to the `AsyncTimeoutError`.
+
+    Parameters
+    ----------
+    url : str
+        The normalized clone URL of the repository.
+    commit : str
+        The commit SHA to ingest.
+    patterns : PatternMatcher
+        The include and exclude patterns selecting the files to ingest.
+    progress : ProgressCallback
+        Callback receiving a short description of each stage as it starts.
+    max_tokens : int | None
+        The token budget of the digest, unbounded if None.
+
+    Returns
+    -------
+    str
+        The text of the digest of the repository at `commit`, which is what the result cache and the digest store
+        hold.
+    """
+    loop = asyncio.get_running_loop()
+    timer = StageTimer()
+    progress("Cloning repository")
+    start = loop.time()
+    async with clone_cache.checkout(url, ref=commit, config=_clone_config()) as path:
+        timer.add("clone", loop.time() - start)
+        progress("Building digest")
+        digest = await process_pool.run(
+            profiled(render_digest),
+            str(path),
+            limits=IngestionLimits(max_tokens=max_tokens),
+            name=url,
+            patterns=patterns,
+            commit=_object_commit(commit),
+            fragments=fragment_store,
+        )
+
+    for stage, seconds in digest.timings.items():
+        timer.add(stage, seconds)
+    observe_stages(timer.durations)
+    observe_ingestion(digest.files, digest.size, digest.limit_reached)
+    return digest.text
+
+
+def _clone_config() -> CloneConfig:
+    """Clone options of the configured ingestion mode: a bare repository when reading from git objects."""
+    return CloneConfig(checkout=not READ_FROM_GIT_OBJECTS)
+
+
+def _object_commit(commit: str) -> str | None:
+    """The commit to read from git objects, or None to walk the checkout when reading from git objects is off."""
+    return commit if READ_FROM_GIT_OBJECTS else None
+
+
+def _metadata(url: str, commit: str, patterns: PatternMatcher, max_tokens: int | None) -> dict[str, str]:
+    """Describe a digest for the JSON representation served by the digest store."""
+    return {
+        "source": url,
+        "commit": commit,
+        "include_patterns": ",".join(patterns.include),
+        "exclude_patterns": ",".join(patterns.exclude),
+        "max_tokens": "" if max_tokens is None else str(max_tokens),
+    }
+
+
+def _ignore_progress(_: str) -> None:
+    """Progress callback used when the caller does not track progress."""
 
 
-def _print_error(url: str, e: Exception) -> None:
+def _log_error(url: str, e: Exception, duration: float | None = None) -> None:
     """
-    Print a formatted error message.
+    Log a failed query.
 
     Parameters
     ----------
@@ -72,17 +540,24 @@ def _print_error(url: str, e: Exception) -> None:
         The URL associated with the query that caused the error.
     e : Exception
         The exception raised during the query or process.
+    duration : float | None
+        Seconds spent on the query before it failed, if known.
     """
-    console.log(f"[ko]Fail[/ko]: {url}\n[ko]Error[/ko]: {e}")
+    extra = {"url": url, "error": str(e), "duration": None if duration is None else round(duration, 3)}
+    logger.error("Fail: %s: %s", url, e, extra=extra)
 
 
-def _print_success(url: str) -> None:
+def _log_success(url: str, duration: float, size: int) -> None:
     """
-    Print a formatted success message.
+    Log a successful query.
 
     Parameters
     ----------
     url : str
         The URL associated with the successful query.
+    duration : float
+        Seconds spent on the query.
+    size : int
+        Size of the digest in characters.
     """
-    console.log(f"[ok]Success[/ok]: {url}")
+    logger.info("Success: %s", url, extra={"url": url, "duration": round(duration, 3), "characters": size})
@@ -0,0 +1,181 @@
+""" Two-tier cache of computed digests with de-duplication of concurrent computations. """
+
+import asyncio
+import hashlib
+import os
+import sys
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from contextlib import suppress
+from dataclasses import dataclass
+
+from server.server_config import RESULT_CACHE_DIR, RESULT_CACHE_DISK_MAX_BYTES, RESULT_CACHE_MAX_BYTES
+
+
+@dataclass
+class CacheStats:
+    """
+    Counters of the lookups of a cache.
+
+    Attributes
+    ----------
+    hits : int
+        Lookups answered from the cache.
+    misses : int
+        Lookups that had to compute or fetch the entry.
+    """
+
+    hits: int = 0
+    misses: int = 0
+
+
+class ResultCache:
+    """
+    Cache of digests keyed by normalized source and options.
+
+    Digests are kept in a bounded in-memory LRU tier and, when a directory is configured, in an on-disk tier that
+    survives restarts. Concurrent requests for the same key share a single computation (singleflight): the first
+    caller computes the digest while the others await its result.
+
+    The memory tier is bounded by the memory its digests occupy, which for non-ASCII text is several bytes per
+    character.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = RESULT_CACHE_MAX_BYTES,
+        directory: str | None = RESULT_CACHE_DIR,
+        disk_max_bytes: int = RESULT_CACHE_DISK_MAX_BYTES,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.disk_max_bytes = disk_max_bytes
+        self.stats = CacheStats()
+        self._memory: OrderedDict[str, str] = OrderedDict()
+        self._memory_size = 0
+        self._inflight: dict[str, asyncio.Task[str]] = {}
+
+    @staticmethod
+    def make_key(*parts: object) -> str:
+        """
+        Build a cache key from a source and its options.
+
+        Parameters
+        ----------
+        *parts : object
+            The normalized source followed by every option that affects the digest.
+
+        Returns
+        -------
+        str
+            A hex digest identifying the combination of parts.
+        """
+        return hashlib.sha256("\0".join(map(str, parts)).encode()).hexdigest()
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[str]]) -> str:
+        """
+        Return the cached digest for `key`, computing it at most once if it is missing.
+
+        Parameters
+        ----------
+        key : str
+            The cache key, as built by `make_key`.
+        compute : Callable[[], Awaitable[str]]
+            Coroutine function producing the digest on a cache miss.
+
+        Returns
+        -------
+        str
+            The cached or freshly computed digest.
+        """
+        if (result := self._get_memory(key)) is not None:
+            self.stats.hits += 1
+            return result
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._load_or_compute(key, compute))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.stats.hits += 1
+
+        # Shield the shared computation so a disconnecting caller does not cancel it for the other waiters
+        return await asyncio.shield(task)
+
+    async def _load_or_compute(self, key: str, compute: Callable[[], Awaitable[str]]) -> str:
+        """Read the digest from disk, or compute it and store it in both tiers."""
+        result = await asyncio.to_thread(self._read_disk, key) if self.directory else None
+        if result is not None:
+            self.stats.hits += 1
+        else:
+            self.stats.misses += 1
+            result = await compute()
+            if self.directory:
+                await asyncio.to_thread(self._write_disk, key, result)
+
+        self._put_memory(key, result)
+        return result
+
+    def _get_memory(self, key: str) -> str | None:
+        """Look up the memory tier, marking the entry as most recently used."""
+        result = self._memory.get(key)
+        if result is not None:
+            self._memory.move_to_end(key)
+        return result
+
+    def _put_memory(self, key: str, result: str) -> None:
+        """Insert into the memory tier, evicting least recently used entries beyond `max_bytes`."""
+        size = sys.getsizeof(result)
+        if size > self.max_bytes:
+            return
+
+        if key in self._memory:
+            self._memory_size -= sys.getsizeof(self._memory.pop(key))
+        self._memory[key] = result
+        self._memory_size += size
+
+        while self._memory_size > self.max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= sys.getsizeof(evicted)
+
+    def _disk_path(self, key: str) -> str:
+        """Path of the on-disk entry for `key`."""
+        return os.path.join(self.directory, f"{key}.txt")
+
+    def _read_disk(self, key: str) -> str | None:
+        """Read an entry from the disk tier, refreshing its modification time for LRU eviction."""
+        path = self._disk_path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                result = f.read()
+            os.utime(path)
+        except OSError:
+            return None
+        return result
+
+    def _write_disk(self, key: str, result: str) -> None:
+        """Write an entry to the disk tier atomically, then prune the tier to `disk_max_bytes`."""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._disk_path(key)
+        staging = f"{path}.{os.getpid()}.tmp"
+        with open(staging, "w", encoding="utf-8") as f:
+            f.write(result)
+        os.replace(staging, path)
+        self._prune_disk()
+
+    def _prune_disk(self) -> None:
+        """Delete the least recently used on-disk entries until the tier fits in `disk_max_bytes`."""
+        with os.scandir(self.directory) as it:
+            entries = [(e.stat().st_mtime, e.stat().st_size, e.path) for e in it if e.name.endswith(".txt")]
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.disk_max_bytes:
+                break
+            with suppress(OSError):
+                os.remove(path)
+            total -= size
+
+
+result_cache = ResultCache()
@@ -1,6 +1,10 @@
 """ This module contains the routers for the FastAPI application. """
 
+from server.routers.admin import router as admin
+from server.routers.digest import router as digest
 from server.routers.dynamic import router as dynamic
 from server.routers.index import router as index
+from server.routers.jobs import router as jobs
+from server.routers.stream import router as stream
 
-__all__ = ["dynamic", "index"]
+__all__ = ["admin", "digest", "dynamic", "index", "jobs", "stream"]
@@ -0,0 +1,67 @@
+""" This module defines the admin router listing and serving the profiles of slow or profiled queries. """
+
+from typing import Any
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse
+
+from server.profiling import profiler
+
+router = APIRouter(prefix="/api/admin/profiles")
+
+
+@router.get("")
+async def list_profiles(request: Request) -> list[dict[str, Any]]:
+    """
+    List the saved profiles, newest first.
+
+    Parameters
+    ----------
+    request : Request
+        The incoming request object, which must carry the admin token in its `X-Admin-Token` header.
+
+    Returns
+    -------
+    list[dict[str, Any]]
+        The identifier, file, query, trigger, mode, duration and creation time of each profile.
+    """
+    _authorize(request)
+    return profiler.profiles()
+
+
+@router.get("/{filename}")
+async def download_profile(request: Request, filename: str) -> FileResponse:
+    """
+    Serve a saved profile: a `.prof` file readable by `pstats` and `snakeviz`, or a `.stacks` file of collapsed
+    stacks readable by `flamegraph.pl` and `speedscope`.
+
+    Parameters
+    ----------
+    request : Request
+        The incoming request object, which must carry the admin token in its `X-Admin-Token` header.
+    filename : str
+        The file of the profile, as listed by `list_profiles`.
+
+    Returns
+    -------
+    FileResponse
+        The profile.
+
+    Raises
+    ------
+    HTTPException
+        If the profile does not exist (404).
+    """
+    _authorize(request)
+    path = profiler.path(filename)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/octet-stream", filename=filename)
+
+
+def _authorize(request: Request) -> None:
+    """Reject requests without the admin token, hiding the endpoints entirely when no token is configured."""
+    if not profiler.admin_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not profiler.authorized(request):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
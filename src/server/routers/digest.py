@@ -0,0 +1,115 @@
+""" This module defines the router serving stored digests as plain text or JSON downloads. """
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse, Response
+
+from server.digest_store import FORMATS, available_encodings, digest_store
+from server.server_config import DELETE_REPO_AFTER
+
+router = APIRouter(prefix="/api/digest")
+
+MEDIA_TYPES: dict[str, str] = {
+    "txt": "text/plain; charset=utf-8",
+    "json": "application/json",
+}
+
+
+@router.api_route("/{filename}", methods=["GET", "HEAD"])
+async def download_digest(request: Request, filename: str) -> Response:
+    """
+    Serve a stored digest as `{id}.txt` or `{id}.json`, or only its headers for `HEAD` requests.
+
+    The response is compressed with the best encoding accepted by the client (`zstd`, `br` or `gzip`, depending on
+    the optional dependencies installed), answers `If-None-Match` with `304 Not Modified`, and supports `Range`
+    requests over the encoded bytes.
+
+    Parameters
+    ----------
+    request : Request
+        The incoming request object, whose headers drive content negotiation.
+    filename : str
+        The identifier of the digest followed by the requested format extension.
+
+    Returns
+    -------
+    Response
+        The digest file, a partial response for range requests, or an empty `304 Not Modified` response.
+
+    Raises
+    ------
+    HTTPException
+        If the format is not supported or the digest does not exist (404).
+    """
+    digest_id, _, fmt = filename.partition(".")
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=404, detail="Unknown digest format")
+
+    encoding = _negotiate_encoding(request.headers.get("accept-encoding", ""))
+    path = await digest_store.get_file(digest_id, fmt, encoding)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Digest not found")
+
+    etag = f'"{digest_id}-{fmt}-{encoding or "identity"}"'
+    headers = {"ETag": etag, "Vary": "Accept-Encoding", "Cache-Control": f"private, max-age={DELETE_REPO_AFTER}"}
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    return FileResponse(path, media_type=MEDIA_TYPES[fmt], headers=headers)
+
+
+def _negotiate_encoding(accept_encoding: str) -> str | None:
+    """
+    Pick the content encoding to respond with.
+
+    Parameters
+    ----------
+    accept_encoding : str
+        The value of the `Accept-Encoding` request header.
+
+    Returns
+    -------
+    str | None
+        The first encoding of `available_encodings()` accepted with a non-zero quality, or None for no encoding.
+    """
+    accepted: dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, *params = (part.strip() for part in item.split(";"))
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if name:
+            accepted[name.lower()] = quality
+
+    for encoding in available_encodings():
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    Check an `If-None-Match` header against an entity tag, using weak comparison.
+
+    Parameters
+    ----------
+    if_none_match : str | None
+        The value of the `If-None-Match` request header.
+    etag : str
+        The entity tag of the representation.
+
+    Returns
+    -------
+    bool
+        True if the header is `*` or lists `etag`.
+    """
+    if not if_none_match:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or etag in tags
@@ -1,11 +1,12 @@
 """ This module defines the FastAPI router for the home page of the application. """
 
 from fastapi import APIRouter, Form, Request
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse
 
-from server.query_processor import process_query
+from placeholder.patterns import PatternType
+from server.profiling import profiler
 from server.server_config import EXAMPLE_REPOS, templates
-from server.server_utils import limiter
+from server.server_utils import enqueue_query, limiter
 
 router = APIRouter()
 
@@ -30,42 +31,53 @@ async def home(request: Request) -> HTMLResponse:
         and other default parameters such as file size.
     """
     return templates.TemplateResponse(
+        request,
         "index.jinja",
         {
-            "request": request,
             "examples": EXAMPLE_REPOS,
         },
     )
 
 
-@router.post("/", response_class=HTMLResponse)
+@router.post("/", status_code=202)
 @limiter.limit("10/minute")
 async def index_post(
     request: Request,
     input_text: str = Form(...),
-) -> HTMLResponse:
+    pattern_type: PatternType = Form(PatternType.EXCLUDE),
+    pattern: str = Form(""),
+    max_tokens: int | None = Form(None, ge=0),
+) -> JSONResponse:
     """
-    Process the form submission with user input for query parameters.
+    Queue the form submission with user input for query parameters.
 
-    This endpoint handles POST requests from the home page form. It processes the user-submitted
-    input (e.g., text, file size, pattern type) and invokes the `process_query` function to handle
-    the query logic, returning the result as an HTML response.
+    This endpoint handles POST requests from the home page form. It submits the user-submitted
+    input to the background job queue and returns immediately; the client follows the job through
+    the `/jobs/{job_id}` endpoints and fetches the rendered result once it is done.
 
     Parameters
     ----------
     request : Request
-        The incoming request object, which provides context for rendering the response.
+        The incoming request object, used by the rate limiter and to tell whether the query should be profiled.
     input_text : str
         The input text provided by the user for processing, by default taken from the form.
+    pattern_type : PatternType
+        Whether `pattern` selects the files to include or the files to exclude, by default `exclude`.
+    pattern : str
+        Globs separated by commas or whitespace, by default empty.
+    max_tokens : int | None
+        The token budget of the digest, by default None for no budget.
 
     Returns
     -------
-    HTMLResponse
-        An HTML response containing the results of processing the form input and query logic,
-        which will be rendered and returned to the user.
+    JSONResponse
+        A `202 Accepted` response containing the job ID and the URLs to follow it.
     """
-    return await process_query(
-        request,
+    return await enqueue_query(
         input_text,
         is_index=True,
+        pattern_type=pattern_type,
+        pattern=pattern,
+        max_tokens=max_tokens,
+        profile=profiler.requested(request),
     )
@@ -0,0 +1,151 @@
+""" This module defines the router exposing the status, progress events and results of background jobs. """
+
+import json
+from collections.abc import AsyncIterator
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import HTMLResponse, StreamingResponse
+
+from placeholder.timing import StageTimer
+from server.digest_store import digest_store
+from server.jobs import Job, JobStatus, job_queue
+from server.metrics import observe_stages
+from server.query_processor import render_query
+from server.server_config import MAX_DISPLAY_SIZE, SSE_KEEPALIVE_INTERVAL
+
+router = APIRouter(prefix="/jobs")
+
+
+@router.get("/{job_id}")
+async def job_status(job_id: str) -> dict[str, str | float | None]:
+    """
+    Report the status and progress of a job.
+
+    Parameters
+    ----------
+    job_id : str
+        The identifier returned when the query was submitted.
+
+    Returns
+    -------
+    dict[str, str | float | None]
+        A JSON object with the status, progress and error of the job.
+    """
+    job = await _get_job(job_id)
+    return job.to_dict()
+
+
+@router.get("/{job_id}/events")
+async def job_events(job_id: str) -> StreamingResponse:
+    """
+    Stream the progress of a job as Server-Sent Events.
+
+    An event carrying the same JSON object as `job_status` is sent immediately and after every change, until the
+    job finishes. Comment lines are sent while nothing changes to keep proxies from closing the connection.
+
+    Parameters
+    ----------
+    job_id : str
+        The identifier returned when the query was submitted.
+
+    Returns
+    -------
+    StreamingResponse
+        A `text/event-stream` response.
+    """
+    job = await _get_job(job_id)
+    return StreamingResponse(
+        _event_stream(job),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/{job_id}/result", response_class=HTMLResponse)
+async def job_result(request: Request, job_id: str) -> HTMLResponse:
+    """
+    Render the page showing the outcome of a finished job.
+
+    Parameters
+    ----------
+    request : Request
+        The incoming request object, which provides context for rendering the response.
+    job_id : str
+        The identifier returned when the query was submitted.
+
+    Returns
+    -------
+    HTMLResponse
+        The same page the synchronous form submission used to return.
+
+    Raises
+    ------
+    HTTPException
+        If the job or its stored digest does not exist (404), or if the job has not finished yet (409).
+    """
+    job = await _get_job(job_id)
+    if not job.finished:
+        raise HTTPException(status_code=409, detail="Job has not finished yet")
+
+    query = job.query
+    if job.state.status == JobStatus.FAILED:
+        return render_query(request, query.input_text, is_index=query.is_index, error=job.state.error)
+
+    # Only the displayed part of the digest is read; one character past the limit tells whether it was truncated
+    digest_id = job.state.digest_id
+    content = None if digest_id is None else await digest_store.read(digest_id, MAX_DISPLAY_SIZE + 1)
+    if content is None:
+        raise HTTPException(status_code=404, detail="Job result has expired")
+    timer = StageTimer()
+    with timer.measure("render"):
+        page = render_query(request, query.input_text, is_index=query.is_index, result=content, digest_id=digest_id)
+    observe_stages(timer.durations)
+    return page
+
+
+async def _get_job(job_id: str) -> Job:
+    """
+    Look up a job, failing with a 404 if it does not exist.
+
+    Parameters
+    ----------
+    job_id : str
+        The identifier returned when the query was submitted.
+
+    Returns
+    -------
+    Job
+        The job.
+
+    Raises
+    ------
+    HTTPException
+        If the job does not exist or has expired.
+    """
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+async def _event_stream(job: Job) -> AsyncIterator[str]:
+    """
+    Generate the Server-Sent Events describing a job until it finishes.
+
+    Parameters
+    ----------
+    job : Job
+        The job to follow.
+
+    Yields
+    ------
+    str
+        An encoded event or keep-alive comment.
+    """
+    while True:
+        version = job.state.version
+        yield f"data: {json.dumps(job.to_dict())}\n\n"
+        if job.finished:
+            return
+        while not await job.wait(version, timeout=SSE_KEEPALIVE_INTERVAL):
+            yield ": keep-alive\n\n"
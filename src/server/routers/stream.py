@@ -0,0 +1,49 @@
+""" This module defines the router streaming result pages while the digest is being built. """
+
+from typing import Annotated
+
+from fastapi import APIRouter, Query, Request
+from fastapi.responses import HTMLResponse, Response
+
+from placeholder.patterns import PatternMatcher, PatternType
+from server.query_processor import stream_query
+from server.server_utils import limiter
+
+router = APIRouter()
+
+
+@router.get("/stream/{full_path:path}", response_class=HTMLResponse)
+@limiter.limit("10/minute")
+async def stream_catch_all(
+    request: Request,
+    full_path: str,
+    pattern_type: PatternType = PatternType.EXCLUDE,
+    pattern: str = "",
+    max_tokens: Annotated[int | None, Query(ge=0)] = None,
+) -> Response:
+    """
+    Stream the result page for the repository given in the path.
+
+    Unlike the form submission, which waits for a background job, this endpoint sends the page immediately and
+    the digest in chunks as it is read, so clients can start reading before it is complete.
+
+    Parameters
+    ----------
+    request : Request
+        The incoming request object, which provides context for rendering the response.
+    full_path : str
+        The full path extracted from the URL, interpreted as a Git URL or `owner/repo` slug.
+    pattern_type : PatternType
+        Whether `pattern` selects the files to include or the files to exclude, by default `exclude`.
+    pattern : str
+        Globs separated by commas or whitespace, by default empty.
+    max_tokens : int | None
+        The token budget of the digest, by default None for no budget.
+
+    Returns
+    -------
+    Response
+        The streamed result page, or an error page if the repository cannot be resolved.
+    """
+    patterns = PatternMatcher.from_form(pattern_type, pattern)
+    return await stream_query(request, full_path, is_index=False, patterns=patterns, max_tokens=max_tokens)
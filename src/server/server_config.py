@@ -1,10 +1,69 @@
 """ Configuration for the server. """
 
+import os
+import tempfile
+
 from fastapi.templating import Jinja2Templates
 
 MAX_DISPLAY_SIZE: int = 300_000
 DELETE_REPO_AFTER: int = 60 * 60  # In seconds
 
+WORKERS: int = int(os.getenv("WEB_CONCURRENCY", "1"))  # Server processes, also read by uvicorn and gunicorn
+SHARED_STATE_DIR: str = os.getenv("SHARED_STATE_DIR", os.path.join(tempfile.gettempdir(), "shared_state"))
+SHARED_STATE_URI: str = os.getenv(  # Counters and records shared by the workers: memory:// or sqlite:///path
+    "SHARED_STATE_URI", "memory://" if WORKERS == 1 else f"sqlite:///{os.path.join(SHARED_STATE_DIR, 'state.sqlite')}"
+)
+SHARED_STATE_PURGE_INTERVAL: int = 60  # Seconds between deletions of expired counters and records
+RATE_LIMIT_STORAGE_URI: str = os.getenv("RATE_LIMIT_STORAGE_URI", SHARED_STATE_URI)  # Any `limits` storage URI
+RATE_LIMIT_STORAGE_TIMEOUT: float = 0.5  # Seconds a rate limit check waits for a locked sqlite:// storage
+
+CLONE_CACHE_DIR: str = os.getenv("CLONE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "repository_cache"))
+CLONE_CACHE_MAX_BYTES: int = int(os.getenv("CLONE_CACHE_MAX_BYTES", str(5 * 1024 * 1024 * 1024)))  # 5 GB
+CLONE_CACHE_SWEEP_INTERVAL: int = 60  # In seconds
+CLONE_PIN_TIMEOUT: int = 60 * 60  # Seconds after which a reference held on a checkout is considered leaked
+
+RESULT_CACHE_MAX_BYTES: int = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))  # 256 MB
+RESULT_CACHE_DIR: str | None = os.getenv(  # On-disk tier, shared by the workers; disabled when unset with one worker
+    "RESULT_CACHE_DIR", os.path.join(SHARED_STATE_DIR, "results") if WORKERS > 1 else None
+)
+RESULT_CACHE_DISK_MAX_BYTES: int = int(os.getenv("RESULT_CACHE_DISK_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))  # 2 GB
+
+DIGEST_STORE_DIR: str = os.getenv("DIGEST_STORE_DIR", os.path.join(tempfile.gettempdir(), "digests"))
+DIGEST_STORE_SWEEP_INTERVAL: int = 60  # In seconds
+
+FRAGMENT_STORE_DIR: str = os.getenv("FRAGMENT_STORE_DIR", os.path.join(tempfile.gettempdir(), "fragments"))
+FRAGMENT_STORE_MAX_BYTES: int = int(os.getenv("FRAGMENT_STORE_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))  # 2 GB
+FRAGMENT_STORE_SWEEP_INTERVAL: int = 60  # In seconds
+
+JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", "4"))
+JOB_QUEUE_MAX_SIZE: int = int(os.getenv("JOB_QUEUE_MAX_SIZE", "100"))
+SSE_KEEPALIVE_INTERVAL: int = 15  # In seconds
+JOB_POLL_INTERVAL: float = 1.0  # Seconds between reads of the status of a job running in another worker
+JOB_PRUNE_INTERVAL: int = 60  # In seconds
+
+MAX_CONCURRENT_INGESTIONS: int = int(os.getenv("MAX_CONCURRENT_INGESTIONS", "8"))  # Clones and builds per worker
+MAX_WAITING_INGESTIONS: int = int(os.getenv("MAX_WAITING_INGESTIONS", "32"))  # Beyond this, requests get a 503
+ADMISSION_WAIT_TIMEOUT: int = int(os.getenv("ADMISSION_WAIT_TIMEOUT", "30"))  # In seconds
+ADMISSION_RETRY_AFTER: int = 10  # In seconds, sent in the Retry-After header of 503 responses
+
+PROCESS_POOL_WORKERS: int = int(  # Per server process, sharing the cores between them; 0 uses threads
+    os.getenv("PROCESS_POOL_WORKERS", str(max(1, (os.cpu_count() or 1) // WORKERS)))
+)
+INGESTION_TIMEOUT: int = int(os.getenv("INGESTION_TIMEOUT", "120"))  # In seconds
+READ_FROM_GIT_OBJECTS: bool = os.getenv("READ_FROM_GIT_OBJECTS", "1") != "0"  # Skip the checkout of repositories
+STREAM_CHUNK_SIZE: int = 64 * 1024  # Characters per chunk of a streamed digest
+
+LOG_FORMAT: str = os.getenv("LOG_FORMAT", "rich")  # "json" for one JSON object per line, "rich" for development
+LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+
+PROFILE_ADMIN_TOKEN: str | None = os.getenv("PROFILE_ADMIN_TOKEN")  # Enables profiling on demand and its endpoints
+PROFILE_SAMPLE_RATE: float = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))  # Share of queries profiled with cProfile
+PROFILE_SLOW_THRESHOLD: float | None = (  # Seconds beyond which a query's stack samples are kept; off when unset
+    float(os.environ["PROFILE_SLOW_THRESHOLD"]) if os.getenv("PROFILE_SLOW_THRESHOLD") else None
+)
+PROFILE_DIR: str = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "profiles"))
+PROFILE_MAX_COUNT: int = int(os.getenv("PROFILE_MAX_COUNT", "50"))  # Profiles kept on disk, oldest deleted first
+PROFILE_SAMPLE_INTERVAL: float = 0.01  # Seconds between two stack samples of a profiled digest build
 
 EXAMPLE_REPOS: list[dict[str, str]] = [
     {"name": "Gitingest", "url": "https://github.com/cyclotruc/gitingest"},
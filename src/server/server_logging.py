@@ -0,0 +1,187 @@
+""" Logging of the server, through a queue drained by a background thread, as JSON or as rich console output. """
+
+import copy
+import json
+import logging
+import queue
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from rich.logging import RichHandler
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from console import console
+from server.server_config import LOG_FORMAT, LOG_LEVEL
+
+REQUEST_ID_HEADER = "X-Request-ID"
+
+logger = logging.getLogger("server")
+
+_request_id: ContextVar[str | None] = ContextVar("request_id", default=None)
+
+# Attributes of every log record, so that the remaining ones are the fields passed through `extra`
+_RECORD_ATTRIBUTES = frozenset(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id"}
+
+
+def current_request_id() -> str | None:
+    """The identifier of the request being handled, or None outside of a request."""
+    return _request_id.get()
+
+
+def set_request_id(request_id: str | None) -> None:
+    """Attach the logs of the current task to a request, for work that outlives it such as background jobs."""
+    _request_id.set(request_id)
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp records with the identifier of the current request, while they are still in its context."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = _request_id.get()
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    Format records as one JSON object per line.
+
+    Every record has its time, level, logger, message and request ID, followed by the fields passed through
+    `extra`, such as durations and byte counts, and the traceback of the exception if there is one.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class LocalQueueHandler(QueueHandler):
+    """
+    Queue records for a listener in the same process, leaving their formatting to the listener's handler.
+
+    `QueueHandler` formats records before queuing them, so that they can be pickled, which merges the traceback
+    into the message and drops the exception: the JSON output would lose its `exception` field, and rich its
+    rendering of tracebacks. Within a process, records are passed as they are, with only their message resolved.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class LogPipeline:
+    """
+    Route the records of the `server` logger through a queue to a handler running in a background thread.
+
+    Logging from a request then costs a `Queue.put`: formatting records, and writing them to a terminal or a pipe,
+    never blocks the event loop. Records are written as JSON lines, or with rich for local development.
+
+    Parameters
+    ----------
+    fmt : str
+        `json` for machine-parseable output, or `rich` for the development console, by default `LOG_FORMAT`.
+    level : str
+        The minimum level of the records of the `server` logger, by default `LOG_LEVEL`.
+    """
+
+    def __init__(self, fmt: str = LOG_FORMAT, level: str = LOG_LEVEL) -> None:
+        self.fmt = fmt
+        self.level = level
+        self._handler: LocalQueueHandler | None = None
+        self._listener: QueueListener | None = None
+
+    def start(self) -> None:
+        """Attach the queue to the `server` logger and start the thread writing its records."""
+        if self.fmt == "json":
+            output: logging.Handler = logging.StreamHandler(sys.stdout)
+            output.setFormatter(JSONFormatter())
+        else:
+            output = RichHandler(console=console, show_path=False)
+
+        records: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+        self._handler = LocalQueueHandler(records)
+        self._handler.addFilter(RequestIdFilter())
+        self._listener = QueueListener(records, output, respect_handler_level=True)
+        self._listener.start()
+
+        logger.addHandler(self._handler)
+        logger.setLevel(self.level)
+        logger.propagate = False
+
+    def stop(self) -> None:
+        """Write the records still queued, then detach the queue and stop its thread."""
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+        if self._handler is not None:
+            logger.removeHandler(self._handler)
+            logger.propagate = True
+            self._handler = None
+
+
+class RequestLoggingMiddleware:
+    """
+    ASGI middleware giving every request an identifier, and logging it once its response is fully sent.
+
+    The identifier is taken from the `X-Request-ID` header of the request if there is one, attached to every log
+    record emitted while the request is handled, and returned in the `X-Request-ID` header of the response.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        request_id = headers.get(REQUEST_ID_HEADER.lower().encode(), b"").decode("latin-1")[:64] or uuid.uuid4().hex
+        token = _request_id.set(request_id)
+        status = 500
+        sent = 0
+        start = time.perf_counter()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status, sent
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = [*message.get("headers", []), (b"x-request-id", request_id.encode("latin-1"))]
+            elif message["type"] == "http.response.body":
+                sent += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            logger.info(
+                "%s %s %d",
+                scope["method"],
+                scope["path"],
+                status,
+                extra={
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status": status,
+                    "duration": round(time.perf_counter() - start, 4),
+                    "bytes": sent,
+                },
+            )
+            _request_id.reset(token)
+
+
+log_pipeline = LogPipeline()
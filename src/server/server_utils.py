@@ -1,15 +1,49 @@
 """ Utility functions for the server. """
 
+import asyncio
+import urllib.parse
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Request
-from fastapi.responses import Response
+from fastapi.responses import JSONResponse, Response
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 from slowapi.util import get_remote_address
 
-# Initialize a rate limiter
-limiter = Limiter(key_func=get_remote_address)
+from placeholder.patterns import PatternMatcher, PatternType
+from placeholder.tokens import token_counter
+from server.admission import AdmissionRejected, admission
+from server.clone_cache import clone_cache
+from server.digest_store import digest_store
+from server.fragment_cache import fragment_cache
+from server.jobs import job_queue
+from server.process_pool import process_pool
+from server.server_config import ADMISSION_RETRY_AFTER, RATE_LIMIT_STORAGE_TIMEOUT, RATE_LIMIT_STORAGE_URI
+from server.server_logging import log_pipeline, logger
+from server.shared_state import SharedStateStorage, state_purger
+
+
+def _limiter_storage_options(uri: str) -> dict[str, float]:
+    """
+    Options of the rate limit storage named by `uri`.
+
+    `slowapi` only drives the synchronous storages of `limits`, so every rate-limited request checks its limit on
+    the event loop. With `SharedStateStorage` that is one SQLite transaction, which is short unless another worker
+    holds the database lock: the wait for it is bounded by `RATE_LIMIT_STORAGE_TIMEOUT`, after which the check
+    fails and the limiter falls back to counting in the memory of the worker until the database answers again.
+    """
+    if urllib.parse.urlparse(uri).scheme in SharedStateStorage.STORAGE_SCHEME:
+        return {"timeout": RATE_LIMIT_STORAGE_TIMEOUT}
+    return {}
+
+
+# Initialize a rate limiter; with several workers its counters live in the shared state
+limiter = Limiter(
+    key_func=get_remote_address,
+    storage_uri=RATE_LIMIT_STORAGE_URI,
+    storage_options=_limiter_storage_options(RATE_LIMIT_STORAGE_URI),
+    in_memory_fallback_enabled=True,
+)
 
 
 async def rate_limit_exception_handler(request: Request, exc: Exception) -> Response:
@@ -40,6 +74,88 @@ async def rate_limit_exception_handler(request: Request, exc: Exception) -> Resp
     raise exc
 
 
+async def admission_rejected_handler(_: Request, exc: Exception) -> Response:
+    """
+    Exception handler turning a rejected ingestion into a fast `503` response.
+
+    Parameters
+    ----------
+    _ : Request
+        The incoming HTTP request (unused).
+    exc : Exception
+        The exception raised, expected to be AdmissionRejected.
+
+    Returns
+    -------
+    Response
+        A `503 Service Unavailable` response with a `Retry-After` header.
+
+    Raises
+    ------
+    exc
+        If the exception is not an AdmissionRejected error, it is re-raised.
+    """
+    if isinstance(exc, AdmissionRejected):
+        return _service_unavailable(str(exc), exc.retry_after)
+    raise exc
+
+
+async def enqueue_query(
+    input_text: str,
+    is_index: bool = False,
+    pattern_type: PatternType = PatternType.EXCLUDE,
+    pattern: str = "",
+    max_tokens: int | None = None,
+    profile: bool = False,
+) -> JSONResponse:
+    """
+    Submit a query to the background job queue and describe where to follow it.
+
+    Parameters
+    ----------
+    input_text : str
+        Input text provided by the user, typically a Git repository URL or slug.
+    is_index : bool
+        Flag indicating whether the request is for the index page (default is False).
+    pattern_type : PatternType
+        Whether `pattern` selects the files to include or the files to exclude.
+    pattern : str
+        Globs separated by commas or whitespace.
+    max_tokens : int | None
+        The token budget of the digest, unbounded if None.
+    profile : bool
+        Whether the query was explicitly asked to be profiled, by default False.
+
+    Returns
+    -------
+    JSONResponse
+        A `202 Accepted` response with the job ID and the URLs of its status, event stream and result, or a
+        `503 Service Unavailable` response if the queue is full.
+    """
+    try:
+        patterns = PatternMatcher.from_form(pattern_type, pattern)
+        job = await job_queue.submit(
+            input_text, is_index=is_index, patterns=patterns, max_tokens=max_tokens, profile=profile
+        )
+    except asyncio.QueueFull:
+        return _service_unavailable("Too many queries are queued, please try again later", ADMISSION_RETRY_AFTER)
+
+    return JSONResponse(
+        {
+            "job_id": job.id,
+            "status_url": f"/jobs/{job.id}",
+            "events_url": f"/jobs/{job.id}/events",
+            "result_url": f"/jobs/{job.id}/result",
+        },
+        status_code=202,
+    )
+
+
+def _service_unavailable(message: str, retry_after: int) -> JSONResponse:
+    """Build a `503 Service Unavailable` response asking the client to retry after `retry_after` seconds."""
+    return JSONResponse({"error": message}, status_code=503, headers={"Retry-After": str(retry_after)})
+
+
 @asynccontextmanager
 async def lifespan(_: FastAPI):
     """
@@ -55,5 +171,25 @@ async def lifespan(_: FastAPI):
     None
         Yields control back to the FastAPI application while the background task runs.
     """
+    log_pipeline.start()
+    # Load the tokenizer once, downloading its encoding if it is not bundled, before the pool workers need it
+    if not await asyncio.to_thread(token_counter.load):
+        logger.warning("Token counts will be estimated: tiktoken or its encoding is unavailable")
+    process_pool.start()
+    await admission.start()
+    await state_purger.start()
+    await clone_cache.start()
+    await digest_store.start()
+    await fragment_cache.start()
+    await job_queue.start()
 
     yield
+
+    await job_queue.stop()
+    await fragment_cache.stop()
+    await digest_store.stop()
+    await clone_cache.stop()
+    await state_purger.stop()
+    await admission.stop()
+    await process_pool.stop()
+    log_pipeline.stop()
@@ -0,0 +1,360 @@
+""" Counters and records shared by the worker processes of a deployment, behind pluggable backends. """
+
+import asyncio
+import sqlite3
+import threading
+import time
+import urllib.parse
+from abc import ABC, abstractmethod
+from contextlib import suppress
+from pathlib import Path
+
+from limits.storage import Storage
+
+from server.server_config import SHARED_STATE_PURGE_INTERVAL, SHARED_STATE_URI
+from server.server_logging import logger
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS state (
+    key TEXT PRIMARY KEY,
+    count INTEGER NOT NULL DEFAULT 0,
+    value TEXT,
+    expires_at REAL NOT NULL
+)
+"""
+
+
+class SharedState(ABC):
+    """
+    Expiring counters and records, visible to every worker process using the same backend.
+
+    Counters back the rate limits; records hold small JSON documents such as the status of background jobs, and
+    the leases taken on cached checkouts. Every key expires, so state left behind by a killed worker never
+    outlives its purpose.
+
+    Reads skip expired keys without deleting them; `purge` deletes them, and is run periodically by `StatePurger`.
+    The SQLite backend blocks on the database, so async code calls every method through `asyncio.to_thread`.
+    """
+
+    @abstractmethod
+    def incr(self, key: str, expiry: float, amount: int = 1) -> int:
+        """
+        Add to a counter, creating it with an expiry if it does not exist or has expired.
+
+        Parameters
+        ----------
+        key : str
+            The counter.
+        expiry : float
+            Seconds until a new counter expires; the expiry of an existing counter is left unchanged.
+        amount : int
+            The amount to add, which may be negative, by default 1.
+
+        Returns
+        -------
+        int
+            The new value of the counter.
+        """
+
+    @abstractmethod
+    def get(self, key: str) -> int:
+        """Read a counter, which is 0 if it does not exist or has expired."""
+
+    @abstractmethod
+    def get_expiry(self, key: str) -> float:
+        """Read the time at which a counter expires, which is now if it does not exist."""
+
+    @abstractmethod
+    def put(self, key: str, value: str, ttl: float) -> None:
+        """Store a record for `ttl` seconds, replacing any previous value."""
+
+    @abstractmethod
+    def fetch(self, key: str) -> str | None:
+        """Read a record, or None if it does not exist or has expired."""
+
+    @abstractmethod
+    def count(self, prefix: str) -> int:
+        """Count the counters and records that have not expired and whose key starts with `prefix`."""
+
+    @abstractmethod
+    def clear(self, key: str) -> None:
+        """Delete a counter or record."""
+
+    @abstractmethod
+    def reset(self) -> int:
+        """Delete every counter and record, returning how many there were."""
+
+    @abstractmethod
+    def purge(self) -> int:
+        """Delete the expired counters and records, returning how many there were."""
+
+
+class MemoryState(SharedState):
+    """State held in the memory of a single process, for deployments with a single worker."""
+
+    def __init__(self) -> None:
+        self._entries: dict[str, tuple[int, str | None, float]] = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key: str) -> tuple[int, str | None, float] | None:
+        """The entry of a key, or None if it has expired."""
+        entry = self._entries.get(key)
+        return entry if entry is not None and entry[2] > time.time() else None
+
+    def incr(self, key: str, expiry: float, amount: int = 1) -> int:
+        with self._lock:
+            entry = self._live(key)
+            count, value, expires_at = entry or (0, None, time.time() + expiry)
+            self._entries[key] = (count + amount, value, expires_at)
+            return count + amount
+
+    def get(self, key: str) -> int:
+        with self._lock:
+            entry = self._live(key)
+            return entry[0] if entry is not None else 0
+
+    def get_expiry(self, key: str) -> float:
+        with self._lock:
+            entry = self._live(key)
+            return entry[2] if entry is not None else time.time()
+
+    def put(self, key: str, value: str, ttl: float) -> None:
+        with self._lock:
+            self._entries[key] = (0, value, time.time() + ttl)
+
+    def fetch(self, key: str) -> str | None:
+        with self._lock:
+            entry = self._live(key)
+            return entry[1] if entry is not None else None
+
+    def count(self, prefix: str) -> int:
+        with self._lock:
+            return sum(1 for key in self._entries if key.startswith(prefix) and self._live(key) is not None)
+
+    def clear(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def reset(self) -> int:
+        with self._lock:
+            count = len(self._entries)
+            self._entries.clear()
+            return count
+
+    def purge(self) -> int:
+        with self._lock:
+            now = time.time()
+            expired = [key for key, (_, _, expires_at) in self._entries.items() if expires_at <= now]
+            for key in expired:
+                del self._entries[key]
+            return len(expired)
+
+
+class SQLiteState(SharedState):
+    """
+    State held in a SQLite database, shared by every process opening the same file.
+
+    The database uses write-ahead logging, so readers never block the writer, and each thread opens its own
+    connection. It works on any local file system, without an external service.
+
+    Parameters
+    ----------
+    path : str
+        The database file, created on first use along with its directory.
+    timeout : float
+        Seconds a call waits for another process to release the database lock before failing, by default 30.
+    """
+
+    def __init__(self, path: str, timeout: float = 30) -> None:
+        self.path = Path(path)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def __getstate__(self) -> dict:
+        # Connections cannot cross process boundaries; each process opens its own
+        return {"path": self.path, "timeout": self.timeout}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(str(state["path"]), state["timeout"])
+
+    def incr(self, key: str, expiry: float, amount: int = 1) -> int:
+        now = time.time()
+        with self._connection() as db:
+            return db.execute(
+                "INSERT INTO state (key, count, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET "
+                "count = CASE WHEN expires_at <= ? THEN excluded.count ELSE count + excluded.count END, "
+                "expires_at = CASE WHEN expires_at <= ? THEN excluded.expires_at ELSE expires_at END "
+                "RETURNING count",
+                (key, amount, now + expiry, now, now),
+            ).fetchone()[0]
+
+    def get(self, key: str) -> int:
+        row = self._live(key, "count")
+        return row if row is not None else 0
+
+    def get_expiry(self, key: str) -> float:
+        row = self._live(key, "expires_at")
+        return row if row is not None else time.time()
+
+    def put(self, key: str, value: str, ttl: float) -> None:
+        with self._connection() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO state (key, count, value, expires_at) VALUES (?, 0, ?, ?)",
+                (key, value, time.time() + ttl),
+            )
+
+    def fetch(self, key: str) -> str | None:
+        return self._live(key, "value")
+
+    def count(self, prefix: str) -> int:
+        with self._connection() as db:
+            return db.execute(
+                # Keys compare as UTF-8 bytes, so the range holds every key starting with the prefix
+                "SELECT COUNT(*) FROM state WHERE key >= ? AND key < ? AND expires_at > ?",
+                (prefix, f"{prefix}\U0010ffff", time.time()),
+            ).fetchone()[0]
+
+    def clear(self, key: str) -> None:
+        with self._connection() as db:
+            db.execute("DELETE FROM state WHERE key = ?", (key,))
+
+    def reset(self) -> int:
+        with self._connection() as db:
+            return db.execute("DELETE FROM state").rowcount
+
+    def purge(self) -> int:
+        with self._connection() as db:
+            return db.execute("DELETE FROM state WHERE expires_at <= ?", (time.time(),)).rowcount
+
+    def _live(self, key: str, column: str) -> int | float | str | None:
+        """Read a column of a key that has not expired."""
+        with self._connection() as db:
+            row = db.execute(
+                f"SELECT {column} FROM state WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        return row[0] if row is not None else None
+
+    def _connection(self) -> sqlite3.Connection:
+        """The database connection of the calling thread, opened on first use."""
+        db = getattr(self._local, "db", None)
+        if db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=self.timeout)
+            db.execute("PRAGMA journal_mode = WAL")
+            db.execute("PRAGMA synchronous = NORMAL")
+            db.execute(_SCHEMA)
+            self._local.db = db
+        return db
+
+
+class SharedStateStorage(Storage):
+    """
+    Storage backend of the `limits` library, and thus of `slowapi`, keeping rate limit counters in `SQLiteState`.
+
+    Defining the class registers the `sqlite://` scheme, so `Limiter(storage_uri="sqlite:///path/to/db")` shares
+    its counters between the workers. The `timeout` storage option bounds the wait for the database lock, since
+    `slowapi` checks the limits on the event loop.
+    """
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri: str | None = None, wrap_exceptions: bool = False, **options: float | str | bool) -> None:
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self.state = state_from_uri(uri, timeout=float(options.get("timeout", 30)))
+
+    @property
+    def base_exceptions(self) -> type[Exception]:
+        return sqlite3.Error
+
+    def incr(self, key: str, expiry: int, amount: int = 1) -> int:
+        return self.state.incr(key, expiry, amount)
+
+    def get(self, key: str) -> int:
+        return self.state.get(key)
+
+    def get_expiry(self, key: str) -> float:
+        return self.state.get_expiry(key)
+
+    def check(self) -> bool:
+        try:
+            self.state.get("check")
+        except sqlite3.Error:
+            return False
+        return True
+
+    def reset(self) -> int | None:
+        return self.state.reset()
+
+    def clear(self, key: str) -> None:
+        self.state.clear(key)
+
+
+def state_from_uri(uri: str, timeout: float = 30) -> SharedState:
+    """
+    Create the backend named by a URI.
+
+    Parameters
+    ----------
+    uri : str
+        `memory://` for state private to the process, or `sqlite:///path/to/db` for state shared through a
+        database file.
+    timeout : float
+        Seconds the SQLite backend waits for the database lock, by default 30.
+
+    Returns
+    -------
+    SharedState
+        The backend.
+
+    Raises
+    ------
+    ValueError
+        If the scheme of the URI is not supported.
+    """
+    parsed = urllib.parse.urlparse(uri)
+    if parsed.scheme == "memory":
+        return MemoryState()
+    if parsed.scheme == "sqlite":
+        return SQLiteState(
+            parsed.path[1:], timeout
+        )  # As in SQLAlchemy, sqlite:///relative/path and sqlite:////absolute/path
+    raise ValueError(f"Unsupported shared state URI: {uri}")
+
+
+class StatePurger:
+    """Background deletion of the expired counters and records of a shared state."""
+
+    def __init__(self, state: SharedState, purge_interval: int = SHARED_STATE_PURGE_INTERVAL) -> None:
+        self.state = state
+        self.purge_interval = purge_interval
+        self._purger: asyncio.Task | None = None
+
+    async def purge(self) -> None:
+        """Delete the expired counters and records."""
+        await asyncio.to_thread(self.state.purge)
+
+    async def _purge_forever(self) -> None:
+        """Run `purge` every `purge_interval` seconds, logging failures so that one of them never stops the purge."""
+        while True:
+            await asyncio.sleep(self.purge_interval)
+            try:
+                await self.purge()
+            except Exception:
+                logger.exception("Purge of the shared state failed")
+
+    async def start(self) -> None:
+        """Start the background purge."""
+        self._purger = asyncio.create_task(self._purge_forever())
+
+    async def stop(self) -> None:
+        """Stop the background purge."""
+        if self._purger is not None:
+            self._purger.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._purger
+            self._purger = None
+
+
+shared_state = state_from_uri(SHARED_STATE_URI)
+state_purger = StatePurger(shared_state)
@@ -56,11 +56,26 @@ function handleSubmit(event, showLoading = false) {
         submitButton.classList.add('bg-[#F678A7]');
     }
 
-    // Submit the form
+    const showProgress = (progress) => {
+        const label = submitButton.querySelector('span');
+        if (showLoading && label && progress) {
+            label.textContent = `${progress}...`;
+        }
+    };
+
+    // Submit the form as a background job, wait for it to finish, then fetch the rendered result
     fetch(form.action, {
         method: 'POST',
         body: formData
     })
+        .then(response => response.json())
+        .then(job => {
+            if (!job.job_id) {
+                throw new Error(job.error || 'Failed to submit the query');
+            }
+            return waitForJob(job, showProgress);
+        })
+        .then(job => fetch(job.result_url))
         .then(response => response.text())
         .then(html => {
             // Store the star count before updating the DOM
@@ -90,6 +105,57 @@ function handleSubmit(event, showLoading = false) {
         });
 }
 
+function isJobFinished(status) {
+    return status.status === 'done' || status.status === 'failed';
+}
+
+// Follow a job through its Server-Sent Events stream, falling back to polling its status
+function waitForJob(job, onProgress) {
+    if (!window.EventSource) {
+        return pollJob(job, onProgress);
+    }
+
+    return new Promise((resolve, reject) => {
+        const source = new EventSource(job.events_url);
+        source.onmessage = (event) => {
+            const status = JSON.parse(event.data);
+            onProgress(status.progress);
+            if (isJobFinished(status)) {
+                source.close();
+                resolve(job);
+            }
+        };
+        source.onerror = () => {
+            source.close();
+            pollJob(job, onProgress).then(resolve, reject);
+        };
+    });
+}
+
+function pollJob(job, onProgress, interval = 1000) {
+    return new Promise((resolve, reject) => {
+        const check = () => {
+            fetch(job.status_url)
+                .then(response => {
+                    if (!response.ok) {
+                        throw new Error(`Job status request failed: ${response.status}`);
+                    }
+                    return response.json();
+                })
+                .then(status => {
+                    onProgress(status.progress);
+                    if (isJobFinished(status)) {
+                        resolve(job);
+                    } else {
+                        setTimeout(check, interval);
+                    }
+                })
+                .catch(reject);
+        };
+        check();
+    });
+}
+
 function copyFullDigest() {
     const directoryStructure = document.querySelector('.directory-structure').value;
     const filesContent = document.querySelector('.result-text').value;
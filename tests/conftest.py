@@ -1,8 +1,53 @@
 """ This module contains fixtures for the tests. """
 
+import subprocess
+from collections.abc import Callable
+from pathlib import Path
+
 import pytest
 
 
 @pytest.fixture
 def example_fixture() -> None:
     return None
+
+
+def _git(*args: str, cwd: Path) -> str:
+    return subprocess.run(
+        ["git", "-c", "user.name=test", "-c", "user.email=test@example.com", *args],
+        cwd=cwd,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout.strip()
+
+
+@pytest.fixture(name="git_repository")
+def git_repository_fixture(tmp_path: Path) -> Path:
+    """A local repository with a single commit, cloneable through `file://`."""
+    repository = tmp_path / "repository"
+    (repository / "src").mkdir(parents=True)
+    (repository / "README.md").write_text("# Repository\n")
+    (repository / "src" / "app.py").write_text("print('hello')\n")
+    _git("init", "--quiet", "--initial-branch=main", cwd=repository)
+    _git("add", ".", cwd=repository)
+    _git("commit", "--quiet", "-m", "Initial commit", cwd=repository)
+    return repository
+
+
+@pytest.fixture(name="git")
+def git_fixture() -> Callable[..., str]:
+    """Run a git command in the directory given as `cwd`, returning its output."""
+    return _git
+
+
+@pytest.fixture(name="large_blob_repository")
+def large_blob_repository_fixture(git_repository: Path) -> Path:
+    """`git_repository` with a second commit adding a directory and a blob of 4 kB, serving filtered fetches."""
+    (git_repository / "docs").mkdir()
+    (git_repository / "docs" / "guide.md").write_text("guide\n")
+    (git_repository / "large.bin").write_bytes(b"x" * 4096)
+    _git("add", ".", cwd=git_repository)
+    _git("commit", "--quiet", "-m", "Second", cwd=git_repository)
+    _git("config", "uploadpack.allowFilter", "true", cwd=git_repository)
+    return git_repository
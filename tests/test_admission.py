@@ -0,0 +1,50 @@
+""" Tests for admission control. """
+
+import asyncio
+
+import pytest
+
+from server.admission import AdmissionController, AdmissionRejected
+from server.server_utils import admission_rejected_handler
+
+
+@pytest.fixture(name="controller")
+async def controller_fixture() -> AdmissionController:
+    controller = AdmissionController(max_concurrency=1, max_waiting=1, wait_timeout=0.1, retry_after=7)
+    await controller.start()
+    return controller
+
+
+async def test_waiting_ingestion_gets_slot_once_released(controller: AdmissionController):
+    release = await controller.acquire()
+    waiter = asyncio.create_task(controller.acquire())
+    await asyncio.sleep(0)
+    assert (controller.stats.running, controller.stats.waiting) == (1, 1)
+
+    release()
+    release()  # Releasing twice gives back a single slot
+    (await waiter)()
+
+    assert (controller.stats.running, controller.stats.waiting) == (0, 0)
+    assert not controller._semaphore.locked()
+
+
+async def test_full_wait_queue_rejects_at_once(controller: AdmissionController):
+    await controller.acquire()
+    waiter = asyncio.create_task(controller.acquire())
+    await asyncio.sleep(0)
+
+    with pytest.raises(AdmissionRejected) as exc_info:
+        await asyncio.wait_for(controller.acquire(), timeout=0.01)
+    assert exc_info.value.retry_after == 7
+
+    with pytest.raises(AdmissionRejected):
+        await waiter  # No slot was freed within the wait timeout
+    assert controller.stats.rejected == 2
+
+
+async def test_rejection_is_a_503_with_retry_after():
+    response = await admission_rejected_handler(None, AdmissionRejected(7))
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "7"
@@ -0,0 +1,57 @@
+""" Tests for the selection of files within a token budget. """
+
+from pathlib import Path
+
+import pytest
+
+from placeholder import budget, formatter
+from placeholder.budget import rank_files, select_within_budget
+from placeholder.ingestion import FileEntry, IngestionLimits, IngestionStats
+from placeholder.main import build_digest
+from placeholder.tokens import estimate_tokens
+
+
+def _entry(path: str, size: int) -> FileEntry:
+    return FileEntry(path=path, abs_path="", size=size, depth=path.count("/"))
+
+
+def test_readmes_and_entry_points_rank_first():
+    entries = [_entry("a.py", 10), _entry("src/main.py", 500), _entry("docs/README.md", 900), _entry("README", 900)]
+
+    assert [entry.path for entry in rank_files(entries)] == ["README", "docs/README.md", "src/main.py", "a.py"]
+
+
+def test_selection_skips_files_that_do_not_fit_and_keeps_walk_order():
+    entries = [_entry("b.py", 40), _entry("README.md", 40), _entry("big.py", 400), _entry("c.py", 20)]
+    stats = IngestionStats(files=4, total_size=500)
+    summary = estimate_tokens(budget._header_size(""))
+
+    # With their section headers and tree lines, README.md costs 44 tokens, c.py 37 and b.py 42
+    selected = select_within_budget(entries, summary + 44 + 37 + 41, stats)
+
+    assert [entry.path for entry in selected] == ["README.md", "c.py"], "b.py no longer fits"
+    assert (stats.files, stats.total_size, stats.limit_reached) == (2, 60, "max_tokens")
+
+
+def test_files_over_budget_are_never_read(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    (tmp_path / "README.md").write_text("# Project\n")
+    (tmp_path / "large.txt").write_text("x" * 4000)
+    read = []
+    original = formatter.read_file_content
+    monkeypatch.setattr("placeholder.main.read_file_content", lambda entry: read.append(entry.path) or original(entry))
+
+    digest = build_digest(str(tmp_path), limits=IngestionLimits(max_tokens=200))
+
+    assert read == ["README.md"]
+    assert "Truncated: max_tokens limit reached" in digest.summary
+
+
+def test_digest_text_stays_within_budget(tmp_path: Path):
+    for i in range(300):
+        (tmp_path / f"pkg{i // 30}" / f"module{i}.py").parent.mkdir(exist_ok=True)
+        (tmp_path / f"pkg{i // 30}" / f"module{i}.py").write_text(f"x = {i}\n")
+
+    digest = build_digest(str(tmp_path), limits=IngestionLimits(max_tokens=1000))
+
+    assert 0 < len(digest.files) < 300
+    assert estimate_tokens(len(digest.text.encode())) <= 1000
@@ -0,0 +1,49 @@
+""" Tests for shallow, partial and sparse cloning. """
+
+from collections.abc import Callable
+from pathlib import Path
+
+import pytest
+
+from placeholder.clone import CloneConfig, clone_repo, resolve_commit
+
+
+@pytest.fixture(name="bare_repository")
+def bare_repository_fixture(large_blob_repository: Path, tmp_path: Path, git: Callable[..., str]) -> str:
+    bare = tmp_path / "repository.git"
+    git("clone", "--quiet", "--bare", str(large_blob_repository), str(bare), cwd=tmp_path)
+    git("config", "uploadpack.allowFilter", "true", cwd=bare)
+    return f"file://{bare}"
+
+
+async def test_shallow_clone_fetches_only_tip_commit(bare_repository: str, tmp_path: Path, git: Callable[..., str]):
+    dest = tmp_path / "clone"
+    commit = await resolve_commit(bare_repository)
+
+    await clone_repo(bare_repository, str(dest), commit, CloneConfig(blob_limit=None))
+
+    assert git("rev-parse", "HEAD", cwd=dest) == commit
+    assert git("rev-list", "--count", "HEAD", cwd=dest) == "1"
+    assert (dest / "large.bin").exists()
+
+
+async def test_partial_clone_skips_large_blobs(bare_repository: str, tmp_path: Path, git: Callable[..., str]):
+    dest = tmp_path / "clone"
+    commit = await resolve_commit(bare_repository)
+
+    await clone_repo(bare_repository, str(dest), commit, CloneConfig(blob_limit=1024))
+
+    assert (dest / "README.md").read_text() == "# Repository\n"
+    assert not (dest / "large.bin").exists()
+    assert "?" in git("rev-list", "--objects", "--missing=print", "HEAD", cwd=dest)
+
+
+async def test_sparse_clone_checks_out_matching_paths(bare_repository: str, tmp_path: Path):
+    dest = tmp_path / "clone"
+    commit = await resolve_commit(bare_repository)
+
+    await clone_repo(bare_repository, str(dest), commit, CloneConfig(sparse_patterns=["/docs/"]))
+
+    assert (dest / "docs" / "guide.md").exists()
+    assert not (dest / "README.md").exists()
+    assert not (dest / "src").exists()
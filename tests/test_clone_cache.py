@@ -0,0 +1,125 @@
+""" Tests for repository URL handling and the on-disk clone cache. """
+
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from placeholder.clone import normalize_repo_url
+from placeholder.exceptions import InvalidRepositoryURLError
+from server import clone_cache
+from server.clone_cache import CloneCache
+
+
+@pytest.mark.parametrize(
+    "source",
+    [
+        "tiangolo/fastapi",
+        "github.com/tiangolo/fastapi",
+        "https://GitHub.com/tiangolo/fastapi/",
+        "https://github.com/tiangolo/fastapi.git",
+    ],
+)
+def test_normalize_repo_url(source: str):
+    assert normalize_repo_url(source) == "https://github.com/tiangolo/fastapi"
+
+
+@pytest.mark.parametrize("source", ["file:///etc", "ftp://example.com/a/b", "https://github.com/"])
+def test_normalize_repo_url_rejects_invalid_sources(source: str):
+    with pytest.raises(InvalidRepositoryURLError):
+        normalize_repo_url(source)
+
+
+async def test_checkout_reuses_cached_clone(git_repository: Path, tmp_path: Path):
+    cache = CloneCache(str(tmp_path / "cache"))
+    url = f"file://{git_repository}"
+
+    async with cache.checkout(url) as first:
+        assert (first / "README.md").read_text() == "# Repository\n"
+    (first / "marker").write_text("")
+
+    async with cache.checkout(url) as second:
+        assert second == first
+        assert (second / "marker").exists()
+    assert len(cache.entries) == 1
+
+
+async def test_sweep_evicts_expired_entries(git_repository: Path, tmp_path: Path):
+    cache = CloneCache(str(tmp_path / "cache"), max_age=-1)
+
+    async with cache.checkout(f"file://{git_repository}") as path:
+        await cache.sweep()
+        assert path.exists(), "entries in use must not be evicted"
+
+    await cache.sweep()
+    assert not path.exists()
+    assert not cache.entries
+
+
+async def test_byte_budget_evicts_least_recently_used(git_repository: Path, tmp_path: Path):
+    cache = CloneCache(str(tmp_path / "cache"), max_bytes=0)
+
+    async with cache.checkout(f"file://{git_repository}") as path:
+        assert path.exists()
+
+    assert not path.exists()
+    assert cache.total_size == 0
+
+
+async def test_checkout_cloned_by_another_process_is_adopted(git_repository: Path, tmp_path: Path):
+    first = CloneCache(str(tmp_path / "cache"))
+    second = CloneCache(str(tmp_path / "cache"), max_bytes=0)
+    url = f"file://{git_repository}"
+
+    async with first.checkout(url) as path:
+        (path / "marker").write_text("")
+        async with second.checkout(url) as adopted:
+            assert adopted == path
+            assert (adopted / "marker").exists(), "the checkout must not be cloned again"
+        assert path.exists(), "a checkout read by another process must not be evicted"
+
+
+async def test_locks_are_dropped_once_released(git_repository: Path, tmp_path: Path):
+    cache = CloneCache(str(tmp_path / "cache"))
+
+    async with cache.checkout(f"file://{git_repository}"):
+        pass
+
+    assert not cache._locks.locks
+
+
+async def test_sweeper_survives_failed_sweeps(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    cache = CloneCache(str(tmp_path / "cache"), sweep_interval=0)
+    sweeps = 0
+
+    async def failing_sweep() -> None:
+        nonlocal sweeps
+        sweeps += 1
+        raise OSError("disk error")
+
+    await cache.start()
+    monkeypatch.setattr(cache, "sweep", failing_sweep)
+    while sweeps < 3:
+        await asyncio.sleep(0.01)
+    await cache.stop()
+
+
+async def test_leases_outliving_the_pin_timeout_block_eviction(
+    git_repository: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(clone_cache, "CLONE_PIN_TIMEOUT", 0.5)
+    first = CloneCache(str(tmp_path / "cache"))
+    second = CloneCache(str(tmp_path / "cache"), max_bytes=0)
+    url = f"file://{git_repository}"
+
+    async with first.checkout(url) as path:
+        await asyncio.sleep(0.3)
+        await first.sweep()
+        await asyncio.sleep(0.3)
+        async with second.checkout(url):
+            pass
+        assert path.exists(), "the lease is refreshed while the checkout is read"
+
+    async with second.checkout(url):
+        pass
+    assert not path.exists(), "the checkout is evicted once released"
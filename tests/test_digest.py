@@ -0,0 +1,47 @@
+""" Tests for the structured digest. """
+
+import pickle
+
+from placeholder.digest import Digest, DigestFile
+from placeholder.formatter import format_file
+
+
+def _digest() -> Digest:
+    files = [DigestFile("README.md", 6, 0, 6, tokens=2), DigestFile("src/app.py", 8, 6, 7, tokens=3)]
+    return Digest(summary="Source: test\n", tree="└── test/", files=files, content="# Testx = 1\n\n")
+
+
+def test_files_are_sliced_out_of_the_content_buffer():
+    digest = _digest()
+
+    assert digest.read(digest.find("README.md")) == "# Test"
+    assert digest.read(digest.find("src/app.py")) == "x = 1\n\n"
+    assert digest.find("missing") is None
+    assert digest.tokens == 5
+
+
+def test_text_is_rendered_from_the_structure():
+    digest = _digest()
+
+    assert digest.text == (
+        "Source: test\n\nDirectory structure:\n└── test/\n\n"
+        + format_file("README.md", "# Test")
+        + format_file("src/app.py", "x = 1\n\n")
+    )
+    assert "".join(digest.iter_text()) == str(digest)
+
+
+def test_digest_survives_pickling():
+    digest = _digest()
+
+    assert pickle.loads(pickle.dumps(digest)) == digest
+
+
+def test_rendered_digest_keeps_the_text_and_statistics():
+    digest = _digest()
+
+    rendered = digest.render()
+
+    assert rendered.text == digest.text
+    assert (rendered.files, rendered.size, rendered.limit_reached) == (2, 14, None)
+    assert "format" in rendered.timings
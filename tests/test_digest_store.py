@@ -0,0 +1,125 @@
+""" Tests for the digest store and its download endpoint. """
+
+import gzip
+import json
+import os
+from pathlib import Path
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from server.digest_store import DigestStore, digest_store
+from server.routers.digest import _etag_matches, _negotiate_encoding, router
+
+
+async def test_save_and_get_text(tmp_path: Path):
+    store = DigestStore(str(tmp_path))
+    await store.save("abc123", "digest content", {"source": "https://github.com/a/b"})
+
+    path = await store.get_file("abc123", "txt")
+
+    assert path is not None
+    assert path.read_text() == "digest content"
+    assert await store.get_file("missing", "txt") is None
+    assert await store.get_file("abc123", "xml") is None
+    assert await store.get_file("../abc123", "txt") is None
+
+
+async def test_json_representation_includes_metadata(tmp_path: Path):
+    store = DigestStore(str(tmp_path))
+    content = 'line "one"\nline\ttwo é'
+    await store.save("abc123", content, {"source": "https://github.com/a/b"})
+
+    path = await store.get_file("abc123", "json")
+
+    assert json.loads(path.read_text()) == {"id": "abc123", "source": "https://github.com/a/b", "content": content}
+
+
+async def test_gzip_variant_is_cached(tmp_path: Path):
+    store = DigestStore(str(tmp_path))
+    await store.save("abc123", "digest content", {})
+
+    path = await store.get_file("abc123", "txt", "gzip")
+
+    assert path.name == "abc123.txt.gzip"
+    assert gzip.decompress(path.read_bytes()) == b"digest content"
+    mtime = path.stat().st_mtime_ns
+    assert (await store.get_file("abc123", "txt", "gzip")).stat().st_mtime_ns == mtime
+
+
+async def test_sweep_removes_all_files_of_expired_digests(tmp_path: Path):
+    store = DigestStore(str(tmp_path), max_age=60)
+    await store.save("old", "old digest", {})
+    await store.save("new", "new digest", {})
+    await store.get_file("old", "json", "gzip")
+    os.utime(tmp_path / "old.txt", (0, 0))
+
+    await store.sweep()
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["new.meta", "new.txt"]
+
+
+def test_negotiate_encoding():
+    assert _negotiate_encoding("") is None
+    assert _negotiate_encoding("gzip, deflate") == "gzip"
+    assert _negotiate_encoding("gzip;q=0") is None
+    assert _negotiate_encoding("*") is not None
+    assert _negotiate_encoding("identity") is None
+
+
+def test_etag_matches():
+    assert _etag_matches('"a", W/"b"', '"b"')
+    assert _etag_matches("*", '"a"')
+    assert not _etag_matches('"a"', '"b"')
+    assert not _etag_matches(None, '"a"')
+
+
+async def test_writer_publishes_digest_on_commit_only(tmp_path: Path):
+    store = DigestStore(str(tmp_path))
+
+    writer = store.open_writer("abc123", {})
+    writer.write("first ")
+    assert not store.exists("abc123")
+    writer.write("second")
+    writer.commit()
+    assert (await store.get_file("abc123", "txt")).read_text() == "first second"
+
+    writer = store.open_writer("def456", {})
+    writer.write("partial")
+    writer.discard()
+    assert not store.exists("def456")
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["abc123.meta", "abc123.txt"]
+
+
+@pytest.fixture(name="client")
+def client_fixture(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> TestClient:
+    monkeypatch.setattr(digest_store, "directory", tmp_path)
+    digest_store._save("abc123", "0123456789", {})
+    app = FastAPI()
+    app.include_router(router)
+    return TestClient(app)
+
+
+def test_download_serves_ranges_and_revalidates_by_etag(client: TestClient):
+    identity = {"Accept-Encoding": "identity"}
+
+    response = client.get("/api/digest/abc123.txt", headers={**identity, "Range": "bytes=2-5"})
+    assert response.status_code == 206
+    assert response.content == b"2345"
+    assert response.headers["content-range"] == "bytes 2-5/10"
+
+    etag = response.headers["etag"]
+    response = client.get("/api/digest/abc123.txt", headers={**identity, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert not response.content
+    assert client.get("/api/digest/abc123.txt", headers={"If-None-Match": etag}).status_code == 200, "gzip variant"
+
+
+def test_download_answers_head_requests(client: TestClient):
+    response = client.head("/api/digest/abc123.txt", headers={"Accept-Encoding": "identity"})
+
+    assert response.status_code == 200
+    assert response.headers["content-length"] == "10"
+    assert not response.content
+    assert client.head("/api/digest/missing.txt").status_code == 404
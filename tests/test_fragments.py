@@ -0,0 +1,84 @@
+""" Tests for the content-addressed fragment store. """
+
+import os
+import pickle
+from pathlib import Path
+
+from placeholder import fragments
+from placeholder.fragments import FragmentStore
+
+BLOB_A = "a" * 40
+BLOB_B = "b" * 40
+BLOB_C = "c" * 40
+
+
+def test_fragments_are_keyed_by_blob_and_kind(tmp_path: Path):
+    store = FragmentStore(str(tmp_path))
+    store.put(BLOB_A, "text of a")
+    store.put(BLOB_A, "3", kind="tokens")
+
+    assert store.get(BLOB_A) == "text of a"
+    assert store.get(BLOB_A, kind="tokens") == "3"
+    assert store.get(BLOB_B) is None
+
+
+def test_eviction_skips_referenced_fragments(tmp_path: Path):
+    store = FragmentStore(str(tmp_path), max_bytes=10)
+    store.put(BLOB_A, "a" * 10)
+    store.put(BLOB_B, "b" * 10)
+    store.put(BLOB_C, "c" * 10)
+    store.release([BLOB_A, BLOB_C])
+
+    assert store.evict() == 20
+    assert store.get(BLOB_A) is None
+    assert store.get(BLOB_C) is None
+    assert store.get(BLOB_B) == "b" * 10, "still referenced by a build"
+
+
+def test_eviction_removes_least_recently_used_first(tmp_path: Path):
+    store = FragmentStore(str(tmp_path), max_bytes=10)
+    store.put(BLOB_A, "a" * 10)
+    store.put(BLOB_B, "b" * 10)
+    store.get(BLOB_A)
+    store.release([BLOB_A, BLOB_A, BLOB_B])
+
+    store.evict()
+
+    assert store.get(BLOB_A) == "a" * 10
+    assert not store.path(BLOB_B).exists()
+
+
+def test_batches_take_one_reference_per_listed_blob_in_one_transaction(tmp_path: Path):
+    store = FragmentStore(str(tmp_path), max_bytes=0)
+    store.put_many([(BLOB_A, "a" * 10), (BLOB_B, "b" * 10)])
+    store.release([BLOB_A, BLOB_B])
+    statements: list[str] = []
+    store._connection().set_trace_callback(statements.append)
+
+    assert store.get_many([BLOB_A, BLOB_A, BLOB_C]) == {BLOB_A: "a" * 10}
+    assert statements.count("BEGIN ") == 1
+
+    store.release([BLOB_A])
+    store.evict()
+    assert store.get(BLOB_B) is None
+    assert store.get(BLOB_A) == "a" * 10, "still referenced once"
+
+
+def test_leaked_references_expire(tmp_path: Path, monkeypatch):
+    store = FragmentStore(str(tmp_path), max_bytes=0)
+    store.put(BLOB_A, "a")
+    monkeypatch.setattr(fragments, "FRAGMENT_PIN_TIMEOUT", -1)
+
+    assert store.evict() == 1
+
+
+def test_store_is_shared_through_pickling(tmp_path: Path):
+    store = FragmentStore(str(tmp_path))
+    store.put(BLOB_A, "shared")
+    store.get(BLOB_A)  # Opens the connection of this thread, which must not be pickled
+
+    copy = pickle.loads(pickle.dumps(store))
+
+    assert copy.get(BLOB_A) == "shared"
+    copy.reset_references()
+    assert sorted(os.listdir(tmp_path / "aa")) == [f"{'a' * 38}.text"]
@@ -0,0 +1,91 @@
+""" Tests for ingestion straight from the git object database. """
+
+from collections.abc import Callable
+from pathlib import Path
+
+import pytest
+
+from placeholder import main
+from placeholder.clone import CloneConfig, clone_repo, resolve_commit
+from placeholder.fragments import FragmentStore
+from placeholder.git_objects import GitObjectReader, list_blobs, walk_tree
+from placeholder.ingestion import IngestionLimits, IngestionStats
+from placeholder.main import build_digest
+from placeholder.patterns import PatternMatcher
+
+
+@pytest.fixture(name="objects")
+async def objects_fixture(large_blob_repository: Path, tmp_path: Path) -> tuple[Path, str]:
+    """A bare partial clone, without checkout, of a repository with a blob over the fetch's size limit."""
+    url = f"file://{large_blob_repository}"
+    commit = await resolve_commit(url)
+    dest = tmp_path / "objects"
+    await clone_repo(url, str(dest), commit, CloneConfig(blob_limit=1024, checkout=False))
+    return dest, commit
+
+
+async def test_clone_without_checkout_creates_bare_repository(objects: tuple[Path, str], git: Callable[..., str]):
+    repository, _ = objects
+
+    assert git("rev-parse", "--is-bare-repository", cwd=repository) == "true"
+    assert not (repository / "README.md").exists()
+
+
+def test_walk_tree_lists_files_in_walk_order_with_sizes(objects: tuple[Path, str], git: Callable[..., str]):
+    repository, commit = objects
+    stats = IngestionStats()
+
+    entries = list(walk_tree(str(repository), commit, stats=stats))
+
+    assert [entry.path for entry in entries] == ["README.md", "docs/guide.md", "src/app.py"]
+    assert [entry.size for entry in entries] == [13, 6, 15]
+    assert stats.skipped_files == 1, "large.bin was filtered out of the fetch"
+    assert "?" in git("rev-list", "--objects", "--missing=print", commit, cwd=repository), "never fetched lazily"
+
+
+def test_walk_tree_enforces_limits_and_patterns(objects: tuple[Path, str]):
+    repository, commit = objects
+
+    excluded = walk_tree(str(repository), commit, patterns=PatternMatcher(exclude=["docs"]))
+    limited = walk_tree(str(repository), commit, limits=IngestionLimits(max_directory_depth=0))
+
+    assert [entry.path for entry in excluded] == ["README.md", "src/app.py"]
+    assert [entry.path for entry in limited] == ["README.md"]
+
+
+def test_object_reader_reads_blobs_through_one_process(objects: tuple[Path, str]):
+    repository, commit = objects
+    blobs = dict(list_blobs(str(repository), commit))
+
+    with GitObjectReader(str(repository)) as reader:
+        assert reader.read(blobs["README.md"]) == b"# Repository\n"
+        assert reader.read(blobs["src/app.py"]) == b"print('hello')\n"
+
+
+def test_build_digest_from_objects_matches_checkout(
+    objects: tuple[Path, str], git_repository: Path, git: Callable[..., str]
+):
+    repository, commit = objects
+    limits = IngestionLimits(max_file_size=1024)
+    git("checkout", "--quiet", commit, cwd=git_repository)
+
+    from_objects = build_digest(str(repository), limits=limits, name="repository", commit=commit)
+    from_checkout = build_digest(str(git_repository), limits=limits, name="repository")
+
+    assert from_objects == from_checkout
+
+
+def test_unchanged_blobs_are_reassembled_from_fragments(
+    objects: tuple[Path, str], tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    repository, commit = objects
+    fragments = FragmentStore(str(tmp_path / "fragments"))
+    first = build_digest(str(repository), commit=commit, fragments=fragments)
+    blobs = dict(list_blobs(str(repository), commit))
+    assert fragments.get(blobs["README.md"]) == "# Repository\n"
+
+    def fail(repository: str) -> GitObjectReader:
+        raise AssertionError("no blob should be read")
+
+    monkeypatch.setattr(main, "GitObjectReader", fail)
+    assert build_digest(str(repository), commit=commit, fragments=fragments) == first
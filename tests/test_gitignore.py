@@ -0,0 +1,73 @@
+""" Tests for the gitignore-aware directory walk. """
+
+from pathlib import Path
+
+import pytest
+
+from placeholder import gitignore, ingestion
+from placeholder.gitignore import IgnoreRules, parse_rule
+from placeholder.ingestion import walk_directory
+
+
+@pytest.fixture
+def ignored_tree(tmp_path: Path) -> Path:
+    (tmp_path / ".gitignore").write_text("# build output\nbuild/\n*.log\n!keep.log\n")
+    (tmp_path / "app.log").write_text("noise\n")
+    (tmp_path / "keep.log").write_text("kept\n")
+    (tmp_path / "build" / "deep").mkdir(parents=True)
+    (tmp_path / "build" / "deep" / "out.o").write_text("binary\n")
+    (tmp_path / "pkg").mkdir()
+    (tmp_path / "pkg" / ".gitignore").write_text("/generated.py\n!*.log\n")
+    (tmp_path / "pkg" / "generated.py").write_text("x = 1\n")
+    (tmp_path / "pkg" / "debug.log").write_text("re-included\n")
+    (tmp_path / "pkg" / "sub").mkdir()
+    (tmp_path / "pkg" / "sub" / "generated.py").write_text("y = 2\n")
+    (tmp_path / ".git" / "info").mkdir(parents=True)
+    (tmp_path / ".git" / "info" / "exclude").write_text("secret.txt\n")
+    (tmp_path / "secret.txt").write_text("hidden\n")
+    return tmp_path
+
+
+def test_walk_honors_nested_ignore_files(ignored_tree: Path):
+    paths = [entry.path for entry in walk_directory(str(ignored_tree))]
+
+    assert paths == [".gitignore", "keep.log", "pkg/.gitignore", "pkg/debug.log", "pkg/sub/generated.py"]
+
+
+def test_walk_does_not_descend_into_ignored_directories(ignored_tree: Path, monkeypatch: pytest.MonkeyPatch):
+    scanned = []
+    scan = ingestion._scan
+    monkeypatch.setattr(ingestion, "_scan", lambda directory: scanned.append(directory) or scan(directory))
+
+    list(walk_directory(str(ignored_tree)))
+
+    assert not any("build" in directory for directory in scanned)
+
+
+def test_ignore_files_are_parsed_once(ignored_tree: Path, monkeypatch: pytest.MonkeyPatch):
+    gitignore._load_rules.cache_clear()
+    parsed = []
+    monkeypatch.setattr(gitignore, "parse_rule", lambda line, base="": parsed.append(line) or parse_rule(line, base))
+
+    list(walk_directory(str(ignored_tree)))
+    first_walk = len(parsed)
+    list(walk_directory(str(ignored_tree)))
+
+    assert first_walk == 7, "the lines of the two ignore files and the exclude file"
+    assert len(parsed) == first_walk
+
+
+def test_walk_can_ignore_gitignore(ignored_tree: Path):
+    paths = [entry.path for entry in walk_directory(str(ignored_tree), respect_gitignore=False)]
+
+    assert "app.log" in paths and "build/deep/out.o" in paths and "secret.txt" in paths
+
+
+def test_parse_rule():
+    assert parse_rule("# comment") is None
+    assert parse_rule("   ") is None
+    assert IgnoreRules((parse_rule("\\#hash"),)).ignores("#hash", is_dir=False)
+    assert parse_rule("!keep").negated
+    assert parse_rule("dist/").directory_only
+    assert IgnoreRules((parse_rule("*.py", "pkg/"),)).ignores("pkg/a/b.py", is_dir=False)
+    assert not IgnoreRules((parse_rule("/top.py", "pkg/"),)).ignores("pkg/a/top.py", is_dir=False)
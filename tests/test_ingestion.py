@@ -0,0 +1,128 @@
+""" Tests for the bounded directory walk. """
+
+from pathlib import Path
+
+import pytest
+
+from placeholder import formatter
+from placeholder.formatter import read_file_content
+from placeholder.ingestion import FileEntry, IngestionLimits, IngestionStats, walk_directory
+from placeholder.main import main, read_files
+
+
+@pytest.fixture(name="sample_tree")
+def sample_tree_fixture(tmp_path: Path) -> Path:
+    (tmp_path / "README.md").write_text("# Sample\n")
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "app.py").write_text("print('hello')\n")
+    (tmp_path / "src" / "nested").mkdir()
+    (tmp_path / "src" / "nested" / "deep.py").write_text("x = 1\n")
+    (tmp_path / "big.bin").write_bytes(b"\0" * 2048)
+    return tmp_path
+
+
+def test_walk_yields_files_before_subdirectories(sample_tree: Path):
+    paths = [entry.path for entry in walk_directory(str(sample_tree))]
+    assert paths == ["README.md", "big.bin", "src/app.py", "src/nested/deep.py"]
+
+
+def test_walk_skips_files_over_max_file_size(sample_tree: Path):
+    stats = IngestionStats()
+    paths = [e.path for e in walk_directory(str(sample_tree), IngestionLimits(max_file_size=1024), stats)]
+    assert "big.bin" not in paths
+    assert stats.skipped_files == 1
+    assert not stats.truncated
+
+
+def test_walk_respects_max_directory_depth(sample_tree: Path):
+    stats = IngestionStats()
+    paths = [e.path for e in walk_directory(str(sample_tree), IngestionLimits(max_directory_depth=1), stats)]
+    assert "src/nested/deep.py" not in paths
+    assert stats.skipped_directories == 1
+
+
+def test_walk_stops_at_max_files(sample_tree: Path):
+    stats = IngestionStats()
+    walk = walk_directory(str(sample_tree), IngestionLimits(max_files=2), stats)
+    assert len(list(walk)) == 2
+    assert stats.limit_reached == "max_files"
+
+
+def test_walk_stops_before_max_total_size(sample_tree: Path):
+    stats = IngestionStats()
+    walk = walk_directory(str(sample_tree), IngestionLimits(max_total_size_bytes=100), stats)
+    assert [e.path for e in walk] == ["README.md"]
+    assert stats.limit_reached == "max_total_size_bytes"
+
+
+def test_walk_is_lazy(sample_tree: Path):
+    stats = IngestionStats()
+    walk = walk_directory(str(sample_tree), stats=stats)
+    next(walk)
+    assert stats.files == 1
+
+
+async def test_main_builds_digest(sample_tree: Path):
+    result = await main(str(sample_tree))
+    assert "Files analyzed: 4" in result.summary
+    assert "File: src/app.py" in result.text
+    assert result.read(result.find("src/app.py")) == "print('hello')\n"
+
+
+async def test_main_rejects_missing_directory(tmp_path: Path):
+    with pytest.raises(ValueError):
+        await main(str(tmp_path / "missing"))
+
+
+def _entry(path: Path) -> FileEntry:
+    return FileEntry(path=path.name, abs_path=str(path), size=path.stat().st_size, depth=0)
+
+
+def test_read_file_content_sniffs_only_the_start(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(formatter, "BINARY_SNIFF_SIZE", 16)
+    (tmp_path / "binary").write_bytes(b"text\0" + b"a" * 100)
+    (tmp_path / "late").write_bytes(b"a" * 100 + b"\xff")
+    (tmp_path / "split").write_bytes(b"a" * 15 + "é".encode() + b"a" * 10)
+
+    assert read_file_content(_entry(tmp_path / "binary")) == "[Binary file]"
+    assert read_file_content(_entry(tmp_path / "late")) == "a" * 100 + "\ufffd"
+    assert read_file_content(_entry(tmp_path / "split")) == "a" * 15 + "é" + "a" * 10
+
+
+def test_read_file_content_maps_large_files(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(formatter, "BINARY_SNIFF_SIZE", 16)
+    monkeypatch.setattr(formatter, "MMAP_THRESHOLD", 32)
+    monkeypatch.setattr(formatter, "_DECODE_CHUNK_SIZE", 7)
+    content = "é" * 50 + "\n"
+    (tmp_path / "large.txt").write_text(content, encoding="utf-8")
+
+    assert read_file_content(_entry(tmp_path / "large.txt")) == content
+
+
+def test_read_file_content_tolerates_files_truncated_while_read(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(formatter, "BINARY_SNIFF_SIZE", 16)
+    monkeypatch.setattr(formatter, "MMAP_THRESHOLD", 32)
+    path = tmp_path / "large.txt"
+    path.write_text("a" * 100)
+    entry = _entry(path)
+
+    def truncate_after_sniffing(_: bytes) -> bool:
+        path.write_bytes(b"")
+        return False
+
+    monkeypatch.setattr(formatter, "_is_binary", truncate_after_sniffing)
+
+    assert read_file_content(entry) == ""
+
+
+def test_read_files_preserves_order(tmp_path: Path):
+    paths = []
+    for i in range(50):
+        path = tmp_path / f"{i:02d}.txt"
+        path.write_text(f"file {i}\n")
+        paths.append(path)
+
+    files = list(read_files((_entry(path) for path in paths), workers=3))
+
+    assert [entry.path for entry, _ in files] == [path.name for path in paths]
+    assert [content for _, content in files] == [f"file {i}\n" for i in range(50)]
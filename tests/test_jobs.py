@@ -0,0 +1,101 @@
+""" Tests for the background job queue. """
+
+import asyncio
+import json
+
+import pytest
+
+from server import jobs
+from server.jobs import JobQueue, JobStatus
+from server.query_processor import QueryResult
+from server.routers.jobs import _event_stream
+
+
+@pytest.fixture(name="queue")
+async def queue_fixture(monkeypatch: pytest.MonkeyPatch):
+    release = asyncio.Event()
+
+    async def fake_run_query(input_text: str, *_args, progress, **_kwargs) -> QueryResult:
+        progress("Building digest")
+        await release.wait()
+        if input_text == "broken":
+            raise ValueError("invalid repository")
+        return QueryResult(content=f"digest of {input_text}", digest_id=f"digest-{input_text}")
+
+    monkeypatch.setattr(jobs, "run_query", fake_run_query)
+    monkeypatch.setattr(jobs, "JOB_PRUNE_INTERVAL", 0.01)
+    queue = JobQueue(workers=2, max_size=2)
+    queue.release = release
+    await queue.start()
+    yield queue
+    await queue.stop()
+
+
+async def test_job_runs_in_background(queue: JobQueue):
+    job = await queue.submit("owner/repo")
+    assert json.loads(queue.state.fetch(f"job:{job.id}"))["status"] == "queued", "published before being returned"
+
+    await asyncio.sleep(0)
+    assert job.state.status == JobStatus.RUNNING
+    assert job.state.progress == "Building digest"
+
+    queue.release.set()
+    await job.wait(job.state.version)
+    assert job.state.status == JobStatus.DONE
+    assert job.state.digest_id == "digest-owner/repo"
+    assert await queue.get(job.id) is job
+
+
+async def test_failed_job_reports_error(queue: JobQueue):
+    queue.release.set()
+    job = await queue.submit("broken")
+    while not job.finished:
+        await job.wait(job.state.version)
+    assert job.state.status == JobStatus.FAILED
+    assert job.state.error == "invalid repository"
+
+
+async def test_identical_submissions_share_a_job(queue: JobQueue):
+    assert await queue.submit("owner/repo") is await queue.submit(" owner/repo ")
+    assert await queue.submit("owner/repo") is not await queue.submit("owner/repo", is_index=True)
+
+
+async def test_full_queue_rejects_submissions(queue: JobQueue):
+    for i in range(2 + queue.limits.workers):
+        await queue.submit(f"owner/repo-{i}")
+        await asyncio.sleep(0)
+    with pytest.raises(asyncio.QueueFull):
+        await queue.submit("owner/one-too-many")
+
+
+async def test_event_stream_ends_when_job_finishes(queue: JobQueue):
+    job = await queue.submit("owner/repo")
+    queue.release.set()
+    events = [json.loads(event.removeprefix("data: ")) async for event in _event_stream(job)]
+    assert events[-1]["status"] == "done"
+
+
+async def test_jobs_are_visible_to_other_workers(queue: JobQueue):
+    other = JobQueue(workers=1, max_size=1, state=queue.state)
+    job = await queue.submit("owner/repo")
+    snapshot = await other.get(job.id)
+    assert snapshot is not job
+    assert snapshot.state.status == JobStatus.QUEUED
+
+    queue.release.set()
+    while not job.finished:
+        await job.wait(job.state.version)
+    await queue._flush()
+    assert (await other.get(job.id)).to_dict() == job.to_dict()
+    assert await other.get("missing") is None
+
+
+async def test_finished_jobs_are_pruned_without_new_submissions(queue: JobQueue):
+    queue.release.set()
+    job = await queue.submit("owner/repo")
+    while not job.finished:
+        await job.wait(job.state.version)
+
+    queue.limits.retention = 0
+    await asyncio.sleep(0.05)
+    assert job.id not in queue.jobs
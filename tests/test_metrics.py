@@ -0,0 +1,80 @@
+""" Tests for the metrics exported at /metrics. """
+
+from pathlib import Path
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from placeholder.main import build_digest
+from server.metrics import Collector, Counter, Histogram, MetricsMiddleware, MetricsRegistry
+
+
+def test_metrics_render_in_prometheus_format():
+    registry = MetricsRegistry()
+    counter = registry.register(Counter("requests_total", "Requests.", ("route",)))
+    histogram = registry.register(Histogram("latency_seconds", "Latency.", ("stage",), buckets=(0.1, 1)))
+    registry.register(Collector("in_flight", "Running.", "gauge", lambda: {(): 3}))
+
+    counter.inc('/say "hi"\n')
+    counter.inc('/say "hi"\n', amount=2)
+    histogram.observe(0.05, "clone")
+    histogram.observe(0.5, "clone")
+    histogram.observe(5, "clone")
+
+    assert registry.render().splitlines() == [
+        "# HELP requests_total Requests.",
+        "# TYPE requests_total counter",
+        'requests_total{route="/say \\"hi\\"\\n"} 3',
+        "# HELP latency_seconds Latency.",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{stage="clone",le="0.1"} 1',
+        'latency_seconds_bucket{stage="clone",le="1"} 2',
+        'latency_seconds_bucket{stage="clone",le="+Inf"} 3',
+        'latency_seconds_sum{stage="clone"} 5.55',
+        'latency_seconds_count{stage="clone"} 3',
+        "# HELP in_flight Running.",
+        "# TYPE in_flight gauge",
+        "in_flight 3",
+    ]
+
+
+def test_registry_labels_every_sample_with_its_worker():
+    registry = MetricsRegistry(lambda: {"worker": "42"})
+    registry.register(Collector("in_flight", "Running.", "gauge", lambda: {(): 3}))
+    histogram = registry.register(Histogram("latency_seconds", "Latency.", ("stage",), buckets=(1,)))
+    histogram.observe(0.5, "clone")
+
+    assert [line for line in registry.render().splitlines() if not line.startswith("#")] == [
+        'in_flight{worker="42"} 3',
+        'latency_seconds_bucket{worker="42",stage="clone",le="1"} 1',
+        'latency_seconds_bucket{worker="42",stage="clone",le="+Inf"} 1',
+        'latency_seconds_sum{worker="42",stage="clone"} 0.5',
+        'latency_seconds_count{worker="42",stage="clone"} 1',
+    ]
+
+
+def test_middleware_labels_requests_by_route(monkeypatch):
+    counter = Counter("requests_total", "Requests.", ("method", "route", "status"))
+    monkeypatch.setattr("server.metrics.http_requests", counter)
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/items/{item}")
+    async def item(item: str) -> dict[str, str]:
+        return {"item": item}
+
+    client = TestClient(app)
+    client.get("/items/a")
+    client.get("/items/b")
+    client.get("/missing")
+
+    assert dict(counter._values) == {("GET", "/items/{item}", "200"): 2, ("GET", "unmatched", "404"): 1}
+
+
+def test_build_digest_times_its_stages(tmp_path: Path):
+    (tmp_path / "app.py").write_text("print('hello')\n")
+
+    digest = build_digest(str(tmp_path))
+
+    assert set(digest.timings) == {"walk", "read", "tokens", "format"}
+    assert all(seconds >= 0 for seconds in digest.timings.values())
@@ -0,0 +1,62 @@
+""" Tests for include and exclude patterns. """
+
+from pathlib import Path
+
+import pytest
+
+from placeholder import ingestion
+from placeholder.ingestion import walk_directory
+from placeholder.patterns import PatternMatcher
+
+
+def test_unanchored_patterns_match_names_at_any_depth():
+    matcher = PatternMatcher(exclude=["node_modules", "*.log"])
+
+    assert not matcher.includes_directory("node_modules")
+    assert not matcher.includes_directory("web/node_modules")
+    assert not matcher.includes_file("logs/debug.log")
+    assert not matcher.includes_file(".git/config")
+    assert matcher.includes_file("src/node_modules_helper.py")
+    assert matcher.includes_directory("src")
+
+
+def test_anchored_patterns_and_double_star():
+    matcher = PatternMatcher(exclude=["/build", "docs/**/*.png", "te?t/[a-c]*.py"])
+
+    assert not matcher.includes_directory("build")
+    assert matcher.includes_directory("src/build")
+    assert not matcher.includes_file("docs/img/deep/logo.png")
+    assert not matcher.includes_file("docs/logo.png")
+    assert not matcher.includes_file("test/b_test.py")
+    assert matcher.includes_file("test/d_test.py")
+
+
+def test_include_patterns_prune_directories_that_cannot_match():
+    matcher = PatternMatcher(include=["src/**/*.py", "/README.md"])
+
+    assert matcher.includes_file("src/app.py")
+    assert matcher.includes_file("src/pkg/mod.py")
+    assert not matcher.includes_file("src/app.js")
+    assert matcher.includes_directory("src/pkg")
+    assert not matcher.includes_directory("docs"), "only src can contain matches"
+
+
+def test_from_form():
+    assert PatternMatcher.from_form("include", "*.py, *.md\nsrc/").include == ["*.md", "*.py", "src/"]
+    assert PatternMatcher.from_form("exclude", "").signature == PatternMatcher().signature
+    with pytest.raises(ValueError):
+        PatternMatcher.from_form("everything", "*.py")
+
+
+def test_walk_prunes_excluded_directories_before_listing_them(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    (tmp_path / "node_modules" / "pkg").mkdir(parents=True)
+    (tmp_path / "node_modules" / "pkg" / "index.js").write_text("module.exports = 1\n")
+    (tmp_path / "app.js").write_text("require('pkg')\n")
+    scanned = []
+    scan = ingestion._scan
+    monkeypatch.setattr(ingestion, "_scan", lambda directory: scanned.append(directory) or scan(directory))
+
+    paths = [entry.path for entry in walk_directory(str(tmp_path), patterns=PatternMatcher(exclude=["node_modules"]))]
+
+    assert paths == ["app.js"]
+    assert scanned == [str(tmp_path)]
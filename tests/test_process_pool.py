@@ -0,0 +1,52 @@
+""" Tests for running digest builds in the process pool. """
+
+import asyncio
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from placeholder.main import build_digest
+from server.process_pool import ProcessPool
+
+
+def _wait_for_cancel(marker: str, cancel_event) -> None:
+    deadline = time.monotonic() + 10
+    while not cancel_event.is_set() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    Path(marker).write_text("cancelled" if cancel_event.is_set() else "timed out", encoding="utf-8")
+
+
+@pytest.fixture(name="pool")
+async def pool_fixture():
+    pool = ProcessPool(workers=1)
+    pool.start()
+    yield pool
+    await pool.stop()
+
+
+async def test_pool_builds_digest(pool: ProcessPool, git_repository: Path):
+    digest = await pool.run(build_digest, str(git_repository), name="repository")
+    assert "Source: repository" in digest.summary
+    assert "File: src/app.py" in digest.text
+
+
+async def test_cancelling_the_caller_stops_the_worker(pool: ProcessPool, tmp_path: Path):
+    marker = tmp_path / "marker"
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(pool.run(_wait_for_cancel, str(marker)), timeout=0.5)
+
+    for _ in range(100):
+        if marker.exists():
+            break
+        await asyncio.sleep(0.05)
+    assert marker.read_text(encoding="utf-8") == "cancelled"
+
+
+def test_build_digest_stops_once_cancelled(git_repository: Path):
+    cancel_event = threading.Event()
+    cancel_event.set()
+    digest = build_digest(str(git_repository), cancel_event=cancel_event)
+    assert "Truncated: time limit reached" in digest.summary
+    assert not digest.files
@@ -0,0 +1,99 @@
+""" Tests for the profiling of queries. """
+
+import pstats
+import time
+from pathlib import Path
+
+from server.profiling import Profiler, StackSampler, profile_call, profiled
+
+
+def _busy_build(duration: float, **_kwargs) -> str:
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        pass
+    return "digest"
+
+
+async def _run_build(duration: float = 0.05) -> str:
+    build = profiled(_busy_build)
+    return build(duration, cancel_event=None)
+
+
+async def test_requested_query_is_profiled(tmp_path: Path):
+    profiler = Profiler(str(tmp_path), slow_threshold=None)
+
+    async with profiler.session("owner/repo", requested=True) as session:
+        assert session.mode == "cprofile"
+        assert await _run_build() == "digest"
+
+    profile, *others = profiler.profiles()
+    assert not others
+    assert profile["query"] == "owner/repo"
+    assert profile["trigger"] == "requested"
+    stats = pstats.Stats(str(profiler.path(profile["file"])))
+    assert any(name == "_busy_build" for _, _, name in stats.stats)
+    assert not list((tmp_path / ".pending").iterdir())
+
+
+async def test_only_slow_queries_keep_their_stacks(tmp_path: Path):
+    profiler = Profiler(str(tmp_path), slow_threshold=10)
+    async with profiler.session("owner/fast") as session:
+        assert session.mode == "stacks"
+        await _run_build()
+    assert not profiler.profiles()
+
+    profiler.slow_threshold = 0
+    async with profiler.session("owner/slow"):
+        await _run_build()
+    profile, *others = profiler.profiles()
+    assert not others
+    assert profile["trigger"] == "slow"
+    assert "_busy_build" in profiler.path(profile["file"]).read_text()
+
+
+async def test_unprofiled_queries_run_as_is(tmp_path: Path):
+    profiler = Profiler(str(tmp_path), slow_threshold=None)
+    async with profiler.session("owner/repo") as session:
+        assert session is None
+        assert profiled(_busy_build) is _busy_build
+
+
+async def test_ring_buffer_keeps_the_newest_profiles(tmp_path: Path):
+    profiler = Profiler(str(tmp_path), max_profiles=2, slow_threshold=None)
+    for name in ("first", "second", "third"):
+        async with profiler.session(name, requested=True):
+            pass
+
+    assert [profile["query"] for profile in profiler.profiles()] == ["third", "second"]
+
+
+def test_profile_path_rejects_other_files(tmp_path: Path):
+    (tmp_path / "secret.prof").write_text("")
+    profiler = Profiler(str(tmp_path))
+
+    assert profiler.path("../secret.prof") is None
+    assert profiler.path("secret.prof") is None
+
+
+def test_stack_sampler_collapses_stacks(tmp_path: Path):
+    sampler = StackSampler(interval=0.001)
+    sampler.start()
+    _busy_build(0.05)
+    sampler.stop()
+    sampler.dump(str(tmp_path / "stacks"))
+
+    lines = (tmp_path / "stacks").read_text().splitlines()
+    assert any("_busy_build (test_profiling.py)" in line for line in lines)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+
+
+def test_profile_call_writes_profile_when_the_function_fails(tmp_path: Path):
+    def fail() -> None:
+        raise ValueError("broken")
+
+    output = tmp_path / "build.prof"
+    try:
+        profile_call(fail, profile_mode="cprofile", profile_output=str(output))
+    except ValueError:
+        pass
+    assert output.exists()
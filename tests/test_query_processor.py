@@ -0,0 +1,46 @@
+""" Tests for running queries through the caches, the process pool and the digest store. """
+
+from pathlib import Path
+
+import pytest
+
+from placeholder.fragments import FragmentStore
+from server import query_processor
+from server.admission import AdmissionController
+from server.clone_cache import CloneCache
+from server.digest_store import DigestStore
+from server.result_cache import ResultCache
+
+
+@pytest.fixture(name="store")
+async def store_fixture(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> DigestStore:
+    store = DigestStore(str(tmp_path / "digests"))
+    admission = AdmissionController()
+    await admission.start()
+    monkeypatch.setattr(query_processor, "admission", admission)
+    monkeypatch.setattr(query_processor, "normalize_repo_url", lambda source: source)  # Accept file:// URLs
+    monkeypatch.setattr(query_processor, "clone_cache", CloneCache(str(tmp_path / "cache")))
+    monkeypatch.setattr(query_processor, "digest_store", store)
+    monkeypatch.setattr(query_processor, "fragment_store", FragmentStore(str(tmp_path / "fragments")))
+    monkeypatch.setattr(query_processor, "result_cache", ResultCache(directory=None))
+    return store
+
+
+async def test_digest_is_stored_once_and_again_only_once_expired(
+    git_repository: Path, store: DigestStore, monkeypatch: pytest.MonkeyPatch
+):
+    saved = []
+    save = store._save
+    monkeypatch.setattr(store, "_save", lambda digest_id, *args: saved.append(digest_id) or save(digest_id, *args))
+    url = f"file://{git_repository}"
+
+    first = await query_processor.run_query(url)
+    second = await query_processor.run_query(url)
+    assert second.digest_id == first.digest_id
+    assert saved == [first.digest_id]
+
+    for path in Path(store.directory).iterdir():
+        path.unlink()
+    await query_processor.run_query(url)
+    assert saved == [first.digest_id] * 2
+    assert store.exists(first.digest_id)
@@ -0,0 +1,80 @@
+""" Tests for the digest result cache. """
+
+import asyncio
+import sys
+from pathlib import Path
+
+from server.result_cache import ResultCache
+
+
+async def test_concurrent_requests_share_one_computation():
+    cache = ResultCache()
+    calls = 0
+
+    async def compute() -> str:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "digest"
+
+    key = cache.make_key("https://github.com/a/b", "0" * 40)
+    results = await asyncio.gather(*(cache.get_or_compute(key, compute) for _ in range(10)))
+
+    assert results == ["digest"] * 10
+    assert calls == 1
+    assert await cache.get_or_compute(key, compute) == "digest"
+    assert calls == 1
+
+
+async def test_memory_tier_evicts_least_recently_used():
+    cache = ResultCache(max_bytes=2 * sys.getsizeof("aaaaa"))
+
+    async def compute(value: str) -> str:
+        return value
+
+    await cache.get_or_compute("a", lambda: compute("aaaaa"))
+    await cache.get_or_compute("b", lambda: compute("bbbbb"))
+    await cache.get_or_compute("a", lambda: compute("aaaaa"))
+    await cache.get_or_compute("c", lambda: compute("ccccc"))
+
+    assert list(cache._memory) == ["a", "c"]
+
+
+async def test_memory_tier_counts_bytes_of_non_ascii_digests():
+    ascii_digest, non_ascii_digest = "a" * 1000, "\u20ac" * 1000
+    cache = ResultCache(max_bytes=2 * sys.getsizeof(ascii_digest))
+
+    async def compute(value: str) -> str:
+        return value
+
+    await cache.get_or_compute("a", lambda: compute(ascii_digest))
+    await cache.get_or_compute("b", lambda: compute(non_ascii_digest))
+
+    assert list(cache._memory) == ["b"], "a digest of 2-byte characters must count twice its length"
+    assert cache._memory_size <= cache.max_bytes
+
+
+async def test_disk_tier_survives_a_new_cache(tmp_path: Path):
+    async def compute() -> str:
+        return "digest"
+
+    await ResultCache(directory=str(tmp_path)).get_or_compute("key", compute)
+
+    async def fail() -> str:
+        raise AssertionError("should be served from disk")
+
+    assert await ResultCache(directory=str(tmp_path)).get_or_compute("key", fail) == "digest"
+
+
+async def test_failures_are_not_cached():
+    cache = ResultCache()
+
+    async def fail() -> str:
+        raise RuntimeError("boom")
+
+    for _ in range(2):
+        try:
+            await cache.get_or_compute("key", fail)
+        except RuntimeError:
+            pass
+    assert cache.stats.misses == 2
@@ -0,0 +1,66 @@
+""" Tests for the structured logging of the server. """
+
+import json
+import logging
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from server.server_logging import JSONFormatter, LogPipeline, RequestLoggingMiddleware, logger
+
+
+def test_json_formatter_includes_extra_fields():
+    record = logger.makeRecord("server", logging.INFO, __file__, 1, "Success: %s", ("owner/repo",), None)
+    record.request_id = "abc"
+    record.duration = 1.5
+    record.characters = 42
+
+    entry = json.loads(JSONFormatter().format(record))
+
+    assert entry["message"] == "Success: owner/repo"
+    assert entry["level"] == "INFO"
+    assert entry["request_id"] == "abc"
+    assert entry["duration"] == 1.5
+    assert entry["characters"] == 42
+
+
+def test_requests_are_logged_with_their_id(capsys):
+    pipeline = LogPipeline(fmt="json", level="INFO")
+    app = FastAPI()
+    app.add_middleware(RequestLoggingMiddleware)
+
+    @app.get("/hello")
+    async def hello() -> dict[str, str]:
+        logger.info("Handling hello")
+        return {"hello": "world"}
+
+    pipeline.start()
+    try:
+        response = TestClient(app).get("/hello", headers={"X-Request-ID": "request-1"})
+    finally:
+        pipeline.stop()
+
+    assert response.headers["x-request-id"] == "request-1"
+    handling, handled = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert handling["message"] == "Handling hello"
+    assert handling["request_id"] == handled["request_id"] == "request-1"
+    assert handled["status"] == 200
+    assert handled["bytes"] == len(response.content)
+    assert handled["duration"] >= 0
+
+
+def test_exceptions_keep_their_traceback_through_the_pipeline(capsys):
+    pipeline = LogPipeline(fmt="json", level="INFO")
+
+    pipeline.start()
+    try:
+        try:
+            raise ValueError("invalid repository")
+        except ValueError:
+            logger.exception("Failed: %s", "owner/repo")
+    finally:
+        pipeline.stop()
+
+    entry = json.loads(capsys.readouterr().out)
+    assert entry["message"] == "Failed: owner/repo"
+    assert "ValueError: invalid repository" in entry["exception"]
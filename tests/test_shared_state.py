@@ -0,0 +1,82 @@
+""" Tests for the state shared by the worker processes. """
+
+import pickle
+from pathlib import Path
+
+import pytest
+from limits.storage import storage_from_string
+
+from server.shared_state import MemoryState, SharedState, SQLiteState, state_from_uri
+
+
+@pytest.fixture(name="state", params=["memory", "sqlite"])
+def state_fixture(request: pytest.FixtureRequest, tmp_path: Path) -> SharedState:
+    if request.param == "memory":
+        return MemoryState()
+    return SQLiteState(str(tmp_path / "state.sqlite"))
+
+
+def test_counters_expire(state: SharedState):
+    assert state.incr("hits", expiry=60) == 1
+    assert state.incr("hits", expiry=60, amount=2) == 3
+    assert state.incr("hits", expiry=60, amount=-1) == 2
+    assert state.get("hits") == 2
+
+    state.incr("stale", expiry=-1)
+    assert state.get("stale") == 0
+    assert state.incr("stale", expiry=60) == 1, "an expired counter starts over"
+
+
+def test_records_round_trip(state: SharedState):
+    state.put("job:1", '{"status": "done"}', ttl=60)
+    state.put("job:2", "{}", ttl=-1)
+    assert state.fetch("job:1") == '{"status": "done"}'
+    assert state.fetch("job:2") is None
+
+    state.clear("job:1")
+    assert state.fetch("job:1") is None
+
+
+def test_keys_are_counted_by_prefix(state: SharedState):
+    state.put("checkout:a:1", "", ttl=60)
+    state.put("checkout:a:2", "", ttl=60)
+    state.put("checkout:a:3", "", ttl=-1)
+    state.put("checkout:ab:1", "", ttl=60)
+
+    assert state.count("checkout:a:") == 2
+    assert state.count("checkout:b:") == 0
+
+
+def test_expired_keys_are_kept_until_purged(state: SharedState):
+    state.put("job:1", "{}", ttl=-1)
+    state.incr("hits", expiry=-1)
+    state.incr("live", expiry=60)
+
+    assert state.fetch("job:1") is None
+    assert state.purge() == 2
+    assert state.get("live") == 1
+
+
+def test_sqlite_state_is_shared_between_instances(tmp_path: Path):
+    first = SQLiteState(str(tmp_path / "state.sqlite"))
+    second = pickle.loads(pickle.dumps(first))
+
+    first.incr("hits", expiry=60)
+    assert second.incr("hits", expiry=60) == 2
+    assert second.reset() == 1
+    assert first.get("hits") == 0
+
+
+def test_state_from_uri(tmp_path: Path):
+    assert isinstance(state_from_uri("memory://"), MemoryState)
+    assert state_from_uri(f"sqlite:///{tmp_path}/state.sqlite").path == tmp_path / "state.sqlite"
+    with pytest.raises(ValueError):
+        state_from_uri("redis://localhost")
+
+
+def test_rate_limit_storage_uses_sqlite(tmp_path: Path):
+    storage = storage_from_string(f"sqlite:///{tmp_path}/limits.sqlite")
+    assert storage.incr("limit", 60) == 1
+    assert storage.incr("limit", 60) == 2
+    assert storage_from_string(f"sqlite:///{tmp_path}/limits.sqlite").get("limit") == 2
+    assert storage_from_string(f"sqlite:///{tmp_path}/limits.sqlite", timeout=0.5).state.timeout == 0.5
@@ -0,0 +1,128 @@
+""" Tests for streaming result pages. """
+
+import time
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+
+from placeholder import main
+from placeholder.clone import resolve_commit
+from placeholder.fragments import FragmentStore
+from placeholder.ingestion import FileEntry
+from placeholder.main import iter_digest
+from placeholder.patterns import PatternMatcher
+from server import query_processor
+from server.clone_cache import CloneCache
+from server.digest_store import DigestStore
+
+
+def test_iter_digest_yields_header_before_files(tmp_path: Path):
+    (tmp_path / "src").mkdir()
+    (tmp_path / "README.md").write_text("# Repository\n")
+    (tmp_path / "src" / "app.py").write_text("print('hello')\n")
+
+    chunks = iter_digest(str(tmp_path), name="repository")
+    header = next(chunks)
+    assert "Files analyzed: 2" in header
+    assert "Directory structure:" in header
+    assert "File: " not in header
+    assert [chunk.splitlines()[1] for chunk in chunks] == ["File: README.md", "File: src/app.py"]
+
+
+@pytest.fixture(name="store")
+def store_fixture(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> DigestStore:
+    store = DigestStore(str(tmp_path / "digests"))
+    monkeypatch.setattr(query_processor, "clone_cache", CloneCache(str(tmp_path / "cache")))
+    monkeypatch.setattr(query_processor, "digest_store", store)
+    monkeypatch.setattr(query_processor, "fragment_store", FragmentStore(str(tmp_path / "fragments")))
+    return store
+
+
+@pytest.mark.usefixtures("store")
+async def test_stream_page_sends_shell_then_escaped_digest(git_repository: Path):
+    (git_repository / "index.html").write_text("<b>bold</b>\n")
+    url = f"file://{git_repository}"
+    commit = await resolve_commit(url)
+
+    chunks = [
+        chunk
+        async for chunk in query_processor._stream_page(
+            "<head>", "<tail>", "repository", url, commit, PatternMatcher(), None, "abc", lambda: None
+        )
+    ]
+
+    assert chunks[0] == "<head>"
+    assert chunks[-1] == "<tail>"
+    body = "".join(chunks[1:-1])
+    assert "File: README.md" in body
+    assert "&lt;b&gt;" not in body, "untracked files are not part of the checkout"
+    assert "print(&#x27;hello&#x27;)" in body
+
+
+async def test_stream_page_reports_errors_inline(tmp_path: Path, store: DigestStore):
+    url = f"file://{tmp_path / 'missing'}"
+
+    chunks = [
+        chunk
+        async for chunk in query_processor._stream_page(
+            "<head>", "<tail>", "missing", url, "HEAD", PatternMatcher(), None, "abc", lambda: None
+        )
+    ]
+
+    assert chunks[0] == "<head>" and chunks[-1] == "<tail>"
+    assert "[Error: " in "".join(chunks)
+    assert not store.exists("abc")
+
+
+async def test_stream_page_truncates_display_and_stores_full_digest(
+    git_repository: Path, store: DigestStore, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(query_processor, "MAX_DISPLAY_SIZE", 50)
+    url = f"file://{git_repository}"
+    commit = await resolve_commit(url)
+
+    chunks = [
+        chunk
+        async for chunk in query_processor._stream_page(
+            "<head>", "<tail>", "repository", url, commit, PatternMatcher(), None, "abc", lambda: None
+        )
+    ]
+
+    body = "".join(chunks[1:-1])
+    assert "[Truncated for display" in body
+    assert "File: README.md" not in body
+    full = (await store.get_file("abc", "txt")).read_text()
+    assert "File: README.md" in full and "File: src/app.py" in full
+
+
+async def test_stream_page_stops_a_first_chunk_running_past_the_deadline(
+    git_repository: Path, store: DigestStore, monkeypatch: pytest.MonkeyPatch
+):
+    def endless_walk(*_args) -> Iterator[FileEntry]:
+        while True:
+            time.sleep(0.01)
+            yield FileEntry("README.md", str(git_repository / "README.md"), 13, 0)
+
+    monkeypatch.setattr(main, "_list_files", endless_walk)
+    monkeypatch.setattr(query_processor, "INGESTION_TIMEOUT", 0.5)
+    url = f"file://{git_repository}"
+    commit = await resolve_commit(url)
+
+    started = time.monotonic()
+    chunks = [
+        chunk
+        async for chunk in query_processor._stream_page(
+            "<head>", "<tail>", "repository", url, commit, PatternMatcher(), None, "abc", lambda: None
+        )
+    ]
+
+    assert time.monotonic() - started < 3, "the walk stops once the deadline is reached"
+    assert chunks == ["<head>", "\n[Truncated: time limit reached]\n", "<tail>"]
+    assert not store.exists("abc")
+
+
+def test_truncate_for_display_cuts_at_line_boundary():
+    assert query_processor.truncate_for_display("short\n", 10) == ("short\n", False)
+    assert query_processor.truncate_for_display("one\ntwo\nthree\n", 10) == ("one\ntwo\n", True)
+    assert query_processor.truncate_for_display("a" * 20, 10) == ("a" * 10, True)
@@ -0,0 +1,95 @@
+""" Tests for token counting. """
+
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from placeholder import tokens
+from placeholder.fragments import FragmentStore
+from placeholder.ingestion import FileEntry
+from placeholder.main import build_digest
+from placeholder.tokens import TokenCounter, count_file_tokens, estimate_tokens
+
+
+@pytest.fixture(name="encoding")
+def encoding_fixture(monkeypatch: pytest.MonkeyPatch) -> SimpleNamespace:
+    """An encoding splitting on whitespace, which records the batches it tokenizes."""
+    batches: list[list[str]] = []
+
+    def encode_ordinary_batch(texts: list[str], **_kwargs) -> list[list[str]]:
+        batches.append(list(texts))
+        return [text.split() for text in texts]
+
+    fake = SimpleNamespace(batches=batches, encode_ordinary_batch=encode_ordinary_batch)
+    monkeypatch.setattr(tokens, "_load_encoding", lambda _name: fake)
+    return fake
+
+
+def test_texts_are_counted_in_one_batch_and_cached(encoding: SimpleNamespace):
+    counter = TokenCounter()
+
+    assert counter.count_many(["one two", "three", "one two"]) == [2, 1, 2]
+    assert counter.count_many(["three", "four five six"]) == [1, 3]
+    assert encoding.batches == [["one two", "three", "one two"], ["four five six"]]
+
+
+def test_large_texts_are_estimated(encoding: SimpleNamespace):
+    counter = TokenCounter(exact_max_bytes=8)
+
+    assert counter.count("a b c d e f") == estimate_tokens(11)
+    assert not encoding.batches
+
+
+def test_counts_are_estimated_without_tokenizer(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(tokens, "_load_encoding", lambda _name: None)
+    counter = TokenCounter()
+
+    assert not counter.exact
+    assert counter.count("é" * 10) == 5, "estimated from the UTF-8 size"
+
+
+@pytest.mark.usefixtures("encoding")
+def test_file_counts_are_stored_by_blob(tmp_path: Path):
+    fragments = FragmentStore(str(tmp_path))
+    entry = FileEntry(path="a.txt", abs_path="", size=7, depth=0, blob="a" * 40)
+
+    assert count_file_tokens([(entry, "one two")], fragments, TokenCounter()) == 2
+    assert entry.tokens == 2
+    assert fragments.get("a" * 40, kind="tokens") == "2"
+    assert count_file_tokens([(entry, "ignored")], fragments, TokenCounter()) == 2
+
+
+@pytest.mark.usefixtures("encoding")
+def test_digest_reports_total_tokens(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(tokens, "token_counter", TokenCounter())
+    (tmp_path / "a.txt").write_text("one two three")
+    (tmp_path / "b.txt").write_text("four")
+
+    digest = build_digest(str(tmp_path))
+
+    assert "\nTokens: 4\n" in digest.summary
+    assert [file.tokens for file in digest.files] == [3, 1]
+
+
+@pytest.mark.usefixtures("encoding")
+def test_estimated_counts_are_reported_and_never_stored(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(tokens, "token_counter", TokenCounter(exact_max_bytes=8))
+    fragments = FragmentStore(str(tmp_path / "fragments"))
+    entry = FileEntry(path="a.txt", abs_path="", size=11, depth=0, blob="a" * 40)
+    (tmp_path / "source").mkdir()
+    (tmp_path / "source" / "a.txt").write_text("a b c d e f")
+
+    assert count_file_tokens([(entry, "a b c d e f")], fragments) == estimate_tokens(11)
+    assert fragments.get("a" * 40, kind="tokens") is None
+    assert "\nEstimated tokens: 3\n" in build_digest(str(tmp_path / "source")).summary
+
+
+def test_encoding_load_gives_up_after_the_timeout(monkeypatch: pytest.MonkeyPatch):
+    release = threading.Event()
+    monkeypatch.setattr(tokens, "tiktoken", SimpleNamespace(get_encoding=lambda name: release.wait()))
+    monkeypatch.setattr(tokens, "TOKEN_ENCODING_LOAD_TIMEOUT", 0.05)
+
+    assert not TokenCounter().load()
+    release.set()
@@ -0,0 +1,73 @@
+""" Tests for the timeout and cancellation utilities. """
+
+import asyncio
+import os
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from placeholder.exceptions import AsyncTimeoutError
+from placeholder.utils import async_timeout, run_cancellable, run_subprocess
+
+
+def _count_until_cancelled(cancel_event: threading.Event) -> int:
+    count = 0
+    while not cancel_event.is_set():
+        count += 1
+        time.sleep(0.01)
+    return count
+
+
+async def test_async_timeout_returns_result_in_time():
+    @async_timeout(1)
+    async def quick() -> str:
+        return "done"
+
+    assert await quick() == "done"
+
+
+async def test_async_timeout_kills_subprocesses(tmp_path: Path):
+    pid_file = tmp_path / "pid"
+
+    @async_timeout(1, grace_period=0.5)
+    async def hang() -> None:
+        await run_subprocess("sh", "-c", f"echo $$ > {pid_file}; exec sleep 30")
+
+    with pytest.raises(AsyncTimeoutError):
+        await hang()
+
+    pid = int(pid_file.read_text())
+    with pytest.raises(ProcessLookupError):
+        os.kill(pid, 0)
+
+
+async def test_async_timeout_collects_partial_result():
+    @async_timeout(0.2, partial=True)
+    async def count() -> int:
+        return await run_cancellable(None, _count_until_cancelled, cancel_event=threading.Event())
+
+    with pytest.raises(AsyncTimeoutError) as exc_info:
+        await count()
+    assert exc_info.value.partial_result > 0
+
+
+async def test_async_timeout_discards_partial_result_by_default():
+    @async_timeout(0.2)
+    async def count() -> int:
+        return await run_cancellable(None, _count_until_cancelled, cancel_event=threading.Event())
+
+    with pytest.raises(AsyncTimeoutError) as exc_info:
+        await count()
+    assert exc_info.value.partial_result is None
+
+
+async def test_cancelling_run_cancellable_sets_the_event():
+    cancel_event = threading.Event()
+    task = asyncio.create_task(run_cancellable(None, _count_until_cancelled, cancel_event=cancel_event))
+    await asyncio.sleep(0.05)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert cancel_event.is_set()